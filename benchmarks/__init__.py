@@ -0,0 +1,6 @@
+"""Offline benchmarks for the investments review workflows.
+
+LlamaCloud and OpenAI are replaced by local stand-ins with configurable
+latency, so that throughput and latency can be measured without network
+access or API keys. Run `python -m benchmarks --help` from the repository root.
+"""
@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, cast
+
+import httpx
+from openai import AsyncOpenAI
+from workflows import Workflow
+from workflows.resource import ResourceManager
+
+from investments_review import api
+from investments_review.clients import shared_clients
+from investments_review.metrics import metrics
+from investments_review.presentations.workflow import PresentationWorkflow
+from investments_review.retry import retry_policy
+from investments_review.shared import FileEvent
+from investments_review.sheets.llm import OpenAILLM
+from investments_review.sheets.workflow import SheetWorkflow
+from investments_review.upload_cache import UploadCache
+
+from .data import portfolio_table, presentation_file, spreadsheet_file
+from .fakes import FakeLlamaCloud, FakeOpenAI, Latency
+from .server import RegionServer
+
+TARGETS = ("sheets", "presentations", "api-sheets", "api-presentations")
+DEFAULT_OUTPUT_DIR = "benchmarks/results"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark the workflows and API routes against local stand-ins "
+        "for LlamaCloud and OpenAI",
+    )
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--runs", type=int, default=50, help="Runs per target")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed runs per target")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--file-size-kb", type=int, default=256)
+    parser.add_argument("--regions", type=int, default=3, help="Tables per spreadsheet")
+    parser.add_argument("--rows", type=int, default=500, help="Rows per table")
+    parser.add_argument("--llama-cloud-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--download-latency", type=float, default=0.01)
+    parser.add_argument(
+        "--rate-limits",
+        action="store_true",
+        help="Apply the rate limits of config.json to the stand-ins",
+    )
+    parser.add_argument("--label", default=None, help="Label added to the result file")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument(
+        "--compare", default=None, help="Previous result file to compare against"
+    )
+    return parser.parse_args()
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(percentile / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _measure(
+    run_once: Callable[[int], Awaitable[str | None]],
+    runs: int,
+    warmup: int,
+    concurrency: int,
+) -> dict[str, Any]:
+    for i in range(warmup):
+        await run_once(-1 - i)
+    semaphore = asyncio.Semaphore(concurrency)
+    durations: list[float] = []
+    errors: list[str] = []
+
+    async def timed(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                error = await run_once(i)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            durations.append(time.perf_counter() - start)
+            if error is not None:
+                errors.append(error)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[timed(i) for i in range(runs)])
+    elapsed = time.perf_counter() - start
+    return {
+        "runs": runs,
+        "errors": len(errors),
+        "first_errors": sorted(set(errors))[:5],
+        "elapsed_seconds": round(elapsed, 4),
+        "runs_per_second": round(runs / elapsed, 3),
+        "latency_p50_seconds": round(_percentile(durations, 50), 4),
+        "latency_p95_seconds": round(_percentile(durations, 95), 4),
+        "latency_p99_seconds": round(_percentile(durations, 99), 4),
+        "latency_max_seconds": round(max(durations), 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace, region_server: RegionServer) -> None:
+        self.args = args
+        self.input_dir = tempfile.mkdtemp(prefix="benchmark-inputs-")
+        region_ids = [f"region-{i}" for i in range(args.regions)]
+        for i, region_id in enumerate(region_ids):
+            region_server.tables[region_id] = portfolio_table(args.rows, seed=i)
+        self.llama_cloud = FakeLlamaCloud(
+            Latency(args.llama_cloud_latency), region_server, region_ids
+        )
+        self.llm = OpenAILLM(
+            api_key="benchmark",
+            client=cast(AsyncOpenAI, FakeOpenAI(Latency(args.llm_latency))),
+        )
+        self.upload_cache = UploadCache(
+            path=os.path.join(self.input_dir, "uploads.sqlite"),
+            ttl_seconds=3600,
+            max_entries=100_000,
+        )
+
+    async def resource_manager(self) -> ResourceManager:
+        resource_manager = ResourceManager()
+        await resource_manager.set("get_llama_cloud_client", self.llama_cloud)
+        await resource_manager.set("get_llm", self.llm)
+        await resource_manager.set("get_upload_cache", self.upload_cache)
+        return resource_manager
+
+    def write_input(self, target: str, i: int) -> str:
+        """Write a distinct input file, so that the upload cache is always missed."""
+        seed = TARGETS.index(target) * 1_000_000 + i
+        if target.endswith("sheets"):
+            path = os.path.join(self.input_dir, f"{target}-{i}.xlsx")
+            content = spreadsheet_file(self.args.file_size_kb, seed)
+        else:
+            path = os.path.join(self.input_dir, f"{target}-{i}.pdf")
+            content = presentation_file(self.args.file_size_kb, seed)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    async def workflow(self, target: str) -> Workflow:
+        resource_manager = await self.resource_manager()
+        if target.endswith("sheets"):
+            return SheetWorkflow(timeout=600, resource_manager=resource_manager)
+        return PresentationWorkflow(timeout=600, resource_manager=resource_manager)
+
+    async def run_target(self, target: str) -> dict[str, Any]:
+        workflow = await self.workflow(target)
+        inputs = {
+            i: self.write_input(target, i)
+            for i in range(-self.args.warmup, self.args.runs)
+        }
+        if target.startswith("api-"):
+            return await self._run_api(target, workflow, inputs)
+
+        async def run_once(i: int) -> str | None:
+            result = await workflow.run(
+                start_event=FileEvent(file_input=inputs[i], is_source_content=False)
+            )
+            return result.error
+
+        return await _measure(
+            run_once, self.args.runs, self.args.warmup, self.args.concurrency
+        )
+
+    async def _run_api(
+        self, target: str, workflow: Workflow, inputs: dict[int, str]
+    ) -> dict[str, Any]:
+        workflow_name = target.removeprefix("api-")
+        _, content_type, extension = api.WORKFLOWS[workflow_name]
+        api.loaded_workflows[workflow_name] = workflow
+        transport = httpx.ASGITransport(app=api.create_app())
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", timeout=600
+        ) as client:
+
+            async def run_once(i: int) -> str | None:
+                with open(inputs[i], "rb") as f:
+                    content = f.read()
+                response = await client.post(
+                    f"/{workflow_name}",
+                    files={"upload_file": (f"input{extension}", content, content_type)},
+                )
+                if response.status_code != 200:
+                    return f"HTTP {response.status_code}: {response.text[:200]}"
+                return None
+
+            return await _measure(
+                run_once, self.args.runs, self.args.warmup, self.args.concurrency
+            )
+
+
+async def run_benchmarks(args: argparse.Namespace) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    if not args.rate_limits:
+        for dependency in ("llama_cloud", "openai"):
+            retry_policy(dependency).limiter = None
+    with RegionServer(latency_seconds=args.download_latency) as region_server:
+        benchmark = Benchmark(args, region_server)
+        try:
+            for target in args.targets:
+                logging.warning(f"Benchmarking {target}...")
+                results[target] = await benchmark.run_target(target)
+        finally:
+            await shared_clients.aclose()
+    return results
+
+
+def compare(previous: dict[str, Any], current: dict[str, Any]) -> str:
+    lines = [f"Compared with {previous.get('label') or previous['timestamp']}:"]
+    for target, result in current["results"].items():
+        before = previous["results"].get(target)
+        if before is None:
+            continue
+        lines.append(f"  {target}")
+        for key in (
+            "runs_per_second",
+            "latency_p50_seconds",
+            "latency_p95_seconds",
+            "latency_p99_seconds",
+            "peak_rss_mb",
+        ):
+            old, new = before[key], result[key]
+            change = f"{(new - old) / old:+.1%}" if old else "n/a"
+            lines.append(f"    {key:<22} {old:>10} -> {new:<10} ({change})")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+    args = parse_args()
+    results = asyncio.run(run_benchmarks(args))
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "timestamp": timestamp,
+        "label": args.label,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output_dir", "compare", "label")
+        },
+        "results": results,
+        "metrics": metrics.summary(),
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    name = timestamp + (f"-{args.label}" if args.label else "") + ".json"
+    output_path = os.path.join(args.output_dir, name)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results saved to {output_path}", file=sys.stderr)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import io
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+
+SAMPLE_PRESENTATION = "data/Board-Deck-Template.pdf"
+XLSX_MAGIC = b"PK\x03\x04"
+TICKERS = ["ALPH", "BRVO", "CHRL", "DLTA", "ECHO", "FXTR", "GOLF", "HTEL", "INDG"]
+
+
+def portfolio_table(rows: int, seed: int) -> bytes:
+    """A portfolio of closed positions, serialized as parquet."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        ticker = rng.choice(TICKERS)
+        buy_date = date(2020, 1, 1) + timedelta(days=rng.randrange(1500))
+        days_held = rng.randrange(5, 700)
+        buy_price = round(rng.uniform(5, 500), 2)
+        sell_price = round(buy_price * rng.uniform(0.5, 1.8), 2)
+        quantity = rng.randrange(1, 1000)
+        records.append(
+            {
+                "Ticker": ticker,
+                "Company Name": f"{ticker.title()} Holdings {i % 17}",
+                "Buy Date": pd.Timestamp(buy_date),
+                "Sell Date": pd.Timestamp(buy_date + timedelta(days=days_held)),
+                "Days Held": days_held,
+                "Buy Price": buy_price,
+                "Sell Price": sell_price,
+                "Quantity": quantity,
+                "Total Cost": round(buy_price * quantity, 2),
+                "Total Proceeds": round(sell_price * quantity, 2),
+                "Profit/Loss": round((sell_price - buy_price) * quantity, 2),
+                "Return %": round((sell_price / buy_price - 1) * 100, 2),
+            }
+        )
+    buffer = io.BytesIO()
+    pd.DataFrame.from_records(records).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def spreadsheet_file(size_kb: int, seed: int) -> bytes:
+    """Opaque spreadsheet bytes: the local parser rejects them, so that they go
+    through the LlamaSheets stand-in, which never parses them. Every file is
+    distinct so that the upload cache is missed."""
+    rng = random.Random(seed)
+    return XLSX_MAGIC + rng.randbytes(max(0, size_kb * 1024 - len(XLSX_MAGIC)))
+
+
+def presentation_file(size_kb: int, seed: int) -> bytes:
+    """The sample deck padded to `size_kb` with a PDF comment.
+
+    The comment goes right before the final `startxref`, where it does not
+    shift any of the offsets of the cross-reference table.
+    """
+    with open(SAMPLE_PRESENTATION, "rb") as f:
+        content = f.read()
+    padding = max(0, size_kb * 1024 - len(content))
+    rng = random.Random(seed)
+    comment = (
+        f"% benchmark file {seed} ".encode()
+        + rng.randbytes(padding // 2).hex().encode()
+        + b"\n"
+    )
+    position = content.rindex(b"startxref")
+    return content[:position] + comment + content[position:]
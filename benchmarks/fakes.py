@@ -0,0 +1,309 @@
+import asyncio
+import random
+import types
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from uuid import uuid4
+
+from llama_cloud.types.beta import SheetsJob
+from llama_cloud.types.beta.sheets_job import Region
+from llama_cloud.types.classifier.job_get_results_response import (
+    Item,
+    ItemResult,
+    JobGetResultsResponse,
+)
+from llama_cloud.types.extraction.job_get_result_response import JobGetResultResponse
+from llama_cloud.types.file_create_response import FileCreateResponse
+from llama_cloud.types.presigned_url import PresignedURL
+from openai.lib.streaming.responses import ResponseTextDeltaEvent
+from openai.types.responses import ResponseUsage
+from openai.types.responses.response_usage import (
+    InputTokensDetails,
+    OutputTokensDetails,
+)
+from pydantic import BaseModel
+
+from .server import RegionServer
+
+CHARS_PER_TOKEN = 4
+
+
+class Latency:
+    """Simulated service latency: uniformly spread around `mean_seconds`."""
+
+    def __init__(self, mean_seconds: float, jitter: float = 0.5) -> None:
+        self.mean_seconds = mean_seconds
+        self.jitter = jitter
+
+    async def wait(self, scale: float = 1.0) -> None:
+        if self.mean_seconds <= 0:
+            return
+        spread = self.mean_seconds * self.jitter
+        await asyncio.sleep(
+            scale
+            * random.uniform(self.mean_seconds - spread, self.mean_seconds + spread)
+        )
+
+
+def fake_json(schema: dict[str, Any], defs: dict[str, Any] | None = None) -> Any:
+    """Build a plausible value matching a JSON schema."""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return fake_json(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return fake_json(options[0], defs) if options else None
+    if "enum" in schema:
+        return schema["enum"][0]
+    match schema.get("type"):
+        case "object":
+            return {
+                name: fake_json(prop, defs)
+                for name, prop in schema.get("properties", {}).items()
+            }
+        case "array":
+            return [fake_json(schema.get("items", {}), defs) for _ in range(3)]
+        case "number":
+            return round(random.uniform(1, 1000), 2)
+        case "integer":
+            return random.randrange(1, 1000)
+        case "boolean":
+            return True
+        case _ if "ISO" in schema.get("description", ""):
+            return f"2024-{random.randrange(1, 13):02d}-{random.randrange(1, 29):02d}"
+        case _:
+            title = schema.get("title", "value")
+            return f"{title}: " + " ".join(
+                random.choice(["growth", "margin", "revenue", "risk", "cash", "churn"])
+                for _ in range(12)
+            )
+
+
+def fake_instance[ModelT: BaseModel](schema: type[ModelT]) -> ModelT:
+    return schema.model_validate(fake_json(schema.model_json_schema()))
+
+
+class FakeFiles:
+    def __init__(self, latency: Latency) -> None:
+        self.latency = latency
+
+    async def create(
+        self, file: Any, purpose: str, external_file_id: str, **kwargs: Any
+    ):
+        await self.latency.wait()
+        return FileCreateResponse(
+            id=f"file-{uuid4().hex}",
+            name=str(external_file_id).rsplit("/", 1)[-1],
+            project_id="benchmark",
+            external_file_id=str(external_file_id),
+            purpose=purpose,
+        )
+
+    async def get(self, file_id: str, **kwargs: Any) -> PresignedURL:
+        await self.latency.wait(0.2)
+        return PresignedURL(
+            url=f"https://files.invalid/{file_id}",
+            expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+        )
+
+
+class FakeSheets:
+    def __init__(
+        self, latency: Latency, region_server: RegionServer, region_ids: list[str]
+    ) -> None:
+        self.latency = latency
+        self.region_server = region_server
+        self.region_ids = region_ids
+
+    async def parse(self, file_id: str, **kwargs: Any) -> SheetsJob:
+        await self.latency.wait(len(self.region_ids))
+        return SheetsJob.model_construct(
+            id=f"sheets-{uuid4().hex}",
+            file_id=file_id,
+            project_id="benchmark",
+            status="SUCCESS",
+            success=True,
+            regions=[
+                Region(
+                    region_id=region_id,
+                    region_type="table",
+                    sheet_name="Portfolio",
+                    location=f"A1:L{i}",
+                )
+                for i, region_id in enumerate(self.region_ids)
+            ],
+        )
+
+    async def get_result_table(
+        self, region_type: str, spreadsheet_job_id: str, region_id: str, **kwargs: Any
+    ) -> PresignedURL:
+        await self.latency.wait(0.2)
+        return PresignedURL(
+            url=self.region_server.url(region_id),
+            expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+        )
+
+
+class FakeClassifier:
+    def __init__(self, latency: Latency) -> None:
+        self.latency = latency
+
+    async def classify(
+        self, file_ids: list[str], rules: list[Any], mode: str, **kwargs: Any
+    ) -> JobGetResultsResponse:
+        await self.latency.wait(2)
+        return JobGetResultsResponse(
+            items=[
+                Item.model_construct(
+                    id=uuid4().hex,
+                    file_id=file_id,
+                    result=ItemResult(
+                        type=random.choice(rules)["type"],
+                        reasoning="The deck reviews the quarter for the board.",
+                        confidence=0.9,
+                    ),
+                )
+                for file_id in file_ids
+            ],
+            total_size=len(file_ids),
+        )
+
+
+class FakeExtraction:
+    def __init__(self, latency: Latency) -> None:
+        self.latency = latency
+
+    async def extract(
+        self, data_schema: dict[str, Any], config: Any, file_id: str, **kwargs: Any
+    ) -> JobGetResultResponse:
+        await self.latency.wait(4)
+        return JobGetResultResponse(
+            data=fake_json(data_schema),
+            extraction_agent_id="benchmark",
+            extraction_metadata={},
+            run_id=uuid4().hex,
+        )
+
+
+class FakeLlamaCloud:
+    """Stand-in for `AsyncLlamaCloud` covering the calls made by the workflows."""
+
+    def __init__(
+        self, latency: Latency, region_server: RegionServer, region_ids: list[str]
+    ) -> None:
+        self.files = FakeFiles(latency)
+        self.beta = types.SimpleNamespace(
+            sheets=FakeSheets(latency, region_server, region_ids)
+        )
+        self.classifier = FakeClassifier(latency)
+        self.extraction = FakeExtraction(latency)
+
+
+def _usage(input_chars: int, output_chars: int) -> ResponseUsage:
+    input_tokens = input_chars // CHARS_PER_TOKEN
+    output_tokens = output_chars // CHARS_PER_TOKEN
+    return ResponseUsage(
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        total_tokens=input_tokens + output_tokens,
+        input_tokens_details=InputTokensDetails(cached_tokens=0),
+        output_tokens_details=OutputTokensDetails(reasoning_tokens=0),
+    )
+
+
+def _input_chars(messages: Any) -> int:
+    return sum(len(str(message.get("content", ""))) for message in messages)
+
+
+class FakeResponses:
+    def __init__(self, latency: Latency) -> None:
+        self.latency = latency
+
+    async def parse(
+        self, text_format: type[BaseModel], model: str, input: Any, **kwargs: Any
+    ):
+        parsed = fake_instance(text_format)
+        output_text = parsed.model_dump_json()
+        input_chars = _input_chars(input)
+        # Latency grows with the prompt, like the real API.
+        await self.latency.wait(1 + input_chars / 100_000)
+        return types.SimpleNamespace(
+            output_parsed=parsed,
+            output_text=output_text,
+            usage=_usage(input_chars, len(output_text)),
+        )
+
+    def stream(
+        self, text_format: type[BaseModel], model: str, input: Any, **kwargs: Any
+    ) -> "FakeResponseStream":
+        parsed = fake_instance(text_format)
+        input_chars = _input_chars(input)
+        return FakeResponseStream(
+            self.latency,
+            parsed,
+            1 + input_chars / 100_000,
+            _usage(input_chars, len(parsed.model_dump_json())),
+        )
+
+    async def create(self, model: str, input: Any, **kwargs: Any):
+        input_chars = _input_chars(input)
+        await self.latency.wait(1 + input_chars / 100_000)
+        output_text = "Summary of the earlier conversation."
+        return types.SimpleNamespace(
+            output_text=output_text, usage=_usage(input_chars, len(output_text))
+        )
+
+
+class FakeResponseStream:
+    """Streams the JSON of a response in small deltas, spread over its latency.
+
+    A tenth of the latency passes before the first delta, like the time to
+    first token of the real API.
+    """
+
+    DELTA_CHARS = 8
+
+    def __init__(
+        self, latency: Latency, parsed: BaseModel, scale: float, usage: ResponseUsage
+    ) -> None:
+        self.latency = latency
+        self.parsed = parsed
+        self.scale = scale
+        self.usage = usage
+
+    async def __aenter__(self) -> "FakeResponseStream":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        return None
+
+    async def __aiter__(self):
+        text = self.parsed.model_dump_json()
+        deltas = range(0, len(text), self.DELTA_CHARS)
+        await self.latency.wait(self.scale / 10)
+        for i, start in enumerate(deltas):
+            await self.latency.wait(self.scale * 0.9 / len(deltas))
+            yield ResponseTextDeltaEvent(
+                type="response.output_text.delta",
+                content_index=0,
+                item_id="benchmark",
+                logprobs=[],
+                output_index=0,
+                sequence_number=i,
+                delta=text[start : start + self.DELTA_CHARS],
+                snapshot=text[: start + self.DELTA_CHARS],
+            )
+
+    async def get_final_response(self):
+        return types.SimpleNamespace(
+            output_parsed=self.parsed,
+            output_text=self.parsed.model_dump_json(),
+            usage=self.usage,
+        )
+
+
+class FakeOpenAI:
+    """Stand-in for `AsyncOpenAI` covering the Responses API calls of `OpenAILLM`."""
+
+    def __init__(self, latency: Latency) -> None:
+        self.responses = FakeResponses(latency)
@@ -0,0 +1,109 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# Libraries each entry point cannot do without, measured on the same machine so
+# that the budgets hold on slower or faster ones.
+FLOORS = {
+    "investments_review.api": "workflows, starlette.applications, uvicorn",
+    "investments_review.sheets.main": "workflows",
+    "investments_review.presentations.main": "workflows",
+}
+# Median import time budgets, as multiples of the import time of the floor.
+BUDGETS = {
+    "investments_review.api": 1.3,
+    "investments_review.sheets.main": 1.4,
+    "investments_review.presentations.main": 1.4,
+}
+# Modules that must only be loaded once a workflow runs.
+DEFERRED_MODULES = {
+    "investments_review.api": [
+        "llama_cloud",
+        "numpy",
+        "openai",
+        "openpyxl",
+        "pandas",
+        "pyarrow",
+        "pypdf",
+    ],
+    "investments_review.sheets.main": [
+        "numpy",
+        "openai",
+        "openpyxl",
+        "pandas",
+        "pyarrow",
+    ],
+    "investments_review.presentations.main": ["llama_cloud", "pypdf"],
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.import_time",
+        description="Check the import time of the entry points against a budget",
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Imports per module")
+    return parser.parse_args()
+
+
+def import_seconds(modules: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {modules}"], check=True)
+    return time.perf_counter() - start
+
+
+def import_ratio(module: str, floor: str, runs: int) -> tuple[float, float]:
+    """Median import time of `module` and its ratio to the import time of `floor`.
+
+    Both are measured without the interpreter startup and in turns, so that a
+    busy machine slows down both of them.
+    """
+    seconds = []
+    ratios = []
+    for _ in range(runs):
+        baseline = import_seconds("sys")
+        floor_seconds = import_seconds(floor) - baseline
+        module_seconds = import_seconds(module) - baseline
+        seconds.append(module_seconds)
+        ratios.append(module_seconds / floor_seconds)
+    return statistics.median(seconds), statistics.median(ratios)
+
+
+def loaded_modules(module: str, candidates: list[str]) -> list[str]:
+    code = (
+        f"import json, sys, {module}; "
+        f"print(json.dumps([m for m in {candidates!r} if m in sys.modules]))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+
+def main() -> None:
+    args = parse_args()
+    failures: list[str] = []
+    for module, budget in BUDGETS.items():
+        seconds, ratio = import_ratio(module, FLOORS[module], args.runs)
+        print(
+            f"{module:<40} {seconds:.3f}s, {ratio:.2f}x {FLOORS[module]} "
+            f"(budget {budget}x)"
+        )
+        if ratio > budget:
+            failures.append(
+                f"{module} took {ratio:.2f}x the import time of {FLOORS[module]}, "
+                f"over {budget}x"
+            )
+        loaded = loaded_modules(module, DEFERRED_MODULES.get(module, []))
+        if loaded:
+            failures.append(f"{module} loads {', '.join(loaded)} at import")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
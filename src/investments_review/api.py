@@ -1,18 +1,72 @@
+import argparse
+import asyncio
+import importlib
 import logging
 import os
-from mimetypes import guess_extension
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
 
 import aiofiles
 import uvicorn
 from starlette.applications import Starlette
-from starlette.datastructures import UploadFile
 from starlette.exceptions import HTTPException
 from starlette.requests import Request
-from starlette.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from starlette.responses import (
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
+from workflows import Workflow
 
-from .presentations.workflow import workflow as presentations_workflow
+from .clients import shared_clients
+from .exceptions import (
+    InvalidUploadError,
+    JobRegistryFullError,
+    ServerDrainingError,
+    UploadTooLargeError,
+)
+from .jobs import job_registry
+from .metrics import metrics
+from .server import (
+    WORKERS_ENV,
+    drain_on_signal,
+    run_tracker,
+    server_config,
+    worker_count,
+)
 from .shared import FileEvent
-from .sheets.workflow import workflow as sheets_workflow
+from .uploads import limit_request_size, receive_upload, uploads_config
+
+SHEETS_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+)
+PRESENTATIONS_CONTENT_TYPE = "application/pdf"
+
+# Module defining each workflow, with the content type and extension of its input.
+WORKFLOWS: dict[str, tuple[str, str, str]] = {
+    "sheets": (
+        "investments_review.sheets.workflow",
+        SHEETS_CONTENT_TYPE,
+        ".xlsx",
+    ),
+    "presentations": (
+        "investments_review.presentations.workflow",
+        PRESENTATIONS_CONTENT_TYPE,
+        ".pdf",
+    ),
+}
+loaded_workflows: dict[str, Workflow] = {}
+
+
+async def get_workflow(workflow_name: str) -> Workflow:
+    """Return a workflow, importing its module off the event loop on first use."""
+    if workflow_name not in loaded_workflows:
+        module = await asyncio.to_thread(
+            importlib.import_module, WORKFLOWS[workflow_name][0]
+        )
+        loaded_workflows.setdefault(workflow_name, module.workflow)
+    return loaded_workflows[workflow_name]
 
 
 async def home_route(request: Request) -> HTMLResponse:
@@ -27,108 +81,225 @@ async def scripts_route(request: Request) -> PlainTextResponse:
     return PlainTextResponse(content=content, media_type="text/javascript")
 
 
-async def sheets_workflow_route(request: Request) -> JSONResponse:
-    if request.method.lower() != "post":
-        raise HTTPException(
-            status_code=405, detail=f"Method not allowed: {request.method}"
+async def _save_uploaded_file(
+    request: Request, default_content_type: str, default_extension: str
+) -> tuple[str, dict[str, str]]:
+    """Stream the `upload_file` form field to a temporary file.
+
+    Returns the path of the temporary file and the other text fields of the form.
+    """
+    config = uploads_config()
+    try:
+        return await receive_upload(
+            limit_request_size(request, config.max_upload_bytes),
+            "upload_file",
+            default_content_type,
+            default_extension,
+            chunk_size=config.chunk_size,
         )
-    async with request.form() as form:
-        if isinstance((uploaded_file := form["upload_file"]), UploadFile):
-            extension = (
-                guess_extension(
-                    uploaded_file.headers.get(
-                        "Content-Type",
-                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    )
-                )
-                or ".xlsx"
-            )
-            file_content = await uploaded_file.read()
-            tempfile = await aiofiles.tempfile.NamedTemporaryFile(
-                suffix=extension, delete_on_close=False, delete=False
-            )
-            with open(tempfile.name, "wb") as f:
-                f.write(file_content)
-            try:
-                start_event = FileEvent(
-                    file_input=str(tempfile.name), is_source_content=False
-                )
-                run_result = await sheets_workflow.run(start_event=start_event)
-                if run_result.error is None:
-                    return JSONResponse(
-                        content=run_result.model_dump(),
-                        status_code=200,
-                        media_type="application/json",
-                    )
-                else:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=run_result.error,
-                    )
-            except Exception as e:
-                raise HTTPException(
-                    status_code=500, detail=f"Internal server error: {e}"
-                )
-            finally:
-                os.remove(str(tempfile.name))
+    except InvalidUploadError as e:
         raise HTTPException(
             status_code=400,
-            detail="Bad request: you should provide a multipart form file as an input to this API endpoint.",
+            detail=f"Bad request: {e}. You should provide a multipart form file as an input to this API endpoint.",
         )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
 
-async def presentations_workflow_route(request: Request) -> JSONResponse:
+async def _run_workflow_route(request: Request, workflow_name: str) -> JSONResponse:
     if request.method.lower() != "post":
         raise HTTPException(
             status_code=405, detail=f"Method not allowed: {request.method}"
         )
-    async with request.form() as form:
-        if isinstance((uploaded_file := form["upload_file"]), UploadFile):
-            extension = (
-                guess_extension(
-                    uploaded_file.headers.get(
-                        "Content-Type",
-                        "application/pdf",
-                    )
-                )
-                or ".pdf"
+    _, content_type, extension = WORKFLOWS[workflow_name]
+    workflow = await get_workflow(workflow_name)
+    try:
+        run_tracker.begin()
+    except ServerDrainingError as e:
+        raise _draining_error(e)
+    try:
+        file_path, fields = await _save_uploaded_file(request, content_type, extension)
+    except Exception:
+        run_tracker.end()
+        raise
+    try:
+        start_event = FileEvent(
+            file_input=file_path,
+            is_source_content=False,
+            document_type=fields.get("document_type"),
+        )
+        run_result = await workflow.run(start_event=start_event)
+        if run_result.error is None:
+            return JSONResponse(
+                content=run_result.model_dump(),
+                status_code=200,
+                media_type="application/json",
             )
-            file_content = await uploaded_file.read()
-            tempfile = await aiofiles.tempfile.NamedTemporaryFile(
-                suffix=extension, delete_on_close=False, delete=False
+        else:
+            raise HTTPException(
+                status_code=500,
+                detail=run_result.error,
             )
-            with open(tempfile.name, "wb") as f:
-                f.write(file_content)
-            try:
-                start_event = FileEvent(
-                    file_input=str(tempfile.name), is_source_content=False
-                )
-                run_result = await presentations_workflow.run(start_event=start_event)
-                if run_result.error is None:
-                    return JSONResponse(
-                        content=run_result.model_dump(),
-                        status_code=200,
-                        media_type="application/json",
-                    )
-                else:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=run_result.error,
-                    )
-            except Exception as e:
-                raise HTTPException(
-                    status_code=500, detail=f"Internal server error: {e}"
-                )
-            finally:
-                os.remove(str(tempfile.name))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+    finally:
+        os.remove(file_path)
+        run_tracker.end()
+
+
+def _draining_error(e: ServerDrainingError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(round(server_config().graceful_shutdown_seconds))},
+    )
+
+
+async def sheets_workflow_route(request: Request) -> JSONResponse:
+    return await _run_workflow_route(request, "sheets")
+
+
+async def presentations_workflow_route(request: Request) -> JSONResponse:
+    return await _run_workflow_route(request, "presentations")
+
+
+def _check_jobs_available() -> None:
+    # Jobs live in the memory of the worker running them, and the workers share
+    # one socket: the requests following a submission would reach other workers.
+    if worker_count() > 1:
         raise HTTPException(
-            status_code=400,
-            detail="Bad request: you should provide a multipart form file as an input to this API endpoint.",
+            status_code=501,
+            detail="The /jobs routes are only available with a single worker, "
+            "use the /sheets and /presentations routes instead",
         )
 
 
-def main() -> None:
-    app = Starlette()
+async def submit_job_route(request: Request) -> JSONResponse:
+    _check_jobs_available()
+    workflow_name = request.path_params["workflow"]
+    if workflow_name not in WORKFLOWS:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown workflow: {workflow_name}"
+        )
+    _, content_type, extension = WORKFLOWS[workflow_name]
+    workflow = await get_workflow(workflow_name)
+    try:
+        run_tracker.begin()
+    except ServerDrainingError as e:
+        raise _draining_error(e)
+    try:
+        file_path, fields = await _save_uploaded_file(request, content_type, extension)
+    except Exception:
+        run_tracker.end()
+        raise
+
+    async def remove_file() -> None:
+        try:
+            os.remove(file_path)
+        finally:
+            run_tracker.end()
+
+    start_event = FileEvent(
+        file_input=file_path,
+        is_source_content=False,
+        document_type=fields.get("document_type"),
+    )
+    try:
+        job = job_registry().submit(
+            workflow_name=workflow_name,
+            workflow=workflow,
+            start_event=start_event,
+            on_done=remove_file,
+        )
+    except JobRegistryFullError as e:
+        os.remove(file_path)
+        run_tracker.end()
+        raise HTTPException(status_code=503, detail=str(e))
+    return JSONResponse(
+        content={
+            "job_id": job.id,
+            "status": job.status,
+            "events_url": f"/jobs/{job.id}/events",
+            "result_url": f"/jobs/{job.id}",
+        },
+        status_code=202,
+    )
+
+
+async def job_result_route(request: Request) -> JSONResponse:
+    _check_jobs_available()
+    job = job_registry().get(request.path_params["job_id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return JSONResponse(content=job.to_dict(), status_code=200)
+
+
+async def job_events_route(request: Request) -> StreamingResponse:
+    _check_jobs_available()
+    job = job_registry().get(request.path_params["job_id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return StreamingResponse(
+        job.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def metrics_route(request: Request) -> PlainTextResponse:
+    # Each worker only has its own metrics: label them, so that the series of
+    # the workers answering successive scrapes are not mixed up.
+    labels = {"worker": str(os.getpid())} if worker_count() > 1 else None
+    return PlainTextResponse(
+        content=metrics.render(labels), media_type="text/plain; version=0.0.4"
+    )
+
+
+async def liveness_route(request: Request) -> JSONResponse:
+    return JSONResponse(
+        content={
+            "status": "alive",
+            "worker": os.getpid(),
+            "runs_in_flight": run_tracker.in_flight,
+        },
+        status_code=200,
+    )
+
+
+async def readiness_route(request: Request) -> JSONResponse:
+    if run_tracker.draining:
+        status = "draining"
+    elif not run_tracker.started:
+        status = "starting"
+    else:
+        status = "ready"
+    return JSONResponse(
+        content={
+            "status": status,
+            "worker": os.getpid(),
+            "runs_in_flight": run_tracker.in_flight,
+        },
+        status_code=200 if run_tracker.ready else 503,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette) -> AsyncGenerator[None]:
+    timeout_seconds = server_config().graceful_shutdown_seconds
+    run_tracker.started = True
+    drain_on_signal(timeout_seconds)
+    yield
+    # Runs were already drained when the shutdown came from a signal.
+    if not await run_tracker.drain(timeout_seconds):
+        logging.warning(
+            f"Worker {os.getpid()} stopped with {run_tracker.in_flight} workflow "
+            f"runs still in progress after {timeout_seconds}s"
+        )
+    await shared_clients.aclose()
+
+
+def create_app() -> Starlette:
+    app = Starlette(lifespan=lifespan)
     app.add_route(
         path="/",
         name="Home",
@@ -151,8 +322,77 @@ def main() -> None:
         route=presentations_workflow_route,
         methods=["POST"],
     )
-    logging.info("Starting server on http://0.0.0.0:8000")
+    app.add_route(
+        path="/jobs/{workflow}",
+        include_in_schema=True,
+        route=submit_job_route,
+        methods=["POST"],
+    )
+    app.add_route(
+        path="/jobs/{job_id}",
+        include_in_schema=True,
+        route=job_result_route,
+        methods=["GET"],
+    )
+    app.add_route(
+        path="/jobs/{job_id}/events",
+        include_in_schema=True,
+        route=job_events_route,
+        methods=["GET"],
+    )
+    app.add_route(
+        path="/metrics",
+        include_in_schema=False,
+        route=metrics_route,
+        methods=["GET"],
+    )
+    app.add_route(
+        path="/livez",
+        include_in_schema=False,
+        route=liveness_route,
+        methods=["GET"],
+    )
+    app.add_route(
+        path="/readyz",
+        include_in_schema=False,
+        route=readiness_route,
+        methods=["GET"],
+    )
+    return app
+
+
+def parse_args() -> argparse.Namespace:
+    config = server_config()
+    parser = argparse.ArgumentParser(description="Run the investments review API")
+    parser.add_argument("--host", default=config.host)
+    parser.add_argument("--port", type=int, default=config.port)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.workers,
+        help="Number of worker processes, each with its own workflows and clients",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    # Read by the workers to split the rate limits between them.
+    os.environ[WORKERS_ENV] = str(args.workers)
+    if args.workers > 1:
+        logging.warning(
+            "Jobs are kept in the memory of the worker that runs them: the /jobs "
+            "routes are disabled with more than one worker"
+        )
+    logging.info(f"Starting {args.workers} workers on http://{args.host}:{args.port}")
     try:
-        uvicorn.run(app)
+        uvicorn.run(
+            "investments_review.api:create_app",
+            factory=True,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            timeout_graceful_shutdown=round(server_config().graceful_shutdown_seconds),
+        )
     except KeyboardInterrupt:
         return None
@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Coroutine, TypeVar
+
+from pydantic import BaseModel
+
+from .clients import shared_clients
+from .metrics import metrics
+
+T = TypeVar("T")
+
+
+class BatchResult(BaseModel):
+    file: str
+    final_result: str | None = None
+    error: str | None = None
+    duration_seconds: float
+
+
+def expand_inputs(inputs: list[str], extensions: tuple[str, ...]) -> list[str]:
+    """Expand files, directories and glob patterns into a sorted list of files."""
+    files: list[str] = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                files.extend(
+                    os.path.join(root, name)
+                    for name in names
+                    if name.lower().endswith(extensions)
+                )
+        elif os.path.isfile(item):
+            files.append(item)
+        else:
+            matches = glob.glob(item, recursive=True)
+            if not matches:
+                raise ValueError(f"No such file, directory or pattern: {item}")
+            files.extend(match for match in matches if os.path.isfile(match))
+    return sorted(dict.fromkeys(files))
+
+
+def run(main: Coroutine[Any, Any, T]) -> T:
+    """Run the CLI coroutine, closing the shared clients before the loop stops.
+
+    The collected metrics are printed to stderr on exit.
+    """
+
+    async def run_and_close() -> T:
+        try:
+            return await main
+        finally:
+            await shared_clients.aclose()
+
+    try:
+        return asyncio.run(run_and_close())
+    finally:
+        print(json.dumps({"metrics": metrics.summary()}, indent=2), file=sys.stderr)
+
+
+def parse_args(description: str) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="Files, directories or glob patterns to process",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Maximum number of workflows running at the same time",
+    )
+    return parser.parse_args()
+
+
+async def _run_one(
+    run_workflow: Callable[[str], Awaitable[Any]],
+    file: str,
+    semaphore: asyncio.Semaphore,
+) -> BatchResult:
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            result = await run_workflow(file)
+            return BatchResult(
+                file=file,
+                final_result=result.final_result,
+                error=result.error,
+                duration_seconds=time.perf_counter() - start,
+            )
+        except Exception as e:
+            return BatchResult(
+                file=file,
+                error=f"{type(e).__name__}: {e}",
+                duration_seconds=time.perf_counter() - start,
+            )
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(percentile / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def run_batch(
+    run_workflow: Callable[[str], Awaitable[Any]],
+    files: list[str],
+    concurrency: int,
+) -> list[BatchResult]:
+    """Run the workflow on every file, printing one JSON line per finished run.
+
+    A throughput and latency summary is printed to stderr at the end.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    results: list[BatchResult] = []
+    for future in asyncio.as_completed(
+        [_run_one(run_workflow, file, semaphore) for file in files]
+    ):
+        result = await future
+        results.append(result)
+        print(result.model_dump_json(), flush=True)
+    elapsed = time.perf_counter() - start
+    durations = [result.duration_seconds for result in results]
+    summary = {
+        "files": len(results),
+        "succeeded": sum(result.error is None for result in results),
+        "failed": sum(result.error is not None for result in results),
+        "elapsed_seconds": round(elapsed, 3),
+        "runs_per_second": round(len(results) / elapsed, 3) if elapsed else None,
+        "latency_p50_seconds": round(_percentile(durations, 50), 3),
+        "latency_p95_seconds": round(_percentile(durations, 95), 3),
+        "latency_max_seconds": round(max(durations), 3),
+    }
+    print(json.dumps(summary), file=sys.stderr)
+    return results
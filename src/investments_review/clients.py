@@ -0,0 +1,125 @@
+import importlib.util
+import logging
+import os
+from typing import TYPE_CHECKING, Annotated, Any
+
+from pydantic import BaseModel
+from workflows.resource import ResourceConfig
+
+# The client libraries are imported when the first client is created, so that
+# importing this module (and the API) does not load them.
+if TYPE_CHECKING:
+    import httpx
+    from llama_cloud import AsyncLlamaCloud
+    from openai import AsyncOpenAI
+
+
+class HTTPClientConfig(BaseModel):
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry_seconds: float = 30
+    http2: bool = False
+    timeout_seconds: float = 60
+
+
+class SharedClients:
+    """Clients shared by every workflow run in the process, one per dependency."""
+
+    def __init__(self) -> None:
+        self.llama_cloud: "AsyncLlamaCloud | None" = None
+        self.openai: "AsyncOpenAI | None" = None
+        self.downloads: "httpx.AsyncClient | None" = None
+
+    async def aclose(self) -> None:
+        """Close the clients when the process shuts down.
+
+        Workflows keep the clients they were given in their resource cache, so
+        no workflow can run once they are closed.
+        """
+        clients = [
+            (client, close)
+            for client, close in (
+                (self.llama_cloud, "close"),
+                (self.openai, "close"),
+                (self.downloads, "aclose"),
+            )
+            if client is not None
+        ]
+        self.llama_cloud = self.openai = self.downloads = None
+        for client, close in clients:
+            try:
+                await getattr(client, close)()
+            except Exception as e:
+                logging.warning(f"Could not close {type(client).__name__}: {e}")
+
+
+shared_clients = SharedClients()
+
+
+def _httpx_kwargs(name: str, config: HTTPClientConfig) -> dict[str, Any]:
+    import httpx
+
+    http2 = config.http2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logging.warning(
+            f"HTTP/2 requested for {name} but the h2 package is not installed, "
+            "falling back to HTTP/1.1"
+        )
+        http2 = False
+    return {
+        "limits": httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry_seconds,
+        ),
+        "timeout": httpx.Timeout(config.timeout_seconds),
+        "http2": http2,
+    }
+
+
+def get_llama_cloud_client(
+    config: Annotated[
+        HTTPClientConfig,
+        ResourceConfig("config.json", path_selector="http_clients.llama_cloud"),
+    ],
+) -> "AsyncLlamaCloud":
+    import llama_cloud
+
+    if shared_clients.llama_cloud is None:
+        shared_clients.llama_cloud = llama_cloud.AsyncLlamaCloud(
+            api_key=os.getenv("LLAMA_CLOUD_API_KEY"),
+            max_retries=0,
+            http_client=llama_cloud.DefaultAsyncHttpxClient(
+                **_httpx_kwargs("llama_cloud", config)
+            ),
+        )
+    return shared_clients.llama_cloud
+
+
+def get_openai_client(api_key: str, config: HTTPClientConfig) -> "AsyncOpenAI":
+    import openai
+
+    if shared_clients.openai is None:
+        shared_clients.openai = openai.AsyncOpenAI(
+            api_key=api_key,
+            max_retries=0,
+            http_client=openai.DefaultAsyncHttpxClient(
+                **_httpx_kwargs("openai", config)
+            ),
+        )
+    return shared_clients.openai
+
+
+def get_download_client(
+    config: Annotated[
+        HTTPClientConfig,
+        ResourceConfig("config.json", path_selector="http_clients.downloads"),
+    ],
+) -> "httpx.AsyncClient":
+    import httpx
+
+    if shared_clients.downloads is None:
+        shared_clients.downloads = httpx.AsyncClient(
+            follow_redirects=True, **_httpx_kwargs("downloads", config)
+        )
+    return shared_clients.downloads
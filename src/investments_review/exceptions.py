@@ -20,3 +20,45 @@ class SheetParsingError(LlamaCloudAPIError):
     """Exception raised when sheet parsing fails or returns invalid data."""
 
     pass
+
+
+class JobRegistryFullError(Exception):
+    """Exception raised when the job registry cannot track any more jobs."""
+
+    pass
+
+
+class UploadTooLargeError(Exception):
+    """Exception raised when an uploaded file exceeds the maximum upload size."""
+
+    pass
+
+
+class InvalidUploadError(Exception):
+    """Exception raised when an upload is not a multipart form with a single file."""
+
+    pass
+
+
+class StreamInterruptedError(Exception):
+    """Exception raised when a streamed response fails after partial results were sent."""
+
+    pass
+
+
+class CircuitOpenError(Exception):
+    """Exception raised when a dependency is failing and calls to it are short-circuited."""
+
+    pass
+
+
+class ServerDrainingError(Exception):
+    """Exception raised when a run is submitted to a server that is shutting down."""
+
+    pass
+
+
+class UnsupportedSheetError(Exception):
+    """Exception raised when a workbook cannot be parsed locally and needs LlamaSheets."""
+
+    pass
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Literal
+from uuid import uuid4
+
+from pydantic import BaseModel
+from workflows import Workflow
+from workflows.events import Event, StartEvent, StopEvent
+
+from .exceptions import JobRegistryFullError
+
+JobStatus = Literal["running", "completed", "failed"]
+
+
+class JobsConfig(BaseModel):
+    max_jobs: int = 1000
+    ttl_seconds: float = 3600
+
+
+def load_jobs_config(config_file: str = "config.json") -> JobsConfig:
+    with open(config_file) as f:
+        return JobsConfig.model_validate(json.load(f).get("jobs", {}))
+
+
+class Job:
+    def __init__(self, workflow_name: str) -> None:
+        self.id = uuid4().hex
+        self.workflow_name = workflow_name
+        self.status: JobStatus = "running"
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.events: list[dict[str, Any]] = []
+        self.result: dict[str, Any] | None = None
+        self.error: str | None = None
+        self._changed = asyncio.Condition()
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "workflow": self.workflow_name,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+    async def _add_event(self, ev: Event) -> None:
+        async with self._changed:
+            self.events.append({"type": type(ev).__name__, "data": ev.model_dump()})
+            self._changed.notify_all()
+
+    async def _finish(
+        self, status: JobStatus, result: dict[str, Any] | None, error: str | None
+    ) -> None:
+        async with self._changed:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Yield the job events as server-sent events, replaying past ones first."""
+        index = 0
+        while True:
+            async with self._changed:
+                while index >= len(self.events) and not self.done:
+                    await self._changed.wait()
+                pending = self.events[index:]
+                index = len(self.events)
+                done = self.done
+            for event in pending:
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+            if done and index == len(self.events):
+                yield f"event: end\ndata: {json.dumps(self.to_dict())}\n\n"
+                return
+
+
+class JobRegistry:
+    """Bounded in-memory registry of background workflow runs.
+
+    Finished jobs are kept for `ttl_seconds` so that their events and result
+    can be fetched. When `max_jobs` are tracked, the oldest finished jobs are
+    evicted first; if every tracked job is still running, new jobs are refused.
+    """
+
+    def __init__(self, max_jobs: int = 1000, ttl_seconds: float = 3600) -> None:
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+
+    def _evict(self) -> None:
+        self._evict_expired()
+        for job_id, job in list(self._jobs.items()):
+            if len(self._jobs) < self.max_jobs:
+                break
+            if job.done:
+                del self._jobs[job_id]
+        if len(self._jobs) >= self.max_jobs:
+            raise JobRegistryFullError(
+                f"Too many running jobs (maximum: {self.max_jobs})"
+            )
+
+    def get(self, job_id: str) -> Job | None:
+        self._evict_expired()
+        return self._jobs.get(job_id)
+
+    def _evict_expired(self) -> None:
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and now - job.finished_at > self.ttl_seconds:
+                del self._jobs[job_id]
+
+    def submit(
+        self,
+        workflow_name: str,
+        workflow: Workflow,
+        start_event: StartEvent,
+        on_done: Callable[[], Awaitable[None]] | None = None,
+    ) -> Job:
+        self._evict()
+        job = Job(workflow_name=workflow_name)
+        self._jobs[job.id] = job
+        job._task = asyncio.create_task(self._run(job, workflow, start_event, on_done))
+        return job
+
+    async def _run(
+        self,
+        job: Job,
+        workflow: Workflow,
+        start_event: StartEvent,
+        on_done: Callable[[], Awaitable[None]] | None,
+    ) -> None:
+        try:
+            handler = workflow.run(start_event=start_event)
+            async for ev in handler.stream_events():
+                if not isinstance(ev, StopEvent):
+                    await job._add_event(ev)
+            result = await handler
+            if result.error is None:
+                await job._finish("completed", result.model_dump(), None)
+            else:
+                await job._finish("failed", result.model_dump(), result.error)
+        except Exception as e:
+            logging.error(f"Job {job.id} failed: {e}")
+            await job._finish("failed", None, f"{type(e).__name__}: {e}")
+        finally:
+            if on_done is not None:
+                await on_done()
+
+
+_job_registry: JobRegistry | None = None
+
+
+def job_registry() -> JobRegistry:
+    """Return the process-wide job registry, creating it on first use."""
+    global _job_registry
+    if _job_registry is None:
+        config = load_jobs_config()
+        _job_registry = JobRegistry(
+            max_jobs=config.max_jobs, ttl_seconds=config.ttl_seconds
+        )
+    return _job_registry
@@ -0,0 +1,323 @@
+import math
+import time
+from functools import wraps
+from typing import Any, Awaitable, Callable, Concatenate, ParamSpec, TypeVar
+
+P = ParamSpec("P")
+T = TypeVar("T")
+S = TypeVar("S")
+M = TypeVar("M", "Counter", "Histogram", "Gauge")
+
+LabelKey = tuple[tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+    600,
+)
+SIZE_BUCKETS = (1_000, 5_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000)
+BYTE_BUCKETS = tuple(2**power for power in range(16, 34, 2))
+
+
+def _key(labels: dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: dict[str, str] | None = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def _summary_key(key: LabelKey) -> str:
+    return ",".join(f"{name}={value}" for name, value in key) or "total"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self.values: dict[LabelKey, float] = {}
+
+    def inc(self, labels: dict[str, str] | None = None, amount: float = 1) -> None:
+        key = _key(labels or {})
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self, extra: dict[str, str] | None = None) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+        ]
+        for key, value in sorted(self.values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(key, extra)} {_format_value(value)}"
+            )
+        return lines
+
+    def summary(self) -> dict[str, float]:
+        return {
+            _summary_key(key): round(value, 6)
+            for key, value in sorted(self.values.items())
+        }
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.counts: dict[LabelKey, list[int]] = {}
+        self.sums: dict[LabelKey, float] = {}
+        self.maxima: dict[LabelKey, float] = {}
+
+    def observe(self, value: float, labels: dict[str, str] | None = None) -> None:
+        key = _key(labels or {})
+        counts = self.counts.setdefault(key, [0] * len(self.buckets))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        self.sums[key] = self.sums.get(key, 0) + value
+        self.maxima[key] = max(self.maxima.get(key, value), value)
+
+    def quantile(self, key: LabelKey, q: float) -> float:
+        """Estimate a quantile by linear interpolation within its bucket."""
+        counts = self.counts[key]
+        rank = q * sum(counts)
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, counts):
+            if count and seen + count >= rank:
+                upper = bound if not math.isinf(bound) else self.maxima[key]
+                estimate = lower + (upper - lower) * (rank - seen) / count
+                return min(estimate, self.maxima[key])
+            seen += count
+            lower = bound
+        return self.maxima[key]
+
+    def render(self, extra: dict[str, str] | None = None) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for key, counts in sorted(self.counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(
+                    key, {**(extra or {}), "le": _format_value(bound)}
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(key, extra)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self.sums[key])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        result: dict[str, dict[str, float]] = {}
+        for key, counts in sorted(self.counts.items()):
+            count = sum(counts)
+            result[_summary_key(key)] = {
+                "count": count,
+                "mean": round(self.sums[key] / count, 6),
+                "p50": round(self.quantile(key, 0.5), 6),
+                "p95": round(self.quantile(key, 0.95), 6),
+                "max": round(self.maxima[key], 6),
+            }
+        return result
+
+
+class Gauge:
+    """Gauge whose values are read from `collect` when the metrics are exported."""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        collect: Callable[[], list[tuple[dict[str, str], float]]],
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.collect = collect
+
+    def render(self, extra: dict[str, str] | None = None) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.collect():
+            lines.append(
+                f"{self.name}{_format_labels(_key(labels), extra)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+    def summary(self) -> dict[str, float]:
+        return {
+            _summary_key(_key(labels)): round(value, 6)
+            for labels, value in self.collect()
+        }
+
+
+class MetricsRegistry:
+    """Process-wide metrics, exported in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram | Gauge] = {}
+
+    def _register(self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(Counter(name, description))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, description, buckets))
+
+    def gauge(
+        self,
+        name: str,
+        description: str,
+        collect: Callable[[], list[tuple[dict[str, str], float]]],
+    ) -> Gauge:
+        return self._register(Gauge(name, description, collect))
+
+    def render(self, labels: dict[str, str] | None = None) -> str:
+        """Metrics in the Prometheus text format, with `labels` added to each series."""
+        lines: list[str] = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render(labels))
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict[str, Any]:
+        """Non-empty metrics as a dictionary, with quantile estimates for histograms."""
+        result: dict[str, Any] = {}
+        for name in sorted(self._metrics):
+            summary = self._metrics[name].summary()
+            if summary:
+                result[name] = summary
+        return result
+
+
+metrics = MetricsRegistry()
+
+STEP_DURATION = metrics.histogram(
+    "workflow_step_duration_seconds", "Duration of workflow steps"
+)
+STEP_RUNS = metrics.counter("workflow_step_runs_total", "Workflow step runs by outcome")
+DEPENDENCY_CALL_DURATION = metrics.histogram(
+    "dependency_call_duration_seconds",
+    "Duration of calls to OpenAI and LlamaCloud, retries included",
+)
+DEPENDENCY_CALLS = metrics.counter(
+    "dependency_calls_total", "Calls to OpenAI and LlamaCloud by outcome"
+)
+DEPENDENCY_RETRIES = metrics.counter(
+    "dependency_retries_total", "Retried calls to OpenAI and LlamaCloud"
+)
+RATE_LIMIT_WAIT = metrics.histogram(
+    "rate_limit_wait_seconds", "Time spent waiting for the rate limiters"
+)
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens used by OpenAI calls")
+LLM_COST = metrics.counter(
+    "llm_cost_usd_total", "Estimated cost of OpenAI calls in US dollars"
+)
+LLM_HISTORY_CHARS = metrics.histogram(
+    "llm_history_chars", "Size of the chat histories sent to OpenAI", SIZE_BUCKETS
+)
+LLM_FIRST_FIELD_SECONDS = metrics.histogram(
+    "llm_time_to_first_field_seconds",
+    "Time until the first field of a streamed OpenAI response is complete",
+)
+LLM_CACHE_REQUESTS = metrics.counter(
+    "llm_cache_requests_total", "LLM response cache lookups by result"
+)
+TIER_RUNS = metrics.counter(
+    "llama_cloud_tier_runs_total",
+    "LlamaCloud classify and extract runs by mode and outcome of the quality checks",
+)
+TIER_DURATION = metrics.histogram(
+    "llama_cloud_tier_duration_seconds",
+    "Duration of LlamaCloud classify and extract runs by mode",
+)
+EXTRACTION_QUALITY_ISSUES = metrics.counter(
+    "extraction_quality_issues_total",
+    "Extracted fields failing the quality checks, by mode",
+)
+SHEET_PARSES = metrics.counter(
+    "sheet_parses_total", "Spreadsheets parsed locally or sent to LlamaSheets"
+)
+SHEET_TABLE_BYTES = metrics.histogram(
+    "sheet_table_memory_bytes",
+    "Memory used by the dataframes loaded from parquet regions",
+    BYTE_BUCKETS,
+)
+SHEET_TABLES_SAMPLED = metrics.counter(
+    "sheet_tables_sampled_total",
+    "Parquet regions sampled to stay within the memory limit",
+)
+CLASSIFICATIONS = metrics.counter(
+    "presentation_classifications_total", "Presentation classifications by source"
+)
+
+
+def timed_step(
+    f: Callable[Concatenate[S, P], Awaitable[T]],
+) -> Callable[Concatenate[S, P], Awaitable[T]]:
+    """Record the duration and outcome of a workflow step.
+
+    A step fails when it raises or when the event it returns carries an error.
+    Apply it below `@step`.
+    """
+
+    step_name = getattr(f, "__name__", repr(f))
+
+    @wraps(f)
+    async def wrapper(self: S, *args: P.args, **kwargs: P.kwargs) -> T:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await f(self, *args, **kwargs)
+            if getattr(result, "error", None) is None:
+                outcome = "success"
+            return result
+        finally:
+            labels = {"workflow": type(self).__name__, "step": step_name}
+            STEP_DURATION.observe(time.perf_counter() - start, labels)
+            STEP_RUNS.inc(labels | {"outcome": outcome})
+
+    return wrapper
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import time
+from typing import Annotated, Literal
+
+from llama_cloud import AsyncLlamaCloud
+from llama_cloud.types.classifier.classifier_rule_param import ClassifierRuleParam
+from llama_cloud.types.classifier.job_get_results_response import Item
+from pydantic import BaseModel
+from workflows.resource import ResourceConfig
+
+from ..metrics import TIER_DURATION, TIER_RUNS
+from ..retry import retry_policy
+from .models import rules
+
+
+ClassificationMode = Literal["FAST", "MULTIMODAL"]
+
+
+class ClassificationConfig(BaseModel):
+    mode: ClassificationMode = "FAST"
+    escalation_mode: ClassificationMode | None = "MULTIMODAL"
+    escalation_confidence_threshold: float = 0.6
+    max_batch_size: int = 10
+    max_wait_seconds: float = 0.05
+
+
+class ClassificationBatcher:
+    """Group classification requests from concurrent runs into batched calls.
+
+    Requests are collected until `max_batch_size` file IDs are pending or
+    `max_wait_seconds` have passed since the first one arrived. A single
+    classify call is then sent for the whole batch and each item is routed back
+    to the run that asked for it.
+
+    Items classified with a confidence below `escalation_confidence_threshold`
+    are classified again in `escalation_mode`, batched the same way.
+    """
+
+    def __init__(
+        self,
+        rules: list[ClassifierRuleParam],
+        mode: ClassificationMode = "FAST",
+        escalation_mode: ClassificationMode | None = "MULTIMODAL",
+        escalation_confidence_threshold: float = 0.6,
+        max_batch_size: int = 10,
+        max_wait_seconds: float = 0.05,
+    ) -> None:
+        self.rules = rules
+        self.mode: ClassificationMode = mode
+        self.escalation_mode: ClassificationMode | None = escalation_mode
+        self.escalation_confidence_threshold = escalation_confidence_threshold
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._pending: dict[
+            ClassificationMode, list[tuple[str, asyncio.Future[Item | None]]]
+        ] = {}
+        self._timers: dict[ClassificationMode, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def is_confident(self, item: Item | None) -> bool:
+        return (
+            item is not None
+            and item.result is not None
+            and item.result.type is not None
+            and item.result.confidence >= self.escalation_confidence_threshold
+        )
+
+    async def classify(
+        self, llama_cloud_client: AsyncLlamaCloud, file_id: str
+    ) -> Item | None:
+        item = await self._classify(llama_cloud_client, file_id, self.mode)
+        if self.is_confident(item):
+            outcome = "passed"
+        elif self.escalation_mode is None or self.escalation_mode == self.mode:
+            outcome = "failed"
+        else:
+            outcome = "escalated"
+        TIER_RUNS.inc({"operation": "classify", "mode": self.mode, "outcome": outcome})
+        if outcome != "escalated" or self.escalation_mode is None:
+            return item
+        logging.info(
+            f"Classification confidence below {self.escalation_confidence_threshold}: "
+            f"classifying again in {self.escalation_mode} mode"
+        )
+        try:
+            escalated = await self._classify(
+                llama_cloud_client, file_id, self.escalation_mode
+            )
+        except Exception as e:
+            logging.warning(
+                f"Could not classify in {self.escalation_mode} mode ({e}), "
+                f"keeping the {self.mode} classification"
+            )
+            escalated = None
+        TIER_RUNS.inc(
+            {
+                "operation": "classify",
+                "mode": self.escalation_mode,
+                "outcome": "passed" if self.is_confident(escalated) else "failed",
+            }
+        )
+        if escalated is None or escalated.result is None:
+            return item
+        return escalated
+
+    async def _classify(
+        self,
+        llama_cloud_client: AsyncLlamaCloud,
+        file_id: str,
+        mode: ClassificationMode,
+    ) -> Item | None:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[Item | None] = loop.create_future()
+        pending = self._pending.setdefault(mode, [])
+        pending.append((file_id, future))
+        if len(pending) >= self.max_batch_size:
+            self._flush(llama_cloud_client, mode)
+        elif mode not in self._timers:
+            self._timers[mode] = loop.call_later(
+                self.max_wait_seconds, self._flush, llama_cloud_client, mode
+            )
+        return await future
+
+    def _flush(
+        self, llama_cloud_client: AsyncLlamaCloud, mode: ClassificationMode
+    ) -> None:
+        timer = self._timers.pop(mode, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(mode, [])
+        if not batch:
+            return
+        task = asyncio.create_task(self._send(llama_cloud_client, batch, mode))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(
+        self,
+        llama_cloud_client: AsyncLlamaCloud,
+        batch: list[tuple[str, asyncio.Future[Item | None]]],
+        mode: ClassificationMode,
+    ) -> None:
+        file_ids = list(dict.fromkeys(file_id for file_id, _ in batch))
+        logging.info(f"Classifying a batch of {len(file_ids)} files in {mode} mode")
+        start = time.perf_counter()
+        try:
+            result = await retry_policy("llama_cloud").call(
+                llama_cloud_client.classifier.classify,
+                file_ids=file_ids,
+                rules=self.rules,
+                mode=mode,
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            TIER_DURATION.observe(
+                time.perf_counter() - start, {"operation": "classify", "mode": mode}
+            )
+        items = {item.file_id: item for item in result.items}
+        for file_id, future in batch:
+            if not future.done():
+                future.set_result(items.get(file_id))
+
+
+def get_classification_batcher(
+    config: Annotated[
+        ClassificationConfig,
+        ResourceConfig("config.json", path_selector="classification"),
+    ],
+) -> ClassificationBatcher:
+    return ClassificationBatcher(
+        rules=rules,
+        mode=config.mode,
+        escalation_mode=config.escalation_mode,
+        escalation_confidence_threshold=config.escalation_confidence_threshold,
+        max_batch_size=config.max_batch_size,
+        max_wait_seconds=config.max_wait_seconds,
+    )
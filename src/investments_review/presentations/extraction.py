@@ -0,0 +1,183 @@
+import logging
+import time
+from datetime import datetime
+from typing import Annotated, Any, Literal, TypeVar
+
+from llama_cloud import AsyncLlamaCloud
+from llama_cloud.types.extraction.extract_config_param import ExtractConfigParam
+from pydantic import BaseModel, ValidationError
+from workflows.resource import ResourceConfig
+
+from ..exceptions import ExtractionError
+from ..metrics import EXTRACTION_QUALITY_ISSUES, TIER_DURATION, TIER_RUNS
+from ..retry import retry_policy
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+ExtractionMode = Literal["FAST", "BALANCED", "PREMIUM", "MULTIMODAL"]
+
+EMPTY_VALUES = {"", "n/a", "na", "none", "null", "unknown", "not available"}
+DATE_FORMATS = ("%Y-%m", "%Y", "%B %Y", "%b %Y", "%d %B %Y", "%B %d, %Y")
+
+
+class ExtractionConfig(BaseModel):
+    modes: list[ExtractionMode] = ["FAST", "BALANCED"]
+
+
+def _is_date(value: str) -> bool:
+    try:
+        datetime.fromisoformat(value)
+        return True
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            datetime.strptime(value, date_format)
+            return True
+        except ValueError:
+            continue
+    return False
+
+
+def quality_issues(
+    schema: type[BaseModel], data: dict[str, Any], prefix: str = ""
+) -> list[str]:
+    """Paths of the fields of `data` that are missing, empty, zero or not dates.
+
+    Fields described as ISO strings must parse as dates; fields failing the
+    validation of `schema` are reported too.
+    """
+    issues: list[str] = []
+    for name, field in schema.model_fields.items():
+        path = prefix + name
+        value = data.get(name)
+        annotation = field.annotation
+        if value is None:
+            issues.append(path)
+        elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            if isinstance(value, dict):
+                issues.extend(quality_issues(annotation, value, f"{path}."))
+            else:
+                issues.append(path)
+        elif isinstance(value, list):
+            if not any(str(item).strip() for item in value):
+                issues.append(path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if value == 0:
+                issues.append(path)
+        elif isinstance(value, str):
+            if value.strip().lower() in EMPTY_VALUES:
+                issues.append(path)
+            elif "ISO" in (field.description or "") and not _is_date(value.strip()):
+                issues.append(path)
+    if not prefix:
+        try:
+            schema.model_validate(data)
+        except ValidationError as e:
+            issues.extend(
+                ".".join(str(part) for part in error["loc"]) for error in e.errors()
+            )
+    return list(dict.fromkeys(issues))
+
+
+def _subset_schema(schema: type[BaseModel], fields: list[str]) -> dict[str, Any]:
+    json_schema = schema.model_json_schema()
+    json_schema["properties"] = {
+        name: value
+        for name, value in json_schema["properties"].items()
+        if name in fields
+    }
+    json_schema["required"] = [
+        name for name in json_schema.get("required", []) if name in fields
+    ]
+    return json_schema
+
+
+class TieredExtractor:
+    """Extract with the cheapest mode first and escalate the fields that fail.
+
+    The result of each mode goes through `quality_issues`; the top-level
+    fields that fail are extracted again with the next mode in `modes`, using
+    a schema restricted to them, and merged into the result.
+    """
+
+    def __init__(self, modes: list[ExtractionMode] | None = None) -> None:
+        if not modes:
+            modes = ["FAST", "BALANCED"]
+        self.modes: list[ExtractionMode] = modes
+
+    async def _extract(
+        self,
+        llama_cloud_client: AsyncLlamaCloud,
+        data_schema: dict[str, Any],
+        file_id: str,
+        mode: ExtractionMode,
+    ) -> dict[str, Any] | None:
+        start = time.perf_counter()
+        try:
+            result = await retry_policy("llama_cloud").call(
+                llama_cloud_client.extraction.extract,
+                data_schema=data_schema,
+                config=ExtractConfigParam(extraction_mode=mode),
+                file_id=file_id,
+            )
+        finally:
+            TIER_DURATION.observe(
+                time.perf_counter() - start, {"operation": "extract", "mode": mode}
+            )
+        if result.data is not None and not isinstance(result.data, dict):
+            raise ExtractionError("Data should be a dictionary")
+        return result.data
+
+    async def extract(
+        self, llama_cloud_client: AsyncLlamaCloud, schema: type[ModelT], file_id: str
+    ) -> ModelT | None:
+        data: dict[str, Any] | None = None
+        fields = list(schema.model_fields)
+        for mode, next_mode in zip(self.modes, [*self.modes[1:], None]):
+            data_schema = (
+                schema.model_json_schema()
+                if data is None
+                else _subset_schema(schema, fields)
+            )
+            new_data = await self._extract(
+                llama_cloud_client, data_schema, file_id, mode
+            )
+            if data is None:
+                data = new_data
+            elif new_data is not None:
+                data.update(
+                    {
+                        name: new_data[name]
+                        for name in fields
+                        if new_data.get(name) is not None
+                    }
+                )
+            issues = quality_issues(schema, data) if data is not None else list(fields)
+            for issue in issues:
+                EXTRACTION_QUALITY_ISSUES.inc(
+                    {"schema": schema.__name__, "field": issue, "mode": mode}
+                )
+            last = next_mode is None
+            outcome = "passed" if not issues else "failed" if last else "escalated"
+            TIER_RUNS.inc({"operation": "extract", "mode": mode, "outcome": outcome})
+            if not issues:
+                break
+            failing = {issue.split(".")[0] for issue in issues}
+            fields = [name for name in schema.model_fields if name in failing]
+            if not last:
+                logging.info(
+                    f"Extraction in {mode} mode failed the quality checks for "
+                    f"{', '.join(issues)}: extracting {', '.join(fields)} again "
+                    f"in {next_mode} mode"
+                )
+        if data is None:
+            return None
+        return schema.model_validate(data)
+
+
+def get_tiered_extractor(
+    config: Annotated[
+        ExtractionConfig, ResourceConfig("config.json", path_selector="extraction")
+    ],
+) -> TieredExtractor:
+    return TieredExtractor(modes=config.modes)
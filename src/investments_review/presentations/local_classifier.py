@@ -0,0 +1,212 @@
+import io
+import logging
+import re
+from collections import Counter
+from typing import Annotated
+
+from llama_cloud.types.classifier.classifier_rule_param import ClassifierRuleParam
+from pydantic import BaseModel
+from workflows.resource import ResourceConfig
+
+from ..metrics import CLASSIFICATIONS
+from ..shared import FileEvent, read_source_content
+from .models import rules
+
+WORD_PATTERN = re.compile(r"[a-z]+")
+STOPWORDS = {
+    "about",
+    "after",
+    "against",
+    "being",
+    "company",
+    "current",
+    "focused",
+    "often",
+    "other",
+    "prepared",
+    "rather",
+    "slide",
+    "such",
+    "their",
+    "these",
+    "typically",
+    "which",
+    "while",
+}
+# Phrases that are strong signals for a document type, on top of the keywords
+# derived from the classification rules.
+PHRASES: dict[str, list[str]] = {
+    "board_update_deck": [
+        "board meeting",
+        "board deck",
+        "board update",
+        "board of directors",
+        "board business",
+        "board approval",
+        "minutes",
+        "resolution",
+    ],
+    "management_presentation": [
+        "management presentation",
+        "investor presentation",
+        "investor day",
+        "investment highlights",
+        "value proposition",
+        "growth opportunities",
+        "forward-looking statements",
+        "potential acquirers",
+    ],
+}
+PHRASE_WEIGHT = 3.0
+TITLE_PAGE_WEIGHT = 3.0
+
+
+class LocalClassifierConfig(BaseModel):
+    enabled: bool = True
+    max_pages: int = 3
+    confidence_threshold: float = 0.8
+    min_score: float = 6.0
+
+
+class LocalClassification(BaseModel):
+    type: str
+    confidence: float
+    scores: dict[str, float]
+    reasoning: str
+
+
+class ClassificationStats(BaseModel):
+    hinted: int = 0
+    local: int = 0
+    remote: int = 0
+
+    @property
+    def remote_avoided_ratio(self) -> float:
+        total = self.hinted + self.local + self.remote
+        return (self.hinted + self.local) / total if total else 0.0
+
+
+def _keywords(rules: list[ClassifierRuleParam]) -> dict[str, set[str]]:
+    words = {
+        rule["type"]: {
+            word
+            for word in WORD_PATTERN.findall(rule["description"].lower())
+            if len(word) >= 5 and word not in STOPWORDS
+        }
+        for rule in rules
+    }
+    shared = set.intersection(*words.values()) if words else set()
+    return {rule_type: keywords - shared for rule_type, keywords in words.items()}
+
+
+class LocalClassifier:
+    """Keyword-based classifier run on the first pages of a PDF.
+
+    Each document type is scored from the keywords of its rule description and
+    from a few strong phrases, with matches on the title page counting more.
+    The remote classification can be skipped when the best type reaches
+    `min_score` and holds at least `confidence_threshold` of the total score.
+    """
+
+    def __init__(
+        self,
+        rules: list[ClassifierRuleParam],
+        enabled: bool = True,
+        max_pages: int = 3,
+        confidence_threshold: float = 0.8,
+        min_score: float = 6.0,
+    ) -> None:
+        self.enabled = enabled
+        self.max_pages = max_pages
+        self.confidence_threshold = confidence_threshold
+        self.min_score = min_score
+        self.rule_types = [rule["type"] for rule in rules]
+        self.keywords = _keywords(rules)
+        self.stats = ClassificationStats()
+
+    def _score_page(self, text: str, weight: float) -> dict[str, float]:
+        text = text.lower()
+        words = Counter(WORD_PATTERN.findall(text))
+        scores: dict[str, float] = {}
+        for rule_type in self.rule_types:
+            score = sum(min(words[word], 3) for word in self.keywords[rule_type])
+            score += PHRASE_WEIGHT * sum(
+                phrase in text for phrase in PHRASES.get(rule_type, [])
+            )
+            scores[rule_type] = score * weight
+        return scores
+
+    def classify_text(self, pages: list[str]) -> LocalClassification | None:
+        scores = {rule_type: 0.0 for rule_type in self.rule_types}
+        for i, page in enumerate(pages[: self.max_pages]):
+            page_scores = self._score_page(page, TITLE_PAGE_WEIGHT if i == 0 else 1.0)
+            for rule_type, score in page_scores.items():
+                scores[rule_type] += score
+        total = sum(scores.values())
+        if total == 0:
+            return None
+        best_type = max(scores, key=lambda rule_type: scores[rule_type])
+        best_score = scores[best_type]
+        return LocalClassification(
+            type=best_type,
+            confidence=best_score / total,
+            scores=dict(scores),
+            reasoning=(
+                f"Classified locally from the first {min(len(pages), self.max_pages)} "
+                f"pages with scores {dict(scores)}"
+            ),
+        )
+
+    def is_confident(self, classification: LocalClassification | None) -> bool:
+        return (
+            classification is not None
+            and classification.confidence >= self.confidence_threshold
+            and classification.scores[classification.type] >= self.min_score
+        )
+
+    def classify_event(self, ev: FileEvent) -> LocalClassification | None:
+        """Classify the PDF referenced by a start event, if it can be read."""
+        if not self.enabled:
+            return None
+        from pypdf import PdfReader
+
+        try:
+            if ev.is_source_content:
+                reader = PdfReader(io.BytesIO(read_source_content(ev)))
+            else:
+                reader = PdfReader(ev.file_input)
+            pages = [
+                page.extract_text() or "" for page in reader.pages[: self.max_pages]
+            ]
+        except Exception as e:
+            logging.warning(f"Could not read the PDF for local classification: {e}")
+            return None
+        return self.classify_text(pages)
+
+    def record(self, source: str) -> None:
+        CLASSIFICATIONS.inc({"source": source})
+        if source == "hint":
+            self.stats.hinted += 1
+        elif source == "local":
+            self.stats.local += 1
+        else:
+            self.stats.remote += 1
+        logging.info(
+            f"Remote classification avoided in {self.stats.remote_avoided_ratio:.0%} "
+            f"of runs ({self.stats})"
+        )
+
+
+def get_local_classifier(
+    config: Annotated[
+        LocalClassifierConfig,
+        ResourceConfig("config.json", path_selector="local_classifier"),
+    ],
+) -> LocalClassifier:
+    return LocalClassifier(
+        rules=rules,
+        enabled=config.enabled,
+        max_pages=config.max_pages,
+        confidence_threshold=config.confidence_threshold,
+        min_score=config.min_score,
+    )
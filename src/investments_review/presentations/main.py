@@ -1,11 +1,18 @@
-import asyncio
 import logging
-import sys
+from typing import TYPE_CHECKING
 
-from .workflow import ExtractionEvent, FileEvent, workflow
+from ..cli import expand_inputs, parse_args, run, run_batch
+from ..shared import FileEvent
 
+if TYPE_CHECKING:
+    from .workflow import ExtractionEvent
+
+
+async def run_workflow(input_file: str) -> "ExtractionEvent":
+    # Imported on first use, so that the arguments are checked before the
+    # workflow and its dependencies are loaded.
+    from .workflow import workflow
 
-async def run_workflow(input_file: str) -> ExtractionEvent:
     result = await workflow.run(
         start_event=FileEvent(file_input=input_file, is_source_content=False)
     )
@@ -17,12 +24,15 @@ def main() -> None:
         level=logging.INFO,
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
-    if len(sys.argv) == 2:
-        input_file = sys.argv[1]
-        result = asyncio.run(run_workflow(input_file=input_file))
+    args = parse_args("Extract details from presentation decks")
+    files = expand_inputs(args.inputs, extensions=(".pdf",))
+    if len(files) == 0:
+        raise ValueError("No input files found")
+    if len(files) == 1:
+        result = run(run_workflow(input_file=files[0]))
         if result.error is not None:
             print("An error occurred: ", result.error)
         else:
             print("Final response:\n", result.final_result)
     else:
-        raise ValueError("You should provide exactly one file from command line")
+        run(run_batch(run_workflow, files=files, concurrency=args.concurrency))
@@ -1,17 +1,21 @@
-import base64
+import asyncio
 import logging
-from datetime import datetime
 from typing import Annotated
 
 from llama_cloud import AsyncLlamaCloud
-from llama_cloud.types.extraction.extract_config_param import ExtractConfigParam
 from workflows import Context, Workflow, step
 from workflows.events import Event, StopEvent
 from workflows.resource import Resource
 
-from ..exceptions import ClassificationError, ExtractionError
-from ..shared import FileEvent, FileUploadedEvent, get_llama_cloud_client
-from .models import BoardUpdateDeck, ManagementPresentation, rules
+from ..clients import get_llama_cloud_client
+from ..exceptions import ClassificationError
+from ..metrics import timed_step
+from ..shared import FileEvent, FileUploadedEvent, upload_file
+from ..upload_cache import UploadCache, get_upload_cache
+from .classifier import ClassificationBatcher, get_classification_batcher
+from .extraction import TieredExtractor, get_tiered_extractor
+from .local_classifier import LocalClassifier, get_local_classifier
+from .models import BoardUpdateDeck, ManagementPresentation
 
 
 class ClassificationEvent(Event):
@@ -26,6 +30,7 @@ class ExtractionEvent(StopEvent):
 
 class PresentationWorkflow(Workflow):
     @step
+    @timed_step
     async def upload_file_to_llamacloud(
         self,
         ev: FileEvent,
@@ -33,40 +38,52 @@ class PresentationWorkflow(Workflow):
         llama_cloud_client: Annotated[
             AsyncLlamaCloud, Resource(get_llama_cloud_client)
         ],
+        upload_cache: Annotated[UploadCache | None, Resource(get_upload_cache)],
+        local_classifier: Annotated[LocalClassifier, Resource(get_local_classifier)],
     ) -> FileUploadedEvent:
         logging.info("Starting to upload presentation file to LlamaCloud")
-        if not ev.is_source_content:
-            file_obj = await llama_cloud_client.files.create(
-                file=ev.file_input,
-                purpose="parse",
-                external_file_id=ev.file_input,
+        hint = ev.document_type
+        if hint is not None and hint not in local_classifier.rule_types:
+            logging.warning(f"Ignoring unknown document type hint: {hint}")
+            hint = None
+        local_classification = None
+        if hint is None:
+            # classify locally while the file is being uploaded
+            file_id, local_classification = await asyncio.gather(
+                upload_file(
+                    ev=ev,
+                    llama_cloud_client=llama_cloud_client,
+                    upload_cache=upload_cache,
+                ),
+                asyncio.to_thread(local_classifier.classify_event, ev),
             )
         else:
-            decoded = base64.b64decode(ev.file_input)
-            file_name = (
-                ev.file_name
-                or datetime.now().isoformat().replace(":", "-").replace(".", "-")
-                + ev.file_extension
-            )
-            mimetype = (
-                "application/pdf"
-                if ev.file_extension == ".pdf"
-                else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-            file_input = (file_name, decoded, mimetype)
-            file_obj = await llama_cloud_client.files.create(
-                file=file_input,
-                purpose="parse",
-                external_file_id=file_name,
+            file_id = await upload_file(
+                ev=ev, llama_cloud_client=llama_cloud_client, upload_cache=upload_cache
             )
         async with ctx.store.edit_state() as state:
-            state.file_id = file_obj.id
-        event = FileUploadedEvent(file_id=file_obj.id)
+            state.file_id = file_id
+            if hint is not None:
+                state.classification = {
+                    "source": "hint",
+                    "category": hint,
+                    "reasons": "Document type provided by the caller",
+                }
+            elif local_classification is not None and local_classifier.is_confident(
+                local_classification
+            ):
+                state.classification = {
+                    "source": "local",
+                    "category": local_classification.type,
+                    "reasons": local_classification.reasoning,
+                }
+        event = FileUploadedEvent(file_id=file_id)
         ctx.write_event_to_stream(event)
         logging.info("Finished uploading presentation file to LlamaCloud")
         return event
 
     @step
+    @timed_step
     async def classify_presentation_as(
         self,
         ev: FileUploadedEvent,
@@ -74,14 +91,31 @@ class PresentationWorkflow(Workflow):
         llama_cloud_client: Annotated[
             AsyncLlamaCloud, Resource(get_llama_cloud_client)
         ],
+        classification_batcher: Annotated[
+            ClassificationBatcher, Resource(get_classification_batcher)
+        ],
+        local_classifier: Annotated[LocalClassifier, Resource(get_local_classifier)],
     ) -> ClassificationEvent | ExtractionEvent:
+        classification = await ctx.store.get("classification", default=None)
+        if classification is not None:
+            local_classifier.record(classification["source"])
+            logging.info(
+                f"Classified document as: {classification['category']} "
+                f"(source: {classification['source']})"
+            )
+            event = ClassificationEvent(
+                category=classification["category"],
+                reasons=classification["reasons"],
+            )
+            ctx.write_event_to_stream(event)
+            return event
         logging.info("Starting to classify presentation file")
-        result = await llama_cloud_client.classifier.classify(
-            file_ids=[ev.file_id], rules=rules, mode="FAST"
+        local_classifier.record("remote")
+        result_item = await classification_batcher.classify(
+            llama_cloud_client=llama_cloud_client, file_id=ev.file_id
         )
         logging.info("Finished classification")
-        result_item = result.items[0]  # there is only one classified file
-        if result_item.result is not None:
+        if result_item is not None and result_item.result is not None:
             if result_item.result.type is None:
                 raise ClassificationError("Classification type should not be None")
             logging.info(f"Classified document as: {result_item.result.type}")
@@ -95,6 +129,7 @@ class PresentationWorkflow(Workflow):
             return ExtractionEvent(error="Could not produce a classification")
 
     @step
+    @timed_step
     async def extract_details(
         self,
         ev: ClassificationEvent,
@@ -102,22 +137,18 @@ class PresentationWorkflow(Workflow):
         llama_cloud_client: Annotated[
             AsyncLlamaCloud, Resource(get_llama_cloud_client)
         ],
+        extractor: Annotated[TieredExtractor, Resource(get_tiered_extractor)],
     ) -> ExtractionEvent:
         logging.info("Starting to extract details from presentation file")
         file_id = (await ctx.store.get_state()).file_id
-        schema = BoardUpdateDeck
+        schema: type[BoardUpdateDeck | ManagementPresentation] = BoardUpdateDeck
         if ev.category == "management_presentation":
             schema = ManagementPresentation
-        result = await llama_cloud_client.extraction.extract(
-            data_schema=schema.model_json_schema(),
-            config=ExtractConfigParam(extraction_mode="FAST"),
-            file_id=file_id,
+        details = await extractor.extract(
+            llama_cloud_client=llama_cloud_client, schema=schema, file_id=file_id
         )
         logging.info("Finished extracting details from presentation file")
-        if result.data is not None:
-            if not isinstance(result.data, dict):
-                raise ExtractionError("Data should be a dictionary")
-            details = schema.model_validate(result.data)
+        if details is not None:
             return ExtractionEvent(final_result=details.to_string())
         return ExtractionEvent(error="Could not extract details from document")
 
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
+from pydantic import BaseModel
+
+from .metrics import RATE_LIMIT_WAIT, metrics
+from .server import worker_count
+
+CHARS_PER_TOKEN = 4
+
+
+class RateLimitConfig(BaseModel):
+    max_concurrency: int | None = None
+    requests_per_minute: float | None = None
+    tokens_per_minute: float | None = None
+
+    def per_worker(self, workers: int) -> "RateLimitConfig":
+        """Share of the limits of one of `workers` processes using the same account."""
+        return RateLimitConfig(
+            max_concurrency=None
+            if self.max_concurrency is None
+            else max(1, self.max_concurrency // workers),
+            requests_per_minute=None
+            if self.requests_per_minute is None
+            else self.requests_per_minute / workers,
+            tokens_per_minute=None
+            if self.tokens_per_minute is None
+            else self.tokens_per_minute / workers,
+        )
+
+
+def load_rate_limit_configs(
+    config_file: str = "config.json",
+) -> dict[str, RateLimitConfig]:
+    with open(config_file) as f:
+        return {
+            name: RateLimitConfig.model_validate(config)
+            for name, config in json.load(f).get("rate_limits", {}).items()
+        }
+
+
+_rate_limit_configs: dict[str, RateLimitConfig] | None = None
+
+
+def rate_limit_config(name: str) -> RateLimitConfig:
+    """Return the limits of a dependency, split evenly across the server workers.
+
+    config.json is read on first use.
+    """
+    global _rate_limit_configs
+    if _rate_limit_configs is None:
+        _rate_limit_configs = load_rate_limit_configs()
+    config = _rate_limit_configs.get(name, RateLimitConfig())
+    return config.per_worker(worker_count())
+
+
+def estimate_tokens(chars: int) -> int:
+    return chars // CHARS_PER_TOKEN + 1
+
+
+class RateLimiterStats(BaseModel):
+    calls: int = 0
+    queued: int = 0
+    in_flight: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    @property
+    def mean_wait_seconds(self) -> float:
+        return self.total_wait_seconds / self.calls if self.calls else 0.0
+
+
+class TokenBucket:
+    """Continuously refilled bucket holding at most one minute's worth of tokens.
+
+    Waiters are served in arrival order, so a large request is not starved by a
+    stream of small ones.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    async def acquire(self, amount: float) -> None:
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+class RateLimiter:
+    """Concurrency and rate limits shared by every call to one dependency.
+
+    A call first waits for one of `max_concurrency` slots, then for a request
+    from the requests-per-minute bucket and for its estimated tokens from the
+    tokens-per-minute bucket. Limits set to None are not enforced.
+    """
+
+    def __init__(self, name: str, config: RateLimitConfig) -> None:
+        self.name = name
+        self._semaphore = (
+            asyncio.Semaphore(config.max_concurrency)
+            if config.max_concurrency is not None
+            else None
+        )
+        self._requests = (
+            TokenBucket(config.requests_per_minute)
+            if config.requests_per_minute is not None
+            else None
+        )
+        self._tokens = (
+            TokenBucket(config.tokens_per_minute)
+            if config.tokens_per_minute is not None
+            else None
+        )
+        self.stats = RateLimiterStats()
+
+    async def _wait(self, tokens: int) -> None:
+        if self._requests is not None:
+            await self._requests.acquire(1)
+        if self._tokens is not None and tokens > 0:
+            await self._tokens.acquire(tokens)
+
+    @asynccontextmanager
+    async def limit(self, tokens: int = 0) -> AsyncGenerator[None]:
+        start = time.monotonic()
+        self.stats.queued += 1
+        try:
+            if self._semaphore is not None:
+                await self._semaphore.acquire()
+            try:
+                await self._wait(tokens)
+            except BaseException:
+                if self._semaphore is not None:
+                    self._semaphore.release()
+                raise
+        finally:
+            self.stats.queued -= 1
+        wait = time.monotonic() - start
+        self.stats.calls += 1
+        self.stats.total_wait_seconds += wait
+        self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, wait)
+        RATE_LIMIT_WAIT.observe(wait, {"dependency": self.name})
+        if wait >= 1:
+            logging.info(f"Waited {wait:.2f}s for the {self.name} rate limits")
+        self.stats.in_flight += 1
+        try:
+            yield
+        finally:
+            self.stats.in_flight -= 1
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+
+_limiters: dict[str, RateLimiter] = {}
+
+
+def rate_limiter(name: str) -> RateLimiter:
+    """Return the process-wide rate limiter of a dependency, creating it on first use."""
+    if name not in _limiters:
+        _limiters[name] = RateLimiter(name, rate_limit_config(name))
+    return _limiters[name]
+
+
+def _queue_sizes() -> list[tuple[dict[str, str], float]]:
+    return [
+        ({"dependency": name, "state": state}, float(getattr(limiter.stats, state)))
+        for name, limiter in sorted(_limiters.items())
+        for state in ("queued", "in_flight")
+    ]
+
+
+metrics.gauge(
+    "rate_limit_calls",
+    "Calls waiting for or holding a slot of the rate limiters",
+    _queue_sizes,
+)
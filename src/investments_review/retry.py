@@ -0,0 +1,348 @@
+import asyncio
+import email.utils
+import json
+import logging
+import random
+import sys
+import time
+from typing import Awaitable, Callable, Literal, ParamSpec, TypeVar
+
+from pydantic import BaseModel
+
+from .exceptions import CircuitOpenError
+from .metrics import (
+    DEPENDENCY_CALL_DURATION,
+    DEPENDENCY_CALLS,
+    DEPENDENCY_RETRIES,
+    metrics,
+)
+from .rate_limit import RateLimiter, rate_limiter
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+# (module, class) pairs, looked up only in modules that are already imported:
+# an error cannot come from a client library that was never loaded.
+TRANSIENT_ERRORS = (
+    ("openai", "APIConnectionError"),
+    ("llama_cloud", "APIConnectionError"),
+    ("httpx", "TransportError"),
+)
+STATUS_ERRORS = (("openai", "APIStatusError"), ("llama_cloud", "APIStatusError"))
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class RetryConfig(BaseModel):
+    max_attempts: int = 4
+    base_delay_seconds: float = 0.5
+    max_delay_seconds: float = 30
+    max_retry_after_seconds: float = 60
+    budget_ratio: float = 0.2
+    budget_min_retries: int = 10
+    failure_threshold: int = 5
+    reset_timeout_seconds: float = 30
+
+
+def load_retry_config(config_file: str = "config.json") -> RetryConfig:
+    with open(config_file) as f:
+        return RetryConfig.model_validate(json.load(f).get("retry", {}))
+
+
+_retry_config: RetryConfig | None = None
+
+
+def retry_config() -> RetryConfig:
+    """Return the retry configuration, read from config.json on first use."""
+    global _retry_config
+    if _retry_config is None:
+        _retry_config = load_retry_config()
+    return _retry_config
+
+
+def _loaded_types(names: tuple[tuple[str, str], ...]) -> tuple[type, ...]:
+    return tuple(
+        getattr(sys.modules[module], name)
+        for module, name in names
+        if module in sys.modules
+    )
+
+
+def _status_code(error: BaseException) -> int | None:
+    if isinstance(error, _loaded_types(STATUS_ERRORS)):
+        return getattr(error, "status_code", None)
+    if isinstance(error, _loaded_types((("httpx", "HTTPStatusError"),))):
+        return getattr(getattr(error, "response", None), "status_code", None)
+    return None
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether an error is worth retrying: network failures, timeouts, throttling and 5xx."""
+    if isinstance(error, (TimeoutError, *_loaded_types(TRANSIENT_ERRORS))):
+        return True
+    status_code = _status_code(error)
+    return status_code is not None and status_code in TRANSIENT_STATUS_CODES
+
+
+def retry_after(error: BaseException) -> float | None:
+    """Read the delay requested by the server from the `Retry-After` headers, if any."""
+    response = getattr(error, "response", None)
+    if response is None or not isinstance(
+        response, _loaded_types((("httpx", "Response"),))
+    ):
+        return None
+    if (value := response.headers.get("retry-after-ms")) is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    if (value := response.headers.get("retry-after")) is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def _operation_name(f: Callable[..., object]) -> str:
+    name = getattr(f, "__qualname__", type(f).__name__)
+    return name.rsplit(".<locals>.", 1)[-1]
+
+
+class RetryBudget:
+    """Token bucket limiting retries to a fraction of the calls made.
+
+    Every call deposits `ratio` tokens and every retry spends one, with at most
+    `min_retries` tokens in the bucket, so that retries cannot multiply the
+    load on a dependency that is already struggling.
+    """
+
+    def __init__(self, ratio: float, min_retries: int) -> None:
+        self.ratio = ratio
+        self.capacity = float(min_retries)
+        self.tokens = float(min_retries)
+
+    def deposit(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    """Fail fast once an operation has failed `failure_threshold` times in a row.
+
+    After `reset_timeout_seconds` a single trial call is let through: the
+    circuit closes again if it succeeds and stays open otherwise.
+    """
+
+    def __init__(
+        self, name: str, failure_threshold: int, reset_timeout_seconds: float
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.state: CircuitState = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+
+    def before_call(self) -> bool:
+        """Check that a call may go through, returning whether it is the trial call."""
+        if self.state == "closed":
+            return False
+        if (
+            self.state == "open"
+            and time.monotonic() - self.opened_at >= self.reset_timeout_seconds
+        ):
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        raise CircuitOpenError(
+            f"Circuit for {self.name} is open after {self.failures} consecutive failures"
+        )
+
+    def record_success(self, trial: bool) -> None:
+        if trial:
+            self._trial_running = False
+            logging.info(f"Circuit for {self.name} closed")
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self, trial: bool) -> None:
+        if trial:
+            self._trial_running = False
+        self.failures += 1
+        if trial or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logging.warning(f"Circuit for {self.name} opened")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self, trial: bool) -> None:
+        if trial:
+            self._trial_running = False
+
+
+class RetryPolicy:
+    """Retry transient errors of one dependency with full-jitter exponential backoff.
+
+    A `Retry-After` header sent by the server takes precedence over the backoff,
+    unless it asks for more than `max_retry_after_seconds`. Retries are limited
+    by a `RetryBudget` shared by the calls to the dependency, and calls fail
+    fast while the `CircuitBreaker` of their operation is open, so that an
+    endpoint failing does not block the others. Every attempt goes through the
+    dependency's `RateLimiter`, if any.
+    """
+
+    def __init__(
+        self, name: str, config: RetryConfig, limiter: RateLimiter | None = None
+    ) -> None:
+        self.name = name
+        self.limiter = limiter
+        self.max_attempts = config.max_attempts
+        self.base_delay_seconds = config.base_delay_seconds
+        self.max_delay_seconds = config.max_delay_seconds
+        self.max_retry_after_seconds = config.max_retry_after_seconds
+        self.budget = RetryBudget(config.budget_ratio, config.budget_min_retries)
+        self.failure_threshold = config.failure_threshold
+        self.reset_timeout_seconds = config.reset_timeout_seconds
+        self.circuit_breakers: dict[str, CircuitBreaker] = {}
+
+    def circuit_breaker(self, operation: str) -> CircuitBreaker:
+        if operation not in self.circuit_breakers:
+            self.circuit_breakers[operation] = CircuitBreaker(
+                f"{self.name} {operation}",
+                self.failure_threshold,
+                self.reset_timeout_seconds,
+            )
+        return self.circuit_breakers[operation]
+
+    def _delay(self, error: BaseException, attempt: int) -> float | None:
+        requested = retry_after(error)
+        if requested is not None:
+            if requested > self.max_retry_after_seconds:
+                return None
+            return requested + random.uniform(0, self.base_delay_seconds)
+        return random.uniform(
+            0, min(self.max_delay_seconds, self.base_delay_seconds * 2**attempt)
+        )
+
+    async def call(
+        self, f: Callable[P, Awaitable[T]], *args: P.args, **kwargs: P.kwargs
+    ) -> T:
+        return await self.call_with_tokens(0, f, *args, **kwargs)
+
+    async def _attempt(
+        self,
+        estimated_tokens: int,
+        f: Callable[P, Awaitable[T]],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> T:
+        if self.limiter is None:
+            return await f(*args, **kwargs)
+        async with self.limiter.limit(estimated_tokens):
+            return await f(*args, **kwargs)
+
+    async def call_with_tokens(
+        self,
+        estimated_tokens: int,
+        f: Callable[P, Awaitable[T]],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> T:
+        """Like `call`, counting `estimated_tokens` against the tokens-per-minute limit."""
+        labels = {"dependency": self.name, "operation": _operation_name(f)}
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await self._call_with_retries(
+                estimated_tokens, labels, f, *args, **kwargs
+            )
+            outcome = "success"
+            return result
+        finally:
+            DEPENDENCY_CALL_DURATION.observe(time.perf_counter() - start, labels)
+            DEPENDENCY_CALLS.inc(labels | {"outcome": outcome})
+
+    async def _call_with_retries(
+        self,
+        estimated_tokens: int,
+        labels: dict[str, str],
+        f: Callable[P, Awaitable[T]],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> T:
+        self.budget.deposit()
+        circuit_breaker = self.circuit_breaker(labels["operation"])
+        attempt = 0
+        while True:
+            trial = circuit_breaker.before_call()
+            try:
+                result = await self._attempt(estimated_tokens, f, *args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    circuit_breaker.release(trial)
+                    raise
+                circuit_breaker.record_failure(trial)
+                attempt += 1
+                delay = self._delay(e, attempt - 1)
+                if (
+                    attempt >= self.max_attempts
+                    or delay is None
+                    or circuit_breaker.state == "open"
+                    or not self.budget.withdraw()
+                ):
+                    raise
+                logging.warning(
+                    f"Transient error from {self.name} ({type(e).__name__}: {e}), "
+                    f"retrying in {delay:.2f}s ({attempt}/{self.max_attempts - 1})"
+                )
+                DEPENDENCY_RETRIES.inc(labels)
+                await asyncio.sleep(delay)
+            except BaseException:
+                circuit_breaker.release(trial)
+                raise
+            else:
+                circuit_breaker.record_success(trial)
+                return result
+
+
+_policies: dict[str, RetryPolicy] = {}
+
+
+def retry_policy(name: str) -> RetryPolicy:
+    """Return the process-wide retry policy of a dependency, creating it on first use."""
+    if name not in _policies:
+        _policies[name] = RetryPolicy(name, retry_config(), limiter=rate_limiter(name))
+    return _policies[name]
+
+
+def _circuit_states() -> list[tuple[dict[str, str], float]]:
+    return [
+        (
+            {"dependency": name, "operation": operation, "state": state},
+            float(circuit_breaker.state == state),
+        )
+        for name, policy in sorted(_policies.items())
+        for operation, circuit_breaker in sorted(policy.circuit_breakers.items())
+        for state in ("closed", "open", "half_open")
+    ]
+
+
+metrics.gauge(
+    "dependency_circuit_state",
+    "Circuit breaker state of each dependency operation (1 for the current state)",
+    _circuit_states,
+)
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import threading
+from contextlib import contextmanager
+from types import FrameType
+from typing import Any, Callable, Generator
+
+from pydantic import BaseModel
+
+from .exceptions import ServerDrainingError
+from .metrics import metrics
+
+WORKERS_ENV = "INVESTMENTS_REVIEW_WORKERS"
+
+
+class ServerConfig(BaseModel):
+    host: str = "127.0.0.1"
+    port: int = 8000
+    workers: int = 1
+    graceful_shutdown_seconds: float = 60
+
+
+def load_server_config(config_file: str = "config.json") -> ServerConfig:
+    with open(config_file) as f:
+        return ServerConfig.model_validate(json.load(f).get("server", {}))
+
+
+_server_config: ServerConfig | None = None
+
+
+def server_config() -> ServerConfig:
+    """Return the server configuration, read from config.json on first use."""
+    global _server_config
+    if _server_config is None:
+        _server_config = load_server_config()
+    return _server_config
+
+
+def worker_count() -> int:
+    """Number of server worker processes sharing the host, 1 outside the server."""
+    return max(1, int(os.getenv(WORKERS_ENV, "1")))
+
+
+class RunTracker:
+    """Workflow runs in progress in this worker process.
+
+    Once draining starts, new runs are refused and `drain` waits for the
+    running ones to finish.
+    """
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.started = False
+        self.draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.started and not self.draining
+
+    def begin(self) -> None:
+        if self.draining:
+            raise ServerDrainingError("The server is shutting down")
+        self.in_flight += 1
+        self._idle.clear()
+
+    def end(self) -> None:
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    @contextmanager
+    def track(self) -> Generator[None]:
+        self.begin()
+        try:
+            yield
+        finally:
+            self.end()
+
+    async def drain(self, timeout_seconds: float) -> bool:
+        """Stop accepting runs and wait for the running ones.
+
+        Returns whether every run finished within `timeout_seconds`.
+        """
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout_seconds)
+        except TimeoutError:
+            return False
+        return True
+
+
+run_tracker = RunTracker()
+
+
+def drain_on_signal(timeout_seconds: float) -> None:
+    """Start draining as soon as uvicorn is asked to shut down.
+
+    uvicorn closes its sockets as soon as it handles SIGINT or SIGTERM, and only
+    runs the lifespan shutdown once the open connections are done, so its
+    handlers are wrapped: the first signal starts draining, so that /readyz
+    answers 503 and new runs are refused with Retry-After, and uvicorn is only
+    told to exit once the runs in progress are done or after `timeout_seconds`.
+    Another SIGINT exits straight away. Does nothing outside uvicorn.
+    """
+    import uvicorn
+
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        exit_handler = signal.getsignal(sig)
+        if (
+            exit_handler is None
+            or isinstance(exit_handler, int)
+            or not isinstance(getattr(exit_handler, "__self__", None), uvicorn.Server)
+        ):
+            continue
+        signal.signal(sig, _drain_handler(loop, exit_handler, timeout_seconds))
+
+
+def _drain_handler(
+    loop: asyncio.AbstractEventLoop,
+    exit_handler: Callable[[int, FrameType | None], Any],
+    timeout_seconds: float,
+) -> Callable[[int, FrameType | None], None]:
+    async def exit_after_drain(sig: int) -> None:
+        logging.info(
+            f"Worker {os.getpid()} draining {run_tracker.in_flight} workflow runs"
+        )
+        if not await run_tracker.drain(timeout_seconds):
+            logging.warning(
+                f"Worker {os.getpid()} stopping with {run_tracker.in_flight} "
+                f"workflow runs still in progress after {timeout_seconds}s"
+            )
+        exit_handler(sig, None)
+
+    tasks: set[asyncio.Task] = set()
+
+    def start_drain(sig: int) -> None:
+        task = loop.create_task(exit_after_drain(sig))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    def handle(sig: int, frame: FrameType | None) -> None:
+        if not run_tracker.draining:
+            run_tracker.draining = True
+            loop.call_soon_threadsafe(start_drain, sig)
+        elif sig == signal.SIGINT:
+            # The uvicorn supervisor sends SIGTERM after a Ctrl+C reaches the
+            # workers, so only a repeated SIGINT skips the drain.
+            exit_handler(sig, frame)
+
+    return handle
+
+
+metrics.gauge(
+    "server_runs_in_flight",
+    "Workflow runs in progress in this worker",
+    lambda: [({}, float(run_tracker.in_flight))],
+)
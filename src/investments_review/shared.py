@@ -1,12 +1,17 @@
-import os
-from typing import Literal
+import asyncio
+import base64
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING, Literal
 
-from llama_cloud import AsyncLlamaCloud
 from workflows.events import Event, StartEvent
 
+from .retry import retry_policy
+from .upload_cache import UploadCache, hash_bytes, hash_file
 
-def get_llama_cloud_client() -> AsyncLlamaCloud:
-    return AsyncLlamaCloud(api_key=os.getenv("LLAMA_CLOUD_API_KEY"))
+if TYPE_CHECKING:
+    from llama_cloud import AsyncLlamaCloud
+    from llama_cloud._types import FileTypes
 
 
 class FileEvent(StartEvent):
@@ -14,7 +19,78 @@ class FileEvent(StartEvent):
     file_name: str | None = None
     file_extension: Literal[".xlsx", ".pdf"] = ".pdf"
     is_source_content: bool
+    document_type: str | None = None
+
+
+def read_source_content(ev: FileEvent) -> bytes:
+    """Return the bytes of a source-content event, sent inline as base64."""
+    return base64.b64decode(ev.file_input)
 
 
 class FileUploadedEvent(Event):
     file_id: str
+
+
+async def _get_cached_file_id(
+    llama_cloud_client: "AsyncLlamaCloud", upload_cache: UploadCache, digest: str
+) -> str | None:
+    import llama_cloud
+
+    file_id = await asyncio.to_thread(upload_cache.get, digest)
+    if file_id is None:
+        return None
+    try:
+        await retry_policy("llama_cloud").call(llama_cloud_client.files.get, file_id)
+    except llama_cloud.NotFoundError:
+        logging.info(f"Cached file {file_id} no longer exists on LlamaCloud")
+        await asyncio.to_thread(upload_cache.invalidate, digest)
+        return None
+    return file_id
+
+
+async def upload_file(
+    ev: FileEvent,
+    llama_cloud_client: "AsyncLlamaCloud",
+    upload_cache: UploadCache | None = None,
+) -> str:
+    """Upload the file referenced by `ev` to LlamaCloud and return its file ID.
+
+    When an upload cache is available, files whose content has already been
+    uploaded are not sent again and the existing file ID is returned instead.
+    """
+    digest: str | None = None
+    if not ev.is_source_content:
+        if upload_cache is not None:
+            digest = await asyncio.to_thread(hash_file, ev.file_input)
+        file_input: "FileTypes" = ev.file_input
+        external_file_id = ev.file_input
+    else:
+        content = read_source_content(ev)
+        if upload_cache is not None:
+            digest = await asyncio.to_thread(hash_bytes, content)
+        file_name = (
+            ev.file_name
+            or datetime.now().isoformat().replace(":", "-").replace(".", "-")
+            + ev.file_extension
+        )
+        mimetype = (
+            "application/pdf"
+            if ev.file_extension == ".pdf"
+            else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+        file_input = (file_name, content, mimetype)
+        external_file_id = file_name
+    if upload_cache is not None and digest is not None:
+        file_id = await _get_cached_file_id(llama_cloud_client, upload_cache, digest)
+        if file_id is not None:
+            logging.info(f"Reusing previously uploaded file {file_id}")
+            return file_id
+    file_obj = await retry_policy("llama_cloud").call(
+        llama_cloud_client.files.create,
+        file=file_input,
+        purpose="parse",
+        external_file_id=external_file_id,
+    )
+    if upload_cache is not None and digest is not None:
+        await asyncio.to_thread(upload_cache.put, digest, file_obj.id)
+    return file_obj.id
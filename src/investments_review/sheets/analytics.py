@@ -0,0 +1,373 @@
+import logging
+import math
+import re
+from typing import TYPE_CHECKING, Annotated
+
+from pydantic import BaseModel, Field
+from workflows.resource import ResourceConfig
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+IDENTIFIER_PATTERN = re.compile(
+    r"ticker|symbol|isin|cusip|security|asset|holding|company|instrument|name",
+    re.IGNORECASE,
+)
+RETURN_PATTERN = re.compile(r"return|perf|yield|%|pct|percent", re.IGNORECASE)
+PROFIT_PATTERN = re.compile(r"profit|p/l|p&l|pnl|gain|loss", re.IGNORECASE)
+COST_PATTERN = re.compile(r"cost|invested|purchase|book value|basis", re.IGNORECASE)
+VALUE_PATTERN = re.compile(
+    r"proceeds|market value|current value|value|balance|nav|amount", re.IGNORECASE
+)
+BUY_PRICE_PATTERN = re.compile(r"(buy|purchase|entry|open).*price", re.IGNORECASE)
+SELL_PRICE_PATTERN = re.compile(
+    r"(sell|sale|exit|close|current|last|market).*price", re.IGNORECASE
+)
+DAYS_HELD_PATTERN = re.compile(r"days|holding period", re.IGNORECASE)
+BUY_DATE_PATTERN = re.compile(r"buy|purchase|open|start|entry", re.IGNORECASE)
+SELL_DATE_PATTERN = re.compile(r"sell|sale|close|end|exit", re.IGNORECASE)
+
+
+class AnalyticsConfig(BaseModel):
+    enabled: bool = True
+    top_n: int = 5
+    include_tables_below_tokens: int = 2_000
+
+
+class PortfolioColumns(BaseModel):
+    identifier: str | None = None
+    return_pct: str | None = None
+    profit: str | None = None
+    cost: str | None = None
+    value: str | None = None
+    buy_price: str | None = None
+    sell_price: str | None = None
+    days_held: str | None = None
+    start_date: str | None = None
+    end_date: str | None = None
+    date: str | None = None
+
+
+class RankedPosition(BaseModel):
+    name: str
+    return_pct: float
+    profit: float | None = None
+    weight_pct: float | None = None
+
+
+class PortfolioMetrics(BaseModel):
+    """Metrics computed locally for a single table of the workbook"""
+
+    rows: int
+    columns: PortfolioColumns
+    # Rows the position metrics are computed from, when the table is sampled.
+    sampled_rows: int | None = None
+    total_cost: float | None = None
+    total_value: float | None = None
+    total_profit: float | None = None
+    portfolio_return_pct: float | None = None
+    mean_return_pct: float | None = None
+    median_return_pct: float | None = None
+    winners: int | None = None
+    losers: int | None = None
+    mean_annualized_return_pct: float | None = None
+    best: list[RankedPosition] = Field(default_factory=list)
+    worst: list[RankedPosition] = Field(default_factory=list)
+    largest_allocations: list[RankedPosition] = Field(default_factory=list)
+    period_start: str | None = None
+    period_end: str | None = None
+    period_change_pct: float | None = None
+    largest_period_gain_pct: float | None = None
+    largest_period_loss_pct: float | None = None
+    max_drawdown_pct: float | None = None
+
+    @property
+    def has_metrics(self) -> bool:
+        return bool(self.best) or self.period_change_pct is not None
+
+    def to_string(self) -> str:
+        lines = [f"Rows: {self.rows}"]
+        if self.sampled_rows is not None:
+            lines.append(f"Metrics computed from a sample of {self.sampled_rows} rows")
+        for label, value in [
+            ("Total cost", self.total_cost),
+            ("Total value", self.total_value),
+            ("Total profit/loss", self.total_profit),
+        ]:
+            if value is not None:
+                lines.append(f"{label}: {value:,.2f}")
+        for label, value in [
+            ("Portfolio return", self.portfolio_return_pct),
+            ("Mean position return", self.mean_return_pct),
+            ("Median position return", self.median_return_pct),
+            ("Mean annualized return", self.mean_annualized_return_pct),
+        ]:
+            if value is not None:
+                lines.append(f"{label}: {value:.2f}%")
+        if self.winners is not None and self.losers is not None:
+            lines.append(f"Winning positions: {self.winners}, losing: {self.losers}")
+        for label, positions in [
+            ("Best performers", self.best),
+            ("Worst performers", self.worst),
+            ("Largest allocations", self.largest_allocations),
+        ]:
+            if positions:
+                lines.append(f"{label}:")
+                for position in positions:
+                    line = f"- {position.name}: return {position.return_pct:.2f}%"
+                    if position.profit is not None:
+                        line += f", profit/loss {position.profit:,.2f}"
+                    if position.weight_pct is not None:
+                        line += f", weight {position.weight_pct:.2f}%"
+                    lines.append(line)
+        if self.period_change_pct is not None:
+            lines.append(
+                f"Change from {self.period_start} to {self.period_end}: "
+                f"{self.period_change_pct:.2f}%"
+            )
+        for label, value in [
+            ("Largest period-over-period gain", self.largest_period_gain_pct),
+            ("Largest period-over-period loss", self.largest_period_loss_pct),
+            ("Maximum drawdown", self.max_drawdown_pct),
+        ]:
+            if value is not None:
+                lines.append(f"{label}: {value:.2f}%")
+        return "\n".join(lines)
+
+
+def _first_match(columns: list[str], pattern: re.Pattern[str]) -> str | None:
+    for column in columns:
+        if pattern.search(column):
+            return column
+    return None
+
+
+def detect_columns(df: "pd.DataFrame") -> PortfolioColumns:
+    """Guess the role of each column from its name and dtype."""
+    numeric = [str(c) for c in df.select_dtypes(include="number").columns]
+    dates = [str(c) for c in df.select_dtypes(include="datetime").columns]
+    text = [
+        str(c)
+        for c in df.select_dtypes(include=["object", "string", "category"]).columns
+    ]
+    columns = PortfolioColumns()
+    columns.identifier = _first_match(text, IDENTIFIER_PATTERN) or (
+        text[0] if text else None
+    )
+    columns.buy_price = _first_match(numeric, BUY_PRICE_PATTERN)
+    columns.sell_price = _first_match(numeric, SELL_PRICE_PATTERN)
+    prices = {columns.buy_price, columns.sell_price}
+    remaining = [c for c in numeric if c not in prices]
+    columns.profit = _first_match(remaining, PROFIT_PATTERN)
+    remaining = [c for c in remaining if c != columns.profit]
+    columns.return_pct = _first_match(remaining, RETURN_PATTERN)
+    remaining = [c for c in remaining if c != columns.return_pct]
+    columns.days_held = _first_match(remaining, DAYS_HELD_PATTERN)
+    remaining = [c for c in remaining if c != columns.days_held]
+    columns.cost = _first_match(remaining, COST_PATTERN)
+    remaining = [c for c in remaining if c != columns.cost]
+    columns.value = _first_match(remaining, VALUE_PATTERN)
+    if len(dates) >= 2:
+        columns.start_date = _first_match(dates, BUY_DATE_PATTERN) or dates[0]
+        columns.end_date = _first_match(
+            [d for d in dates if d != columns.start_date], SELL_DATE_PATTERN
+        ) or next(d for d in dates if d != columns.start_date)
+    elif len(dates) == 1:
+        columns.date = dates[0]
+    return columns
+
+
+def _ranked(
+    names: "pd.Series",
+    returns: "pd.Series",
+    profits: "pd.Series | None",
+    weights: "pd.Series | None",
+    order: "pd.Index",
+) -> list[RankedPosition]:
+    return [
+        RankedPosition(
+            name=str(names.loc[i]),
+            return_pct=float(returns.loc[i]),
+            profit=float(profits.loc[i]) if profits is not None else None,
+            weight_pct=float(weights.loc[i]) if weights is not None else None,
+        )
+        for i in order
+    ]
+
+
+def _is_time_series(df: "pd.DataFrame", columns: PortfolioColumns) -> bool:
+    if columns.date is None or (columns.value or columns.cost) is None:
+        return False
+    return columns.identifier is None or bool(df[columns.identifier].duplicated().any())
+
+
+def _exact_totals(
+    columns: PortfolioColumns, column_totals: dict[str, float]
+) -> dict[str, float]:
+    totals = {
+        name: column_totals[column]
+        for name in ("cost", "value", "profit")
+        if (column := getattr(columns, name)) in column_totals
+    }
+    if "profit" not in totals and "cost" in totals and "value" in totals:
+        totals["profit"] = totals["value"] - totals["cost"]
+    if "cost" not in totals and "value" in totals and "profit" in totals:
+        totals["cost"] = totals["value"] - totals["profit"]
+    return totals
+
+
+def compute_metrics(
+    df: "pd.DataFrame",
+    top_n: int = 5,
+    total_rows: int | None = None,
+    column_totals: dict[str, float] | None = None,
+) -> PortfolioMetrics:
+    """Compute the metrics of a table, or of a sample of `total_rows` rows.
+
+    For a sample, the totals come from the `column_totals` computed over every
+    row, and the period metrics of time series are not computed.
+    """
+    columns = detect_columns(df)
+    rows = total_rows if total_rows is not None and total_rows > len(df) else len(df)
+    sampled = rows > len(df)
+    metrics = PortfolioMetrics(
+        rows=rows,
+        columns=columns,
+        sampled_rows=len(df) if sampled else None,
+    )
+    if _is_time_series(df, columns):
+        if sampled:
+            logging.info("Skipping the period metrics of a sampled time series")
+            return metrics
+        return _compute_time_series_metrics(df, columns, metrics)
+
+    cost = df[columns.cost].astype("float64") if columns.cost else None
+    value = df[columns.value].astype("float64") if columns.value else None
+    profit = df[columns.profit].astype("float64") if columns.profit else None
+    if profit is None and cost is not None and value is not None:
+        profit = value - cost
+    if cost is None and value is not None and profit is not None:
+        cost = value - profit
+
+    if columns.return_pct is not None:
+        returns = df[columns.return_pct].astype("float64")
+    elif cost is not None and profit is not None:
+        returns = profit / cost.replace(0, math.nan) * 100
+    elif columns.buy_price is not None and columns.sell_price is not None:
+        buy = df[columns.buy_price].astype("float64").replace(0, math.nan)
+        returns = (df[columns.sell_price].astype("float64") - buy) / buy * 100
+    else:
+        returns = None
+
+    if sampled:
+        totals = _exact_totals(columns, column_totals or {})
+    else:
+        totals = {
+            name: float(series.sum())
+            for name, series in (("cost", cost), ("value", value), ("profit", profit))
+            if series is not None
+        }
+    metrics.total_cost = totals.get("cost")
+    metrics.total_value = totals.get("value")
+    metrics.total_profit = totals.get("profit")
+    if metrics.total_cost and metrics.total_profit is not None:
+        metrics.portfolio_return_pct = metrics.total_profit / metrics.total_cost * 100
+
+    if returns is not None and columns.identifier is not None:
+        valid = returns.dropna()
+        if len(valid) > 0:
+            names = df[columns.identifier]
+            metrics.mean_return_pct = float(valid.mean())
+            metrics.median_return_pct = float(valid.median())
+            metrics.winners = int((valid > 0).sum())
+            metrics.losers = int((valid < 0).sum())
+            weights = None
+            allocation = cost if cost is not None else value
+            if allocation is not None and allocation.sum() != 0:
+                weights = allocation / allocation.sum() * 100
+            days = None
+            if columns.days_held is not None:
+                days = df[columns.days_held].astype("float64")
+            elif columns.start_date is not None and columns.end_date is not None:
+                days = (df[columns.end_date] - df[columns.start_date]).dt.days
+            if days is not None:
+                years = (days.loc[valid.index] / 365.25).where(lambda y: y > 0)
+                annualized = ((1 + valid / 100) ** (1 / years) - 1) * 100
+                if annualized.notna().any():
+                    metrics.mean_annualized_return_pct = float(annualized.mean())
+            order = valid.sort_values(ascending=False).index
+            metrics.best = _ranked(names, returns, profit, weights, order[:top_n])
+            metrics.worst = _ranked(
+                names, returns, profit, weights, order[::-1][:top_n]
+            )
+            if weights is not None:
+                metrics.largest_allocations = _ranked(
+                    names,
+                    returns,
+                    profit,
+                    weights,
+                    weights.sort_values(ascending=False).index[:top_n],
+                )
+
+    return metrics
+
+
+def _compute_time_series_metrics(
+    df: "pd.DataFrame", columns: PortfolioColumns, metrics: PortfolioMetrics
+) -> PortfolioMetrics:
+    series_column = columns.value or columns.cost
+    if columns.date is not None and series_column is not None:
+        series = (
+            df[[columns.date, series_column]]
+            .dropna()
+            .groupby(columns.date)[series_column]
+            .sum()
+            .sort_index()
+        )
+        if len(series) >= 2 and series.iloc[0] != 0:
+            changes = series.pct_change().dropna() * 100
+            drawdown = (series / series.cummax() - 1) * 100
+            metrics.period_start = str(series.index[0].date())
+            metrics.period_end = str(series.index[-1].date())
+            metrics.period_change_pct = float(
+                (series.iloc[-1] / series.iloc[0] - 1) * 100
+            )
+            metrics.largest_period_gain_pct = float(changes.max())
+            metrics.largest_period_loss_pct = float(changes.min())
+            metrics.max_drawdown_pct = float(drawdown.min())
+    return metrics
+
+
+class PortfolioAnalytics:
+    def __init__(
+        self,
+        enabled: bool = True,
+        top_n: int = 5,
+        include_tables_below_tokens: int = 2_000,
+    ) -> None:
+        self.enabled = enabled
+        self.top_n = top_n
+        self.include_tables_below_tokens = include_tables_below_tokens
+
+    def required_columns(self, df: "pd.DataFrame") -> list[str]:
+        """Columns used by the metrics, detected from a table or an empty one."""
+        columns = detect_columns(df).model_dump().values()
+        return list(dict.fromkeys(column for column in columns if column is not None))
+
+    def analyze(
+        self,
+        df: "pd.DataFrame",
+        total_rows: int | None = None,
+        column_totals: dict[str, float] | None = None,
+    ) -> PortfolioMetrics:
+        return compute_metrics(
+            df, top_n=self.top_n, total_rows=total_rows, column_totals=column_totals
+        )
+
+
+def get_portfolio_analytics(
+    config: Annotated[
+        AnalyticsConfig, ResourceConfig("config.json", path_selector="analytics")
+    ],
+) -> PortfolioAnalytics:
+    return PortfolioAnalytics(**config.model_dump())
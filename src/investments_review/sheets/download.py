@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from collections.abc import Hashable
+from typing import Annotated, Any
+
+import httpx
+from llama_cloud import AsyncLlamaCloud
+from pydantic import BaseModel
+from workflows.resource import ResourceConfig
+
+from ..exceptions import SheetParsingError
+from ..retry import retry_policy
+from .regions import RegionStore
+
+
+class DownloadConfig(BaseModel):
+    max_concurrency: int = 8
+    region_timeout_seconds: float = 60
+
+
+class RegionDownloadResult(BaseModel):
+    region_handles: list[str]
+    failed_regions: dict[str, str]
+
+
+class RegionDownloader:
+    """Fetch the parquet tables of a parsed spreadsheet concurrently.
+
+    At most `max_concurrency` regions are looked up and downloaded at the same
+    time, over the process-wide download connection pool. Each region must
+    complete within `region_timeout_seconds`; regions that fail or time out are
+    reported back instead of failing the whole download.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        region_timeout_seconds: float,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.region_timeout_seconds = region_timeout_seconds
+
+    async def _get(self, httpx_client: httpx.AsyncClient, url: str) -> httpx.Response:
+        resp = await httpx_client.get(url)
+        resp.raise_for_status()
+        return resp
+
+    async def _download_region(
+        self,
+        llama_cloud_client: AsyncLlamaCloud,
+        httpx_client: httpx.AsyncClient,
+        region_store: RegionStore,
+        semaphore: asyncio.Semaphore,
+        spreadsheet_job_id: str,
+        region: Any,
+        owner: Hashable | None,
+    ) -> str:
+        async with semaphore, asyncio.timeout(self.region_timeout_seconds):
+            parquet_region_resp = await retry_policy("llama_cloud").call(
+                llama_cloud_client.beta.sheets.get_result_table,
+                region_type=region.region_type,
+                spreadsheet_job_id=spreadsheet_job_id,
+                region_id=region.region_id,
+            )
+            # Presigned object storage URLs: retried apart from the LlamaCloud API,
+            # and outside of its rate limits.
+            resp = await retry_policy("llama_cloud_storage").call(
+                self._get, httpx_client, parquet_region_resp.url
+            )
+            return await region_store.put(region.region_id, resp.content, owner)
+
+    async def download_all(
+        self,
+        llama_cloud_client: AsyncLlamaCloud,
+        httpx_client: httpx.AsyncClient,
+        region_store: RegionStore,
+        spreadsheet_job_id: str,
+        regions: list[Any],
+        owner: Hashable | None = None,
+    ) -> RegionDownloadResult:
+        for region in regions:
+            if region.region_id is None:
+                raise SheetParsingError("Region should have an ID")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(
+            *[
+                self._download_region(
+                    llama_cloud_client,
+                    httpx_client,
+                    region_store,
+                    semaphore,
+                    spreadsheet_job_id,
+                    region,
+                    owner,
+                )
+                for region in regions
+            ],
+            return_exceptions=True,
+        )
+        region_handles: list[str] = []
+        failed_regions: dict[str, str] = {}
+        for region, result in zip(regions, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    raise result
+                reason = (
+                    "timed out"
+                    if isinstance(result, TimeoutError)
+                    else f"{type(result).__name__}: {result}"
+                )
+                logging.error(f"Could not download region {region.region_id}: {reason}")
+                failed_regions[region.region_id] = reason
+            else:
+                region_handles.append(result)
+        return RegionDownloadResult(
+            region_handles=region_handles, failed_regions=failed_regions
+        )
+
+
+def get_region_downloader(
+    config: Annotated[
+        DownloadConfig, ResourceConfig("config.json", path_selector="downloads")
+    ],
+) -> RegionDownloader:
+    return RegionDownloader(
+        max_concurrency=config.max_concurrency,
+        region_timeout_seconds=config.region_timeout_seconds,
+    )
@@ -1,44 +1,270 @@
+import asyncio
+import logging
 import os
-from typing import Annotated, Type, cast
+import time
+from typing import TYPE_CHECKING, Annotated, Any, Callable, Type, cast
 
-from openai import AsyncOpenAI
+import jiter
 from pydantic import BaseModel, model_validator
 from typing_extensions import Self
 from workflows.resource import ResourceConfig
 
-from .models import BaseLLM, ChatHistory, ChatMessage, StructuredSchemaT
-from .retry import retry
+from ..clients import HTTPClientConfig, get_openai_client
+from ..exceptions import StreamInterruptedError
+from ..metrics import (
+    LLM_CACHE_REQUESTS,
+    LLM_COST,
+    LLM_FIRST_FIELD_SECONDS,
+    LLM_HISTORY_CHARS,
+    LLM_TOKENS,
+)
+from ..rate_limit import estimate_tokens
+from ..retry import retry_policy
+from .models import (
+    BaseLLM,
+    ChatHistory,
+    ChatMessage,
+    HistoryPolicy,
+    StructuredSchemaT,
+)
+from .response_cache import ResponseCache, ResponseCacheConfig
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from openai.types.responses import ParsedResponse, ResponseUsage
 
 DEFAULT_OPENAI_MODEL = "gpt-4.1"
 
 
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the following conversation in a few sentences, keeping every "
+    "figure and conclusion that later messages may refer to."
+)
+
+# A field of the streamed JSON can only complete on one of these characters.
+FIELD_END_CHARACTERS = frozenset('"]},')
+
+
+def parse_partial_json(text: str) -> dict[str, Any]:
+    """Parse the fields of a truncated JSON object.
+
+    Strings still being generated are left out, but lists and objects still
+    being generated are included with the items completed so far.
+    """
+    try:
+        parsed = jiter.from_json(text.encode(), partial_mode="on")
+    except ValueError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
 class OpenAILLM(BaseLLM):
-    def __init__(self, api_key: str, model: str | None = None) -> None:
+    def __init__(
+        self,
+        api_key: str,
+        model: str | None = None,
+        history_policy: HistoryPolicy = "full",
+        history_max_messages: int = 20,
+        max_history_chars: int | None = None,
+        response_cache: ResponseCache | None = None,
+        client: "AsyncOpenAI | None" = None,
+        input_price_per_million_tokens: float | None = None,
+        output_price_per_million_tokens: float | None = None,
+        stream: bool = True,
+    ) -> None:
         super().__init__(api_key, model or DEFAULT_OPENAI_MODEL)
-        self._client = AsyncOpenAI(api_key=self.api_key)
-        self.chat_history: ChatHistory = ChatHistory(messages=[])
+        self.response_cache = response_cache
+        if client is None:
+            from openai import AsyncOpenAI
 
-    def add_user_message(self, prompt: str) -> None:
-        self.chat_history.append(ChatMessage(role="user", content=prompt))
+            client = AsyncOpenAI(api_key=self.api_key, max_retries=0)
+        self._client = client
+        self.history_policy: HistoryPolicy = history_policy
+        self.history_max_messages = history_max_messages
+        self.max_history_chars = max_history_chars
+        self.input_price_per_million_tokens = input_price_per_million_tokens
+        self.output_price_per_million_tokens = output_price_per_million_tokens
+        self.stream = stream
 
-    @retry()
-    async def generate_content(
-        self, schema: Type[StructuredSchemaT]
-    ) -> StructuredSchemaT | None:
-        response = await self._client.responses.parse(
+    def _record_usage(self, usage: "ResponseUsage | None") -> None:
+        if usage is None:
+            return
+        labels = {"model": self.model}
+        LLM_TOKENS.inc(labels | {"type": "input"}, usage.input_tokens)
+        LLM_TOKENS.inc(labels | {"type": "output"}, usage.output_tokens)
+        if (
+            self.input_price_per_million_tokens is not None
+            and self.output_price_per_million_tokens is not None
+        ):
+            LLM_COST.inc(
+                labels,
+                (
+                    usage.input_tokens * self.input_price_per_million_tokens
+                    + usage.output_tokens * self.output_price_per_million_tokens
+                )
+                / 1_000_000,
+            )
+
+    def new_chat_history(self) -> ChatHistory:
+        """Create an empty chat history, meant to be scoped to a single workflow run."""
+        return ChatHistory(
+            messages=[],
+            policy=self.history_policy,
+            max_messages=self.history_max_messages,
+        )
+
+    async def _summarize(self, messages: list[ChatMessage]) -> str:
+        async def summarize() -> str:
+            response = await self._client.responses.create(
+                model=self.model,
+                instructions=SUMMARY_INSTRUCTIONS,
+                input=[message.to_openai_message() for message in messages],
+            )
+            self._record_usage(response.usage)
+            return response.output_text
+
+        return await retry_policy("openai").call_with_tokens(
+            estimate_tokens(sum(len(message.content) for message in messages)),
+            summarize,
+        )
+
+    async def _apply_history_policy(self, chat_history: ChatHistory) -> None:
+        overflow = chat_history.overflow()
+        if not overflow:
+            return
+        if chat_history.policy == "summarize":
+            chat_history.truncate(summary=await self._summarize(overflow))
+        else:
+            chat_history.truncate()
+
+    async def _parse(
+        self, schema: Type[StructuredSchemaT], chat_history: ChatHistory
+    ) -> "ParsedResponse[StructuredSchemaT]":
+        response = await retry_policy("openai").call_with_tokens(
+            estimate_tokens(chat_history.size_in_chars()),
+            self._client.responses.parse,
             text_format=schema,
             model=self.model,
-            input=self.chat_history.to_openai_message_history(),
+            input=chat_history.to_openai_message_history(),
         )
-        self.chat_history.append(
-            ChatMessage(role="assistant", content=response.output_text)
+        self._record_usage(response.usage)
+        return cast("ParsedResponse[StructuredSchemaT]", response)
+
+    async def _stream(
+        self,
+        schema: Type[StructuredSchemaT],
+        chat_history: ChatHistory,
+        on_partial: Callable[[dict[str, Any]], None],
+    ) -> "ParsedResponse[StructuredSchemaT]":
+        from openai.lib.streaming.responses import ResponseTextDeltaEvent
+
+        async def stream() -> "ParsedResponse[StructuredSchemaT]":
+            start = time.perf_counter()
+            emitted: dict[str, Any] = {}
+            try:
+                async with self._client.responses.stream(
+                    text_format=schema,
+                    model=self.model,
+                    input=chat_history.to_openai_message_history(),
+                ) as events:
+                    async for event in events:
+                        if not isinstance(
+                            event, ResponseTextDeltaEvent
+                        ) or not FIELD_END_CHARACTERS.intersection(event.delta):
+                            continue
+                        partial = parse_partial_json(event.snapshot)
+                        if partial and partial != emitted:
+                            if not emitted:
+                                LLM_FIRST_FIELD_SECONDS.observe(
+                                    time.perf_counter() - start, {"model": self.model}
+                                )
+                            emitted = partial
+                            on_partial(partial)
+                    response = await events.get_final_response()
+            except Exception as e:
+                # Not retried once updates were sent: a new response would not
+                # continue them.
+                if emitted:
+                    raise StreamInterruptedError(
+                        f"The response stream failed after partial results were "
+                        f"sent: {type(e).__name__}: {e}"
+                    ) from e
+                raise
+            self._record_usage(response.usage)
+            return response
+
+        return await retry_policy("openai").call_with_tokens(
+            estimate_tokens(chat_history.size_in_chars()), stream
         )
+
+    async def generate_content(
+        self,
+        schema: Type[StructuredSchemaT],
+        chat_history: ChatHistory,
+        use_cache: bool = True,
+        on_partial: Callable[[dict[str, Any]], None] | None = None,
+    ) -> StructuredSchemaT | None:
+        """Generate an instance of `schema` from the chat history.
+
+        When streaming is enabled and `on_partial` is given, the response is
+        streamed and `on_partial` receives the fields generated so far every
+        time a field or an item of a list is complete. The stream is only
+        retried until the first of them is sent.
+        """
+        await self._apply_history_policy(chat_history)
+        # Kept on the history of the run, as the LLM is shared by concurrent runs.
+        chat_history.sent_messages = len(chat_history.messages)
+        chat_history.sent_chars = chat_history.size_in_chars()
+        LLM_HISTORY_CHARS.observe(chat_history.sent_chars, {"model": self.model})
+        logging.info(
+            f"Sending chat history of {chat_history.sent_messages} messages "
+            f"({chat_history.sent_chars} characters)"
+        )
+        if (
+            self.max_history_chars is not None
+            and chat_history.sent_chars > self.max_history_chars
+        ):
+            raise ValueError(
+                f"Chat history has {chat_history.sent_chars} characters, "
+                f"more than the allowed {self.max_history_chars}"
+            )
+        cache_key = None
+        if self.response_cache is not None:
+            if use_cache:
+                cache_key = ResponseCache.make_key(self.model, schema, chat_history)
+                cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+                if cached is not None:
+                    logging.info("Using cached LLM response")
+                    chat_history.append(ChatMessage(role="assistant", content=cached))
+                    return schema.model_validate_json(cached)
+            else:
+                self.response_cache.stats.bypassed += 1
+                LLM_CACHE_REQUESTS.inc({"result": "bypassed"})
+        if self.stream and on_partial is not None:
+            response = await self._stream(schema, chat_history, on_partial)
+        else:
+            response = await self._parse(schema, chat_history)
+        chat_history.append(ChatMessage(role="assistant", content=response.output_text))
+        if (
+            self.response_cache is not None
+            and cache_key is not None
+            and response.output_parsed is not None
+        ):
+            await asyncio.to_thread(
+                self.response_cache.put, cache_key, response.output_text
+            )
         return response.output_parsed
 
 
 class OpenAILLMConfig(BaseModel):
     api_key: str | None = None
     llm_model: str | None = None
+    history_policy: HistoryPolicy = "full"
+    history_max_messages: int = 20
+    max_history_chars: int | None = None
+    input_price_per_million_tokens: float | None = None
+    output_price_per_million_tokens: float | None = None
+    stream: bool = True
 
     @model_validator(mode="after")
     def validate_openai_config(self) -> Self:
@@ -55,5 +281,31 @@ def get_llm(
     config: Annotated[
         OpenAILLMConfig, ResourceConfig("config.json", path_selector="llm")
     ],
+    cache_config: Annotated[
+        ResponseCacheConfig, ResourceConfig("config.json", path_selector="llm_cache")
+    ],
+    http_config: Annotated[
+        HTTPClientConfig,
+        ResourceConfig("config.json", path_selector="http_clients.openai"),
+    ],
 ) -> OpenAILLM:
-    return OpenAILLM(api_key=cast(str, config.api_key), model=config.llm_model)
+    response_cache = None
+    if cache_config.enabled:
+        response_cache = ResponseCache(
+            path=cache_config.path,
+            memory_max_entries=cache_config.memory_max_entries,
+            disk_max_bytes=cache_config.disk_max_bytes,
+            ttl_seconds=cache_config.ttl_seconds,
+        )
+    return OpenAILLM(
+        api_key=cast(str, config.api_key),
+        model=config.llm_model,
+        history_policy=config.history_policy,
+        history_max_messages=config.history_max_messages,
+        max_history_chars=config.max_history_chars,
+        response_cache=response_cache,
+        input_price_per_million_tokens=config.input_price_per_million_tokens,
+        output_price_per_million_tokens=config.output_price_per_million_tokens,
+        stream=config.stream,
+        client=get_openai_client(cast(str, config.api_key), http_config),
+    )
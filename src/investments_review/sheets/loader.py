@@ -0,0 +1,349 @@
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Annotated
+
+from pydantic import BaseModel
+from workflows.resource import ResourceConfig
+
+from ..metrics import SHEET_TABLE_BYTES, SHEET_TABLES_SAMPLED
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+# Bytes per value assumed for the parquet physical types when estimating the
+# in-memory size of a table, as dictionary-encoded pages can be much smaller.
+BYTES_PER_VALUE = {"BOOLEAN": 1, "INT32": 4, "FLOAT": 4, "INT64": 8, "DOUBLE": 8}
+
+
+class TableLoaderConfig(BaseModel):
+    batch_rows: int = 65_536
+    prune_empty_columns: bool = True
+    categorical_max_ratio: float = 0.5
+    downcast_integers: bool = True
+    memory_limit_bytes: int | None = 512 * 1024 * 1024
+
+
+@dataclass
+class ColumnSummary:
+    count: int
+    total: float
+    minimum: float
+    maximum: float
+
+
+@dataclass
+class LoadedTable:
+    df: "pd.DataFrame"
+    total_rows: int
+    # Summaries of the numeric columns over every row, when the table is sampled.
+    column_summaries: dict[str, ColumnSummary] = field(default_factory=dict)
+
+    @property
+    def sampled(self) -> bool:
+        return len(self.df) < self.total_rows
+
+    def column_totals(self) -> dict[str, float]:
+        return {name: summary.total for name, summary in self.column_summaries.items()}
+
+    def notes(self) -> list[str]:
+        if not self.sampled:
+            return []
+        notes = [
+            f"Sample of {len(self.df)} of {self.total_rows} rows, evenly spread "
+            "over the table"
+        ]
+        if self.column_summaries:
+            notes.append(
+                f"Over all {self.total_rows} rows: "
+                + "; ".join(
+                    f"{name} sum {summary.total:,.2f}, min {summary.minimum:,.2f}, "
+                    f"max {summary.maximum:,.2f}"
+                    for name, summary in self.column_summaries.items()
+                )
+            )
+        return notes
+
+
+def _summarize(
+    summaries: dict[str, ColumnSummary], batch: "pa.RecordBatch", columns: list[str]
+) -> None:
+    import numpy as np
+
+    for name in columns:
+        column = batch.column(name)
+        count = len(column) - column.null_count
+        if not count:
+            continue
+        values = column.to_numpy(zero_copy_only=False).astype("float64")
+        total = float(np.nansum(values))
+        minimum = float(np.nanmin(values))
+        maximum = float(np.nanmax(values))
+        summary = summaries.get(name)
+        if summary is None:
+            summaries[name] = ColumnSummary(count, total, minimum, maximum)
+        else:
+            summary.count += count
+            summary.total += total
+            summary.minimum = min(summary.minimum, minimum)
+            summary.maximum = max(summary.maximum, maximum)
+
+
+class TableLoader:
+    """Load parquet regions into dataframes within a memory ceiling.
+
+    Regions are read in batches of `batch_rows`, without the pandas index
+    columns and, with `prune_empty_columns`, without the columns that the
+    parquet statistics show to be empty. Strings are kept in Arrow, repetitive
+    ones as categoricals, and integers are downcast to the smallest type holding
+    the range of the parquet statistics. Floats are kept as they are, so that
+    amounts keep their precision.
+
+    `memory_limit_bytes` is shared by the tables loaded for a run: small tables
+    are loaded whole and the others get an even share of the rest. A table
+    estimated above its share is sampled, keeping every n-th row, and the sums
+    and ranges of its numeric columns are computed over every row instead.
+    """
+
+    def __init__(
+        self,
+        batch_rows: int = 65_536,
+        prune_empty_columns: bool = True,
+        categorical_max_ratio: float = 0.5,
+        downcast_integers: bool = True,
+        memory_limit_bytes: int | None = 512 * 1024 * 1024,
+    ) -> None:
+        self.batch_rows = batch_rows
+        self.prune_empty_columns = prune_empty_columns
+        self.categorical_max_ratio = categorical_max_ratio
+        self.downcast_integers = downcast_integers
+        self.memory_limit_bytes = memory_limit_bytes
+
+    def _empty_columns(self, parquet_file: "pq.ParquetFile") -> set[str]:
+        import pyarrow as pa
+
+        metadata = parquet_file.metadata
+        nulls: dict[str, int] = {}
+        unknown: set[str] = set()
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            for j in range(row_group.num_columns):
+                column = row_group.column(j)
+                name = column.path_in_schema
+                statistics = column.statistics
+                if "." in name or statistics is None or not statistics.has_null_count:
+                    unknown.add(name.split(".")[0])
+                    continue
+                nulls[name] = nulls.get(name, 0) + statistics.null_count
+        # Columns written without any value have the null type and no statistics.
+        empty = {
+            column.name
+            for column in parquet_file.schema_arrow
+            if pa.types.is_null(column.type)
+        }
+        return empty | {
+            name
+            for name, count in nulls.items()
+            if name not in unknown and count == metadata.num_rows > 0
+        }
+
+    def columns(self, parquet_file: "pq.ParquetFile") -> list[str]:
+        """Columns of a region worth loading."""
+        schema = parquet_file.schema_arrow
+        skipped = {
+            column
+            for column in (schema.pandas_metadata or {}).get("index_columns", [])
+            if isinstance(column, str)
+        }
+        if self.prune_empty_columns:
+            skipped |= self._empty_columns(parquet_file)
+        return [name for name in schema.names if name not in skipped]
+
+    def estimate_bytes(
+        self, parquet_file: "pq.ParquetFile", columns: list[str] | None = None
+    ) -> int:
+        """Estimated in-memory size of `columns` of a region."""
+        metadata = parquet_file.metadata
+        selected = set(columns if columns is not None else self.columns(parquet_file))
+        size = 0
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            for j in range(row_group.num_columns):
+                column = row_group.column(j)
+                if column.path_in_schema.split(".")[0] in selected:
+                    size += max(
+                        column.total_uncompressed_size,
+                        column.num_values
+                        * BYTES_PER_VALUE.get(column.physical_type, 8),
+                    )
+        return size
+
+    def allocate(
+        self,
+        parquet_files: "list[pq.ParquetFile]",
+        columns: list[list[str]] | None = None,
+    ) -> list[int | None]:
+        """Memory allowed for each region loaded together in a run.
+
+        `columns` are the columns loaded from each region, by default the ones
+        worth loading.
+        """
+        if self.memory_limit_bytes is None:
+            return [None for _ in parquet_files]
+        sizes = [
+            self.estimate_bytes(parquet_file, columns[i] if columns else None)
+            for i, parquet_file in enumerate(parquet_files)
+        ]
+        allowed: list[int | None] = [None for _ in parquet_files]
+        remaining = self.memory_limit_bytes
+        order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+        for n, i in enumerate(order):
+            share = min(sizes[i], remaining // (len(sizes) - n))
+            allowed[i] = share
+            remaining -= share
+        return allowed
+
+    def _categorical_columns(self, batch: "pa.RecordBatch") -> list[int]:
+        """String columns repetitive enough in `batch` to be stored as categoricals."""
+        import pyarrow as pa
+
+        if batch.num_rows <= 1:
+            return []
+        return [
+            i
+            for i, column in enumerate(batch.schema)
+            if (
+                pa.types.is_string(column.type) or pa.types.is_large_string(column.type)
+            )
+            and len(batch.column(i).unique())
+            <= self.categorical_max_ratio * batch.num_rows
+        ]
+
+    def _integer_types(
+        self, parquet_file: "pq.ParquetFile", schema: "pa.Schema"
+    ) -> "dict[str, pa.DataType]":
+        """Smallest type holding each integer column, from the parquet statistics."""
+        import numpy as np
+        import pyarrow as pa
+
+        integer_columns = {
+            column.name: column.type.bit_width
+            for column in schema
+            if pa.types.is_signed_integer(column.type)
+        }
+        metadata = parquet_file.metadata
+        bounds: dict[str, tuple[int, int]] = {}
+        unknown: set[str] = set()
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            for j in range(row_group.num_columns):
+                column = row_group.column(j)
+                name = column.path_in_schema
+                if name not in integer_columns:
+                    continue
+                statistics = column.statistics
+                if statistics is None or not statistics.has_min_max:
+                    unknown.add(name)
+                    continue
+                minimum, maximum = bounds.get(name, (statistics.min, statistics.max))
+                bounds[name] = (
+                    min(minimum, statistics.min),
+                    max(maximum, statistics.max),
+                )
+        types = {}
+        for name, (minimum, maximum) in bounds.items():
+            if name in unknown:
+                continue
+            for integer_type in (pa.int8(), pa.int16(), pa.int32()):
+                limits = np.iinfo(integer_type.to_pandas_dtype())
+                if limits.min <= minimum and maximum <= limits.max:
+                    if integer_type.bit_width < integer_columns[name]:
+                        types[name] = integer_type
+                    break
+        return types
+
+    def load(
+        self,
+        parquet_file: "pq.ParquetFile",
+        max_bytes: int | None = None,
+        columns: list[str] | None = None,
+    ) -> LoadedTable:
+        import numpy as np
+        import pandas as pd
+        import pyarrow as pa
+
+        if columns is None:
+            columns = self.columns(parquet_file)
+        total_rows = parquet_file.metadata.num_rows
+        if max_bytes is None:
+            max_bytes = self.memory_limit_bytes
+        size = self.estimate_bytes(parquet_file, columns)
+        step = 1
+        if max_bytes is not None and size > max_bytes:
+            step = math.ceil(size / max(max_bytes, 1))
+        schema = pa.schema([parquet_file.schema_arrow.field(name) for name in columns])
+        numeric = [
+            column.name
+            for column in schema
+            if pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+        ]
+        integer_types = (
+            self._integer_types(parquet_file, schema) if self.downcast_integers else {}
+        )
+        summaries: dict[str, ColumnSummary] = {}
+        # Decided on the first batch, so that strings are encoded as they are read.
+        categorical: list[int] | None = None
+        batches = []
+        offset = 0
+        for batch in parquet_file.iter_batches(
+            batch_size=self.batch_rows, columns=columns, use_pandas_metadata=False
+        ):
+            if step > 1:
+                _summarize(summaries, batch, numeric)
+                rows = batch.num_rows
+                batch = batch.take(pa.array(np.arange(-offset % step, rows, step)))
+                offset += rows
+            if categorical is None:
+                categorical = self._categorical_columns(batch)
+            for i in categorical:
+                batch = batch.set_column(
+                    i, batch.schema.field(i).name, batch.column(i).dictionary_encode()
+                )
+            for name, integer_type in integer_types.items():
+                i = batch.schema.get_field_index(name)
+                batch = batch.set_column(i, name, batch.column(i).cast(integer_type))
+            batches.append(batch)
+        table = pa.Table.from_batches(batches) if batches else schema.empty_table()
+        batches.clear()
+        string_dtype = pd.StringDtype("pyarrow", na_value=np.nan)
+        df = table.to_pandas(
+            split_blocks=True,
+            self_destruct=True,
+            types_mapper={
+                pa.string(): string_dtype,
+                pa.large_string(): string_dtype,
+            }.get,
+        )
+        del table
+        memory = int(df.memory_usage(deep=True).sum())
+        SHEET_TABLE_BYTES.observe(memory)
+        if step > 1:
+            SHEET_TABLES_SAMPLED.inc()
+            logging.warning(
+                f"Region estimated at {size} bytes, above its {max_bytes} byte "
+                f"share of the memory limit: sampled {len(df)} of {total_rows} rows"
+            )
+        logging.debug(
+            f"Loaded {len(df)} rows and {len(df.columns)} columns in {memory} bytes"
+        )
+        return LoadedTable(df=df, total_rows=total_rows, column_summaries=summaries)
+
+
+def get_table_loader(
+    config: Annotated[
+        TableLoaderConfig, ResourceConfig("config.json", path_selector="table_loader")
+    ],
+) -> TableLoader:
+    return TableLoader(**config.model_dump())
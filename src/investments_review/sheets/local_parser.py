@@ -0,0 +1,219 @@
+import io
+import os
+import re
+import zipfile
+from datetime import date, datetime, time
+from typing import IO, TYPE_CHECKING, Annotated, Any, Iterable
+
+from pydantic import BaseModel
+from workflows.resource import ResourceConfig
+
+from ..exceptions import UnsupportedSheetError
+from ..metrics import SHEET_PARSES
+from ..shared import FileEvent, read_source_content
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# Merged cells, and formula cells without a cached value, in the worksheet XML.
+_EMPTY_VALUE = rb"(?:<(?:\w+:)?v\s*/>|<(?:\w+:)?v></(?:\w+:)?v>)?"
+UNSUPPORTED_XML = re.compile(
+    rb"<(?:\w+:)?mergeCell[\s>/]"
+    rb"|(?:</(?:\w+:)?f>|<(?:\w+:)?f[^>]*/>)" + _EMPTY_VALUE + rb"</(?:\w+:)?c>"
+)
+XML_CHUNK_BYTES = 1024 * 1024
+XML_OVERLAP_BYTES = 256
+
+
+class LocalParserConfig(BaseModel):
+    enabled: bool = True
+    max_file_bytes: int = 20 * 1024 * 1024
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _kind(value: Any) -> str:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, str):
+        return "text"
+    return type(value).__name__
+
+
+def _to_array(name: str, values: list[Any]) -> "pa.Array":
+    import pyarrow as pa
+
+    kinds = {_kind(value) for value in values if value is not None}
+    if not kinds:
+        return pa.nulls(len(values))
+    if kinds == {"integer"}:
+        return pa.array(values, pa.int64())
+    if kinds <= {"integer", "float"}:
+        return pa.array(values, pa.float64())
+    if kinds == {"boolean"}:
+        return pa.array(values, pa.bool_())
+    if kinds == {"text"}:
+        return pa.array([value.strip() if value else value for value in values])
+    if kinds == {"date"}:
+        return pa.array(
+            [
+                datetime.combine(value, time())
+                if value is not None and not isinstance(value, datetime)
+                else value
+                for value in values
+            ],
+            pa.timestamp("us"),
+        )
+    raise UnsupportedSheetError(
+        f"Column {name} mixes {', '.join(sorted(kinds))} values"
+    )
+
+
+class LocalSheetParser:
+    """Parse simple workbooks locally instead of with LlamaSheets.
+
+    A worksheet is simple when it holds a single table: a header row of
+    distinct names without gaps, then rows without values outside the header
+    columns or blank rows in between, each column holding one type of values
+    (numbers, booleans, dates or text). Every worksheet with a table becomes a
+    parquet region, like the ones downloaded from LlamaSheets. Workbooks with
+    merged cells, formulas without a cached value or any worksheet that is not
+    simple are left to LlamaSheets, as are files above `max_file_bytes`.
+    """
+
+    def __init__(self, enabled: bool = True, max_file_bytes: int = 20 * 1024 * 1024):
+        self.enabled = enabled
+        self.max_file_bytes = max_file_bytes
+
+    def _check_xml(self, source: str | IO[bytes]) -> None:
+        with zipfile.ZipFile(source) as archive:
+            for name in archive.namelist():
+                if not (name.startswith("xl/worksheets/") and name.endswith(".xml")):
+                    continue
+                with archive.open(name) as f:
+                    tail = b""
+                    while chunk := f.read(XML_CHUNK_BYTES):
+                        if UNSUPPORTED_XML.search(tail + chunk):
+                            raise UnsupportedSheetError(
+                                f"{name} has merged cells or formulas without a "
+                                "cached value"
+                            )
+                        tail = chunk[-XML_OVERLAP_BYTES:]
+
+    def _read_table(
+        self, title: str, rows: Iterable[tuple[Any, ...]]
+    ) -> "pa.Table | None":
+        import pyarrow as pa
+
+        header: list[str] | None = None
+        first = last = 0
+        columns: list[list[Any]] = []
+        blank = False
+        for row in rows:
+            filled = [i for i, value in enumerate(row) if not _is_empty(value)]
+            if not filled:
+                blank = header is not None
+                continue
+            if header is None:
+                first, last = filled[0], filled[-1]
+                if len(filled) != last - first + 1:
+                    raise UnsupportedSheetError(
+                        f"The header row of {title} has blank cells"
+                    )
+                header = [str(row[i]).strip() for i in range(first, last + 1)]
+                if len(set(header)) != len(header):
+                    raise UnsupportedSheetError(f"{title} has duplicate column names")
+                columns = [[] for _ in header]
+                continue
+            if blank:
+                raise UnsupportedSheetError(f"{title} has several blocks of rows")
+            if filled[0] < first or filled[-1] > last:
+                raise UnsupportedSheetError(f"{title} has values outside its table")
+            for j, values in enumerate(columns, start=first):
+                value = row[j] if j < len(row) else None
+                values.append(None if _is_empty(value) else value)
+        if header is None or not columns[0]:
+            return None
+        return pa.table(
+            {name: _to_array(name, values) for name, values in zip(header, columns)}
+        )
+
+    def parse(self, source: str | IO[bytes]) -> list[bytes]:
+        """Parquet files of the tables of a workbook, one per worksheet.
+
+        Raises `UnsupportedSheetError` when the workbook needs LlamaSheets.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from openpyxl import load_workbook
+
+        try:
+            self._check_xml(source)
+            if not isinstance(source, str):
+                source.seek(0)
+            workbook = load_workbook(source, read_only=True, data_only=True)
+            try:
+                tables = [
+                    self._read_table(
+                        worksheet.title, worksheet.iter_rows(values_only=True)
+                    )
+                    for worksheet in workbook.worksheets
+                ]
+            finally:
+                workbook.close()
+        except UnsupportedSheetError:
+            raise
+        except Exception as e:
+            raise UnsupportedSheetError(f"Could not read the workbook: {e}") from e
+        regions = []
+        for table in tables:
+            if table is None:
+                continue
+            sink = pa.BufferOutputStream()
+            pq.write_table(table, sink)
+            regions.append(sink.getvalue().to_pybytes())
+        if not regions:
+            raise UnsupportedSheetError("No table found in the workbook")
+        return regions
+
+    def parse_event(self, ev: FileEvent) -> list[bytes]:
+        """Parse the workbook referenced by a start event, if it is simple enough."""
+        try:
+            if not self.enabled:
+                raise UnsupportedSheetError("Local parsing is disabled")
+            source: str | IO[bytes]
+            if ev.is_source_content:
+                content = read_source_content(ev)
+                source = io.BytesIO(content)
+                size = len(content)
+            else:
+                source = ev.file_input
+                size = os.path.getsize(source)
+            if size > self.max_file_bytes:
+                raise UnsupportedSheetError(
+                    f"The workbook is larger than {self.max_file_bytes} bytes"
+                )
+            regions = self.parse(source)
+        except UnsupportedSheetError:
+            SHEET_PARSES.inc({"parser": "llama_sheets"})
+            raise
+        SHEET_PARSES.inc({"parser": "local"})
+        return regions
+
+
+def get_local_sheet_parser(
+    config: Annotated[
+        LocalParserConfig, ResourceConfig("config.json", path_selector="local_parser")
+    ],
+) -> LocalSheetParser:
+    return LocalSheetParser(
+        enabled=config.enabled, max_file_bytes=config.max_file_bytes
+    )
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from typing import Annotated, Any, Callable
+
+from pydantic import BaseModel
+from workflows.resource import ResourceConfig
+
+from ..rate_limit import estimate_tokens
+from .llm import OpenAILLM
+from .models import ChatMessage, InvestmentSheetAnalysis, PartialSheetAnalysis
+from .prompt import get_map_prompt, get_reduce_prompt
+
+
+class MapReduceConfig(BaseModel):
+    enabled: bool = True
+    threshold_tokens: int = 30_000
+    chunk_tokens: int = 12_000
+    max_concurrency: int = 4
+
+
+class MapReduceAnalyzer:
+    """Analyze large workbooks in parts, then merge the partial analyses.
+
+    Above `threshold_tokens`, the tables are packed into parts of at most
+    `chunk_tokens` (tables larger than that are expected to be split into row
+    chunks beforehand). Up to `max_concurrency` parts are analyzed at the same
+    time and a final call merges their analyses with the precomputed metrics.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        threshold_tokens: int = 30_000,
+        chunk_tokens: int = 12_000,
+        max_concurrency: int = 4,
+    ) -> None:
+        self.enabled = enabled
+        self.threshold_tokens = threshold_tokens
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        self.map_prompt = get_map_prompt()
+        self.reduce_prompt = get_reduce_prompt()
+
+    def should_use(self, prompt: str) -> bool:
+        return self.enabled and estimate_tokens(len(prompt)) > self.threshold_tokens
+
+    def pack(self, tables: list[str]) -> list[list[str]]:
+        """Group consecutive tables into parts of at most `chunk_tokens`."""
+        parts: list[list[str]] = []
+        tokens = 0
+        for table in tables:
+            table_tokens = estimate_tokens(len(table))
+            if not parts or tokens + table_tokens > self.chunk_tokens:
+                parts.append([])
+                tokens = 0
+            parts[-1].append(table)
+            tokens += table_tokens
+        return parts
+
+    async def _map(
+        self, llm: OpenAILLM, tables: list[str], part: int, parts: int
+    ) -> PartialSheetAnalysis | None:
+        chat_history = llm.new_chat_history()
+        chat_history.append(
+            ChatMessage(
+                role="user",
+                content=self.map_prompt.render(
+                    part=part, parts=parts, tables="\n\n".join(tables)
+                ),
+            )
+        )
+        return await llm.generate_content(
+            schema=PartialSheetAnalysis, chat_history=chat_history
+        )
+
+    async def analyze(
+        self,
+        llm: OpenAILLM,
+        metrics: list[str],
+        tables: list[str],
+        on_part_done: Callable[[int, int, PartialSheetAnalysis | None], None]
+        | None = None,
+        on_partial: Callable[[dict[str, Any]], None] | None = None,
+    ) -> InvestmentSheetAnalysis | None:
+        """Analyze the tables in parts; `on_partial` is passed on to the reduce call."""
+        parts = self.pack(tables)
+        logging.info(f"Analyzing the spreadsheet in {len(parts)} parts")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_part(
+            i: int, part_tables: list[str]
+        ) -> PartialSheetAnalysis | None:
+            async with semaphore:
+                try:
+                    partial = await self._map(llm, part_tables, i + 1, len(parts))
+                except Exception as e:
+                    logging.error(f"Could not analyze part {i + 1}: {e}")
+                    partial = None
+            if on_part_done is not None:
+                on_part_done(i + 1, len(parts), partial)
+            return partial
+
+        partials = await asyncio.gather(
+            *[run_part(i, part_tables) for i, part_tables in enumerate(parts)]
+        )
+        if all(partial is None for partial in partials):
+            return None
+        analyses = [
+            f"Part {i + 1}:\n{partial.to_string()}"
+            if partial is not None
+            else f"Part {i + 1}: could not be analyzed"
+            for i, partial in enumerate(partials)
+        ]
+        chat_history = llm.new_chat_history()
+        chat_history.append(
+            ChatMessage(
+                role="user",
+                content=self.reduce_prompt.render(
+                    parts=len(parts),
+                    analyses="\n\n".join(analyses),
+                    metrics="\n\n".join(metrics),
+                ),
+            )
+        )
+        return await llm.generate_content(
+            schema=InvestmentSheetAnalysis,
+            chat_history=chat_history,
+            on_partial=on_partial,
+        )
+
+
+def get_map_reduce_analyzer(
+    config: Annotated[
+        MapReduceConfig, ResourceConfig("config.json", path_selector="map_reduce")
+    ],
+) -> MapReduceAnalyzer:
+    return MapReduceAnalyzer(**config.model_dump())
@@ -1,10 +1,14 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any, Literal, Type, TypeVar
+from typing import TYPE_CHECKING, Any, Callable, Literal, Type, TypeVar
 
-from openai.types.responses.easy_input_message_param import EasyInputMessageParam
 from pydantic import BaseModel, Field
 
+if TYPE_CHECKING:
+    from openai.types.responses.easy_input_message_param import (
+        EasyInputMessageParam,
+    )
+
 StructuredSchemaT = TypeVar("StructuredSchemaT", bound=BaseModel)
 
 
@@ -13,19 +17,49 @@ class ChatMessage:
     role: Literal["user", "assistant", "system"]
     content: str
 
-    def to_openai_message(self) -> EasyInputMessageParam:
-        return EasyInputMessageParam(
-            role=self.role, content=self.content, type="message"
-        )
+    def to_openai_message(self) -> "EasyInputMessageParam":
+        return {"role": self.role, "content": self.content, "type": "message"}
+
+
+HistoryPolicy = Literal["full", "sliding_window", "summarize"]
 
 
 @dataclass
 class ChatHistory:
     messages: list[ChatMessage]
+    policy: HistoryPolicy = "full"
+    max_messages: int = 20
+    # Size of the history when it was last sent to the model.
+    sent_messages: int = 0
+    sent_chars: int = 0
 
     def append(self, message: ChatMessage) -> None:
         self.messages.append(message)
 
+    def size_in_chars(self) -> int:
+        return sum(len(message.content) for message in self.messages)
+
+    def overflow(self) -> list[ChatMessage]:
+        """Messages that fall outside of the most recent `max_messages`"""
+        if self.policy == "full" or len(self.messages) <= self.max_messages:
+            return []
+        return self.messages[: len(self.messages) - self.max_messages]
+
+    def truncate(self, summary: str | None = None) -> None:
+        """Drop the overflowing messages, replacing them with `summary` if provided."""
+        overflow = self.overflow()
+        if not overflow:
+            return
+        self.messages = self.messages[len(overflow) :]
+        if summary is not None:
+            self.messages.insert(
+                0,
+                ChatMessage(
+                    role="system",
+                    content=f"Summary of the earlier conversation: {summary}",
+                ),
+            )
+
     def to_openai_message_history(self) -> list[Any]:
         return [message.to_openai_message() for message in self.messages]
 
@@ -39,6 +73,9 @@ class BaseLLM(ABC):
     async def generate_content(
         self,
         schema: Type[StructuredSchemaT],
+        chat_history: ChatHistory,
+        use_cache: bool = True,
+        on_partial: Callable[[dict[str, Any]], None] | None = None,
     ) -> StructuredSchemaT | None: ...
 
 
@@ -68,3 +105,30 @@ class InvestmentSheetAnalysis(BaseModel):
             f"{self.best_performing}.\n"
             f"{self.worst_performing}.\n" + suggestions
         )
+
+
+class PartialSheetAnalysis(BaseModel):
+    """Analysis of a part of an investment spreadsheet, merged with the other parts later"""
+
+    trend: str = Field(description="Trend of the investments in this part")
+    best_performing: str = Field(
+        description="Best performing investments in this part, with their figures"
+    )
+    worst_performing: str = Field(
+        description="Worst performing investments in this part, with their figures"
+    )
+    observations: list[str] = Field(
+        description="Other facts in this part that matter for the whole portfolio",
+        default_factory=list,
+    )
+
+    def to_string(self) -> str:
+        observations = "".join(
+            "\n- " + observation for observation in self.observations
+        )
+        return (
+            f"Trend: {self.trend}\n"
+            f"Best performing: {self.best_performing}\n"
+            f"Worst performing: {self.worst_performing}\n"
+            f"Observations:{observations or ' none'}"
+        )
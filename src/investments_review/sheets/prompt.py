@@ -4,5 +4,31 @@ from jinja2 import Template
 def get_prompt() -> Template:
     return Template(
         "Your task is to analyze the trends and performance of an investment portfolio "
-        "(and possibly come up with improvement suggestions) based on these tables:\n\n{{tables}}\n\n"
+        "(and possibly come up with improvement suggestions) based on "
+        "{% if metrics %}these precomputed metrics:\n\n{{metrics}}\n\n"
+        "{% if tables %}and {% endif %}{% endif %}"
+        "{% if tables %}these tables:\n\n{{tables}}\n\n{% endif %}"
+        "{% if metrics %}The metrics are exact: rely on them for figures and rankings "
+        "and focus on explaining them.\n{% endif %}"
+    )
+
+
+def get_map_prompt() -> Template:
+    return Template(
+        "Your task is to analyze part {{part}} of {{parts}} of an investment portfolio "
+        "spreadsheet. The other parts are analyzed separately and the analyses are "
+        "merged afterwards, so only report what these tables show, keeping the exact "
+        "figures that support it:\n\n{{tables}}\n\n"
+    )
+
+
+def get_reduce_prompt() -> Template:
+    return Template(
+        "Your task is to analyze the trends and performance of an investment portfolio "
+        "(and possibly come up with improvement suggestions). The spreadsheet was too "
+        "large to read at once, so it was analyzed in {{parts}} parts. Merge these "
+        "analyses into one, comparing the figures across parts to find the overall "
+        "best and worst performing investments:\n\n{{analyses}}\n\n"
+        "{% if metrics %}These precomputed metrics cover whole tables and are exact: "
+        "rely on them for figures and rankings:\n\n{{metrics}}\n\n{% endif %}"
     )
@@ -0,0 +1,155 @@
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections.abc import Hashable
+from typing import TYPE_CHECKING, Annotated
+from uuid import uuid4
+
+import aiofiles
+from pydantic import BaseModel
+from workflows.resource import ResourceConfig
+
+from ..exceptions import SheetParsingError
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+
+class RegionStoreConfig(BaseModel):
+    spill_to_disk: bool = False
+    spill_threshold_bytes: int = 64 * 1024 * 1024
+    spill_dir: str | None = None
+
+
+class RegionStore:
+    """Process-local store for downloaded parquet regions.
+
+    Regions are kept as Arrow buffers and referenced by opaque handles, so
+    workflow events never carry the data itself. When spilling is enabled,
+    regions larger than `spill_threshold_bytes` are written to a private
+    temporary directory instead and memory-mapped back on read. Released regions
+    are dropped from memory and their spill files removed.
+
+    Regions put with an `owner`, such as the context of a workflow run, can
+    all be released with `release_owned` once the owner is done with them.
+    """
+
+    def __init__(
+        self,
+        spill_to_disk: bool = False,
+        spill_threshold_bytes: int = 64 * 1024 * 1024,
+        spill_dir: str | None = None,
+    ) -> None:
+        self.spill_to_disk = spill_to_disk
+        self.spill_threshold_bytes = spill_threshold_bytes
+        self._spill_parent_dir = spill_dir
+        self._spill_dir: str | None = None
+        self._buffers: dict[str, "pa.Buffer"] = {}
+        self._spilled: dict[str, str] = {}
+        self._owners: dict[str, Hashable] = {}
+        self._lock = threading.Lock()
+
+    def _get_spill_dir(self) -> str:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(
+                prefix="investments-review-", dir=self._spill_parent_dir
+            )
+        return self._spill_dir
+
+    async def put(
+        self, region_id: str, content: bytes, owner: Hashable | None = None
+    ) -> str:
+        handle = f"{region_id}-{uuid4().hex}"
+        if self.spill_to_disk and len(content) > self.spill_threshold_bytes:
+            file_path = os.path.join(self._get_spill_dir(), f"{handle}.parquet")
+            async with aiofiles.open(file_path, "wb") as f:
+                await f.write(content)
+            with self._lock:
+                self._spilled[handle] = file_path
+                if owner is not None:
+                    self._owners[handle] = owner
+        else:
+            import pyarrow as pa
+
+            with self._lock:
+                self._buffers[handle] = pa.py_buffer(content)
+                if owner is not None:
+                    self._owners[handle] = owner
+        return handle
+
+    def open(self, handle: str) -> "pq.ParquetFile":
+        """Open a region for reading, without loading its row groups."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        with self._lock:
+            buffer = self._buffers.get(handle)
+            file_path = self._spilled.get(handle)
+        if buffer is not None:
+            return pq.ParquetFile(pa.BufferReader(buffer))
+        if file_path is not None:
+            return pq.ParquetFile(file_path, memory_map=True)
+        raise SheetParsingError(f"No region stored for handle {handle}")
+
+    def release(self, handle: str) -> None:
+        with self._lock:
+            self._buffers.pop(handle, None)
+            file_path = self._spilled.pop(handle, None)
+            self._owners.pop(handle, None)
+        if file_path is not None:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    def release_owned(self, owner: Hashable) -> None:
+        """Release the regions that `owner` still holds."""
+        with self._lock:
+            handles = [
+                handle
+                for handle, handle_owner in self._owners.items()
+                if handle_owner == owner
+            ]
+        for handle in handles:
+            self.release(handle)
+
+    def close(self) -> None:
+        with self._lock:
+            self._buffers.clear()
+            self._spilled.clear()
+            self._owners.clear()
+        if self._spill_dir is not None:
+            logging.debug(f"Removing spill directory {self._spill_dir}")
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+
+# Stores handed to the workflows, so that the regions of a run can be released
+# when it ends.
+_region_stores: "weakref.WeakSet[RegionStore]" = weakref.WeakSet()
+
+
+def release_run_regions(run: Hashable) -> None:
+    """Release the regions still held by a workflow run, once it is over."""
+    for region_store in list(_region_stores):
+        region_store.release_owned(run)
+
+
+def get_region_store(
+    config: Annotated[
+        RegionStoreConfig, ResourceConfig("config.json", path_selector="regions")
+    ],
+) -> RegionStore:
+    region_store = RegionStore(
+        spill_to_disk=config.spill_to_disk,
+        spill_threshold_bytes=config.spill_threshold_bytes,
+        spill_dir=config.spill_dir,
+    )
+    atexit.register(region_store.close)
+    _region_stores.add(region_store)
+    return region_store
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from pydantic import BaseModel
+
+from ..metrics import LLM_CACHE_REQUESTS
+from .models import ChatHistory
+
+DEFAULT_RESPONSE_CACHE_PATH = ".cache/llm_responses.sqlite"
+
+
+class ResponseCacheConfig(BaseModel):
+    enabled: bool = True
+    path: str = DEFAULT_RESPONSE_CACHE_PATH
+    memory_max_entries: int = 256
+    disk_max_bytes: int = 256 * 1024 * 1024
+    ttl_seconds: float = 24 * 60 * 60
+
+
+class ResponseCacheStats(BaseModel):
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+
+class ResponseCache:
+    """Two-tier cache of raw LLM responses.
+
+    Responses are first looked up in an in-memory LRU of at most
+    `memory_max_entries` items, then in a SQLite table whose total payload is
+    kept under `disk_max_bytes` by evicting the least recently used rows.
+    Entries older than `ttl_seconds` are ignored and removed from both tiers.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_RESPONSE_CACHE_PATH,
+        memory_max_entries: int = 256,
+        disk_max_bytes: int = 256 * 1024 * 1024,
+        ttl_seconds: float = 24 * 60 * 60,
+    ) -> None:
+        self.memory_max_entries = memory_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stats = ResponseCacheStats()
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, "
+            "response TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_used_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, schema: type[BaseModel], chat_history: ChatHistory) -> str:
+        payload = json.dumps(
+            {
+                "model": model,
+                "schema": schema.model_json_schema(),
+                "messages": chat_history.to_openai_message_history(),
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _remember(self, key: str, created_at: float, response: str) -> None:
+        self._memory[key] = (created_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                created_at, response = cached
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.stats.memory_hits += 1
+                    LLM_CACHE_REQUESTS.inc({"result": "memory_hit"})
+                    return response
+                del self._memory[key]
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                response, created_at = row
+                if now - created_at <= self.ttl_seconds:
+                    self._conn.execute(
+                        "UPDATE responses SET last_used_at = ? WHERE key = ?",
+                        (now, key),
+                    )
+                    self._conn.commit()
+                    self._remember(key, created_at, response)
+                    self.stats.disk_hits += 1
+                    LLM_CACHE_REQUESTS.inc({"result": "disk_hit"})
+                    return response
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+            self.stats.misses += 1
+            LLM_CACHE_REQUESTS.inc({"result": "miss"})
+            return None
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, response)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode()), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self._evict_disk()
+            self._conn.commit()
+
+    def _evict_disk(self) -> None:
+        (total_size,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total_size <= self.disk_max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_used_at ASC"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if total_size <= self.disk_max_bytes:
+                break
+            evicted.append((key,))
+            total_size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
@@ -0,0 +1,218 @@
+import logging
+import math
+from typing import TYPE_CHECKING, Annotated, Callable, Literal
+
+from pydantic import BaseModel
+from workflows.resource import ResourceConfig
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+REPEATED_VALUE_MARKER = "^"
+
+
+def _to_markdown(df: "pd.DataFrame") -> str:
+    # Only None when written to a buffer.
+    return df.to_markdown(index=False) or ""
+
+
+def _to_csv(df: "pd.DataFrame") -> str:
+    return df.to_csv(index=False, lineterminator="\n")
+
+
+def _to_tsv(df: "pd.DataFrame") -> str:
+    return df.to_csv(index=False, sep="\t", lineterminator="\n")
+
+
+SERIALIZERS: dict[str, Callable[["pd.DataFrame"], str]] = {
+    "markdown": _to_markdown,
+    "csv": _to_csv,
+    "tsv": _to_tsv,
+}
+
+
+class TableSerializerConfig(BaseModel):
+    format: Literal["markdown", "csv", "tsv"] = "csv"
+    float_precision: int | None = 2
+    drop_empty_columns: bool = True
+    drop_constant_columns: bool = True
+    collapse_repeated_values: bool = True
+    token_budget: int | None = 100_000
+    chars_per_token: float = 4
+
+
+class SerializedTable(BaseModel):
+    text: str
+    estimated_tokens: int
+    total_rows: int
+    included_rows: int
+
+
+class TableSerializer:
+    """Serialize dataframes into compact text for the LLM prompt.
+
+    Besides the output format, the serializer rounds floats, drops empty
+    columns, hoists constant columns into a single header line and replaces
+    values repeated from the row above with a marker. Token counts are
+    estimated from the character count; when the tables exceed the token
+    budget, each table is truncated proportionally to its size.
+    """
+
+    def __init__(
+        self,
+        format: Literal["markdown", "csv", "tsv"] = "csv",
+        float_precision: int | None = 2,
+        drop_empty_columns: bool = True,
+        drop_constant_columns: bool = True,
+        collapse_repeated_values: bool = True,
+        token_budget: int | None = None,
+        chars_per_token: float = 4,
+    ) -> None:
+        self.format = format
+        self.float_precision = float_precision
+        self.drop_empty_columns = drop_empty_columns
+        self.drop_constant_columns = drop_constant_columns
+        self.collapse_repeated_values = collapse_repeated_values
+        self.token_budget = token_budget
+        self.chars_per_token = chars_per_token
+
+    def estimate_tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token) + 1
+
+    def _compact(
+        self, df: "pd.DataFrame", collapse_repeated_values: bool = True
+    ) -> "tuple[pd.DataFrame, list[str]]":
+        notes: list[str] = []
+        if self.drop_empty_columns:
+            df = df.dropna(axis="columns", how="all")
+        if self.drop_constant_columns and len(df) > 1:
+            constant_columns = [
+                column for column in df.columns if df[column].nunique(dropna=False) == 1
+            ]
+            if constant_columns and len(constant_columns) < len(df.columns):
+                notes.append(
+                    "Same value in every row: "
+                    + ", ".join(
+                        f"{column}={df[column].iloc[0]}" for column in constant_columns
+                    )
+                )
+                df = df.drop(columns=constant_columns)
+        if self.float_precision is not None:
+            float_columns = df.select_dtypes(include="float").columns
+            if len(float_columns) > 0:
+                df = df.round(
+                    {column: self.float_precision for column in float_columns}
+                )
+        if collapse_repeated_values:
+            df, collapse_notes = self._collapse(df)
+            notes.extend(collapse_notes)
+        return df, notes
+
+    def _collapse(self, df: "pd.DataFrame") -> "tuple[pd.DataFrame, list[str]]":
+        notes: list[str] = []
+        if self.collapse_repeated_values and len(df) > 1:
+            text_columns = df.select_dtypes(
+                include=["object", "string", "category"]
+            ).columns
+            if len(text_columns) > 0:
+                df = df.copy()
+                for column in text_columns:
+                    values = df[column].astype("object")
+                    repeated = values.eq(values.shift()) & values.notna()
+                    if repeated.any():
+                        df[column] = values.mask(repeated, REPEATED_VALUE_MARKER)
+                        notes.append(
+                            f"'{REPEATED_VALUE_MARKER}' in {column} means same value as the row above"
+                        )
+        return df, notes
+
+    def _render(self, df: "pd.DataFrame", notes: list[str], total_rows: int) -> str:
+        lines = [f"# {note}" for note in notes]
+        if len(df) < total_rows:
+            lines.append(f"# Showing the first {len(df)} of {total_rows} rows")
+        lines.append(SERIALIZERS[self.format](df))
+        return "\n".join(lines)
+
+    def serialize(
+        self,
+        df: "pd.DataFrame",
+        max_rows: int | None = None,
+        notes: list[str] | None = None,
+    ) -> SerializedTable:
+        compact, compact_notes = self._compact(df)
+        notes = (notes or []) + compact_notes
+        total_rows = len(compact)
+        if max_rows is not None:
+            compact = compact.head(max_rows)
+        text = self._render(compact, notes, total_rows)
+        return SerializedTable(
+            text=text,
+            estimated_tokens=self.estimate_tokens(text),
+            total_rows=total_rows,
+            included_rows=len(compact),
+        )
+
+    def serialize_chunks(
+        self,
+        df: "pd.DataFrame",
+        max_tokens: int,
+        max_rows: int | None = None,
+        notes: list[str] | None = None,
+    ) -> list[str]:
+        """Serialize a table as consecutive row chunks of about `max_tokens` each.
+
+        Every chunk carries the header and notes, so that it can be read on its
+        own, and repeated values are only collapsed within a chunk.
+        """
+        table = self.serialize(df, max_rows=max_rows, notes=notes)
+        if table.estimated_tokens <= max_tokens or table.included_rows <= 1:
+            return [table.text]
+        compact, compact_notes = self._compact(df, collapse_repeated_values=False)
+        notes = (notes or []) + compact_notes
+        compact = compact.head(table.included_rows)
+        rows_per_chunk = math.ceil(
+            len(compact) / math.ceil(table.estimated_tokens / max_tokens)
+        )
+        chunks = []
+        for start in range(0, len(compact), rows_per_chunk):
+            chunk, collapse_notes = self._collapse(
+                compact.iloc[start : start + rows_per_chunk]
+            )
+            end = start + len(chunk)
+            chunk_notes = notes + collapse_notes
+            chunk_notes.append(f"Rows {start + 1} to {end} of {table.total_rows}")
+            chunks.append(self._render(chunk, chunk_notes, len(chunk)))
+        return chunks
+
+    def serialize_all(
+        self, dfs: "list[pd.DataFrame]", notes: list[list[str]] | None = None
+    ) -> list[SerializedTable]:
+        """Serialize tables within the token budget, with optional notes for each."""
+        notes_by_table = notes or [[] for _ in dfs]
+        tables = [
+            self.serialize(df, notes=table_notes)
+            for df, table_notes in zip(dfs, notes_by_table)
+        ]
+        total_tokens = sum(table.estimated_tokens for table in tables)
+        if self.token_budget is None or total_tokens <= self.token_budget:
+            return tables
+        logging.warning(
+            f"Tables are estimated at {total_tokens} tokens, above the budget of "
+            f"{self.token_budget}: truncating rows"
+        )
+        ratio = self.token_budget / total_tokens
+        return [
+            self.serialize(
+                df, max_rows=max(1, int(table.total_rows * ratio)), notes=table_notes
+            )
+            for df, table, table_notes in zip(dfs, tables, notes_by_table)
+        ]
+
+
+def get_table_serializer(
+    config: Annotated[
+        TableSerializerConfig,
+        ResourceConfig("config.json", path_selector="table_serializer"),
+    ],
+) -> TableSerializer:
+    return TableSerializer(**config.model_dump())
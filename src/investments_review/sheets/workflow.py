@@ -1,29 +1,70 @@
-import base64
+import asyncio
 import logging
-from datetime import datetime
-from typing import Annotated
+from typing import Annotated, Any
 
 import httpx
-import pandas as pd
 from jinja2 import Template
 from llama_cloud import AsyncLlamaCloud
+from pydantic import Field
 from workflows import Context, Workflow, step
-from workflows.events import Event, StopEvent
+from workflows.events import Event, StartEvent, StopEvent
+from workflows.handler import WorkflowHandler
 from workflows.resource import Resource
 
-from ..exceptions import SheetParsingError
-from ..shared import FileEvent, FileUploadedEvent, get_llama_cloud_client
+from ..clients import get_download_client, get_llama_cloud_client
+from ..exceptions import SheetParsingError, UnsupportedSheetError
+from ..metrics import timed_step
+from ..retry import retry_policy
+from ..shared import FileEvent, FileUploadedEvent, upload_file
+from ..upload_cache import UploadCache, get_upload_cache
+from .analytics import PortfolioAnalytics, get_portfolio_analytics
+from .download import RegionDownloader, get_region_downloader
 from .llm import OpenAILLM, get_llm
-from .models import InvestmentSheetAnalysis
+from .loader import TableLoader, get_table_loader
+from .local_parser import LocalSheetParser, get_local_sheet_parser
+from .map_reduce import MapReduceAnalyzer, get_map_reduce_analyzer
+from .models import ChatMessage, InvestmentSheetAnalysis, PartialSheetAnalysis
 from .prompt import get_prompt
+from .regions import RegionStore, get_region_store, release_run_regions
+from .serializers import TableSerializer, get_table_serializer
+
+
+class RemoteParseEvent(Event):
+    """Workbook that could not be parsed locally, to be parsed by LlamaSheets."""
+
+    file_event: FileEvent
 
 
 class SheetParsedEvent(Event):
-    parquet_files: list[str]
+    region_handles: list[str]
+    failed_regions: dict[str, str] = Field(default_factory=dict)
 
 
 class TableTransformationEvent(Event):
-    markdown_tables: list[str]
+    tables: list[str]
+    estimated_tokens: list[int]
+    region_handles: list[str]
+    # Row chunks of the tables too large for one map-reduce part, empty otherwise.
+    table_chunks: list[list[str]] = Field(default_factory=list)
+
+
+class PortfolioAnalyzedEvent(Event):
+    metrics: list[str]
+    tables: list[str]
+    table_chunks: list[list[str]] = Field(default_factory=list)
+
+
+class PartialAnalysisEvent(Event):
+    part: int
+    parts: int
+    analysis: PartialSheetAnalysis | None
+
+
+class AnalysisUpdateEvent(Event):
+    """Fields of the analysis generated so far; `done` once it is validated."""
+
+    analysis: dict[str, Any]
+    done: bool = False
 
 
 class OutputEvent(StopEvent):
@@ -32,46 +73,67 @@ class OutputEvent(StopEvent):
 
 
 class SheetWorkflow(Workflow):
+    def run(
+        self,
+        ctx: Context | None = None,
+        start_event: StartEvent | None = None,
+        **kwargs: Any,
+    ) -> WorkflowHandler:
+        handler = super().run(ctx=ctx, start_event=start_event, **kwargs)
+        # Regions are released by the steps done with them; the ones still held
+        # when the run fails, times out or is cancelled are released here.
+        run_ctx = handler.ctx
+        if run_ctx is not None:
+            handler.add_done_callback(lambda _: release_run_regions(run_ctx))
+        return handler
+
     @step
-    async def upload_file_to_llamacloud(
+    @timed_step
+    async def parse_sheet_locally(
         self,
         ev: FileEvent,
         ctx: Context,
+        local_parser: Annotated[LocalSheetParser, Resource(get_local_sheet_parser)],
+        region_store: Annotated[RegionStore, Resource(get_region_store)],
+    ) -> SheetParsedEvent | RemoteParseEvent:
+        try:
+            regions = await asyncio.to_thread(local_parser.parse_event, ev)
+        except UnsupportedSheetError as e:
+            logging.info(f"Sending the excel sheet to LlamaSheets: {e}")
+            return RemoteParseEvent(file_event=ev)
+        region_handles = [
+            await region_store.put(f"local-{i}", content, owner=ctx)
+            for i, content in enumerate(regions)
+        ]
+        logging.info(f"Parsed {len(region_handles)} tables locally")
+        event = SheetParsedEvent(region_handles=region_handles)
+        ctx.write_event_to_stream(event)
+        return event
+
+    @step
+    @timed_step
+    async def upload_file_to_llamacloud(
+        self,
+        ev: RemoteParseEvent,
+        ctx: Context,
         llama_cloud_client: Annotated[
             AsyncLlamaCloud, Resource(get_llama_cloud_client)
         ],
+        upload_cache: Annotated[UploadCache | None, Resource(get_upload_cache)],
     ) -> FileUploadedEvent:
         logging.info("Starting to upload excel sheet to LlamaCloud")
-        if not ev.is_source_content:
-            file_obj = await llama_cloud_client.files.create(
-                file=ev.file_input,
-                purpose="parse",
-                external_file_id=ev.file_input,
-            )
-        else:
-            decoded = base64.b64decode(ev.file_input)
-            file_name = (
-                ev.file_name
-                or datetime.now().isoformat().replace(":", "-").replace(".", "-")
-                + ev.file_extension
-            )
-            mimetype = (
-                "application/pdf"
-                if ev.file_extension == ".pdf"
-                else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-            file_input = (file_name, decoded, mimetype)
-            file_obj = await llama_cloud_client.files.create(
-                file=file_input,
-                purpose="parse",
-                external_file_id=file_name,
-            )
-        event = FileUploadedEvent(file_id=file_obj.id)
+        file_id = await upload_file(
+            ev=ev.file_event,
+            llama_cloud_client=llama_cloud_client,
+            upload_cache=upload_cache,
+        )
+        event = FileUploadedEvent(file_id=file_id)
         ctx.write_event_to_stream(event)
         logging.info("Finished uploading excel sheet to LlamaCloud")
         return event
 
     @step
+    @timed_step
     async def parse_sheet_file(
         self,
         ev: FileUploadedEvent,
@@ -79,88 +141,234 @@ class SheetWorkflow(Workflow):
         llama_cloud_client: Annotated[
             AsyncLlamaCloud, Resource(get_llama_cloud_client)
         ],
+        download_client: Annotated[httpx.AsyncClient, Resource(get_download_client)],
+        region_downloader: Annotated[RegionDownloader, Resource(get_region_downloader)],
+        region_store: Annotated[RegionStore, Resource(get_region_store)],
     ) -> SheetParsedEvent | OutputEvent:
         logging.info("Starting to parse excel sheet...")
-        result = await llama_cloud_client.beta.sheets.parse(
-            file_id=ev.file_id,
+        result = await retry_policy("llama_cloud").call(
+            llama_cloud_client.beta.sheets.parse, file_id=ev.file_id
         )
         logging.info("Finished parsing excel sheet")
-        file_paths = []
-        if result.success:
-            logging.info("Starting to download Parquet files...")
-            if result.regions is None:
-                raise SheetParsingError(
-                    "Regions should have been extracted if the job was successful"
-                )
-            for region in result.regions:
-                if region.region_id is None:
-                    raise SheetParsingError("Region should have an ID")
-                parquet_region_resp = (
-                    await llama_cloud_client.beta.sheets.get_result_table(
-                        region_type=region.region_type,  # type: ignore
-                        spreadsheet_job_id=result.id,
-                        region_id=region.region_id,
-                    )
-                )
-
-                url = parquet_region_resp.url
-                async with httpx.AsyncClient() as httpx_client:
-                    resp = await httpx_client.get(url)
-                    file_path = f"./downloaded_region_{region.region_id}.parquet"
-                    with open(
-                        f"./downloaded_region_{region.region_id}.parquet", "wb"
-                    ) as f:
-                        f.write(resp.content)
-                    file_paths.append(file_path)
-            logging.info("Finished downloading Parquet files")
-        else:
+        if not result.success:
             return OutputEvent(error="Could not parse sheet file")
+        if result.regions is None:
+            raise SheetParsingError(
+                "Regions should have been extracted if the job was successful"
+            )
+        logging.info("Starting to download Parquet files...")
+        download = await region_downloader.download_all(
+            llama_cloud_client=llama_cloud_client,
+            httpx_client=download_client,
+            region_store=region_store,
+            spreadsheet_job_id=result.id,
+            regions=result.regions,
+            owner=ctx,
+        )
+        logging.info("Finished downloading Parquet files")
 
-        if len(file_paths) > 0:
-            event = SheetParsedEvent(parquet_files=file_paths)
+        if len(download.region_handles) > 0:
+            event = SheetParsedEvent(
+                region_handles=download.region_handles,
+                failed_regions=download.failed_regions,
+            )
             ctx.write_event_to_stream(event)
             return event
         return OutputEvent(error="Could not retrieve any parquet file")
 
     @step
+    @timed_step
     async def parquet_to_markdown_table(
         self,
         ev: SheetParsedEvent,
         ctx: Context,
+        region_store: Annotated[RegionStore, Resource(get_region_store)],
+        table_loader: Annotated[TableLoader, Resource(get_table_loader)],
+        table_serializer: Annotated[TableSerializer, Resource(get_table_serializer)],
+        map_reduce: Annotated[MapReduceAnalyzer, Resource(get_map_reduce_analyzer)],
     ) -> TableTransformationEvent | OutputEvent:
-        tables = []
-        logging.info("Starting to convert Parquet files to markdown tables...")
-        for file in ev.parquet_files:
+        parquet_files = {}
+        logging.info("Starting to convert Parquet regions to text tables...")
+        for handle in ev.region_handles:
             try:
-                df = pd.read_parquet(file)
-                markdown_table = df.to_markdown()
-                tables.append(markdown_table)
+                parquet_files[handle] = region_store.open(handle)
             except Exception as e:
-                logging.error(f"Could not load {file} because of {e}. Skipping...")
-        logging.info("Finished converting Parquet files to markdown tables")
+                logging.error(f"Could not open {handle} because of {e}. Skipping...")
+                region_store.release(handle)
+        loaded_tables = []
+        loaded_handles = []
+        max_bytes = table_loader.allocate(list(parquet_files.values()))
+        for (handle, parquet_file), table_max_bytes in zip(
+            parquet_files.items(), max_bytes
+        ):
+            try:
+                loaded_tables.append(table_loader.load(parquet_file, table_max_bytes))
+                loaded_handles.append(handle)
+            except Exception as e:
+                logging.error(f"Could not load {handle} because of {e}. Skipping...")
+                region_store.release(handle)
+        tables = table_serializer.serialize_all(
+            [loaded.df for loaded in loaded_tables],
+            notes=[loaded.notes() for loaded in loaded_tables],
+        )
+        table_chunks = [
+            table_serializer.serialize_chunks(
+                loaded.df,
+                map_reduce.chunk_tokens,
+                max_rows=table.included_rows,
+                notes=loaded.notes(),
+            )
+            if map_reduce.enabled and table.estimated_tokens > map_reduce.chunk_tokens
+            else []
+            for loaded, table in zip(loaded_tables, tables)
+        ]
+        logging.info(
+            "Finished converting Parquet regions to text tables (estimated tokens: "
+            f"{[table.estimated_tokens for table in tables]})"
+        )
         if len(tables) > 0:
-            event = TableTransformationEvent(markdown_tables=tables)
+            event = TableTransformationEvent(
+                tables=[table.text for table in tables],
+                estimated_tokens=[table.estimated_tokens for table in tables],
+                region_handles=loaded_handles,
+                table_chunks=table_chunks,
+            )
             ctx.write_event_to_stream(event)
             return event
 
-        return OutputEvent(error="Could not transform any of the parquet files")
+        return OutputEvent(error="Could not transform any of the parquet regions")
 
     @step
-    async def llm_generate(
+    @timed_step
+    async def analyze_portfolio(
         self,
         ev: TableTransformationEvent,
         ctx: Context,
+        region_store: Annotated[RegionStore, Resource(get_region_store)],
+        table_loader: Annotated[TableLoader, Resource(get_table_loader)],
+        analytics: Annotated[PortfolioAnalytics, Resource(get_portfolio_analytics)],
+    ) -> PortfolioAnalyzedEvent:
+        if not analytics.enabled:
+            for handle in ev.region_handles:
+                region_store.release(handle)
+            return PortfolioAnalyzedEvent(
+                metrics=[], tables=ev.tables, table_chunks=ev.table_chunks
+            )
+        logging.info("Starting to compute portfolio metrics...")
+        include_all_tables = (
+            sum(ev.estimated_tokens) < analytics.include_tables_below_tokens
+        )
+        parquet_files = {}
+        columns = {}
+        for handle in ev.region_handles:
+            try:
+                parquet_file = region_store.open(handle)
+                # Only the columns used by the metrics are loaded, detected from
+                # the schema of the region.
+                columns[handle] = analytics.required_columns(
+                    parquet_file.schema_arrow.empty_table().to_pandas()
+                )
+                parquet_files[handle] = parquet_file
+            except Exception as e:
+                logging.error(f"Could not open {handle} because of {e}")
+        # The regions of the run share the memory limit, as when they were
+        # converted to text tables.
+        max_bytes = dict(
+            zip(
+                parquet_files,
+                table_loader.allocate(
+                    list(parquet_files.values()),
+                    [columns[handle] for handle in parquet_files],
+                ),
+            )
+        )
+        metrics = []
+        tables = []
+        table_chunks = []
+        chunks_by_table = ev.table_chunks or [[] for _ in ev.tables]
+        for i, (handle, table, chunks) in enumerate(
+            zip(ev.region_handles, ev.tables, chunks_by_table)
+        ):
+            try:
+                if handle not in parquet_files:
+                    raise ValueError("the region could not be opened")
+                loaded = table_loader.load(
+                    parquet_files[handle], max_bytes[handle], columns[handle]
+                )
+                table_metrics = analytics.analyze(
+                    loaded.df,
+                    total_rows=loaded.total_rows,
+                    column_totals=loaded.column_totals(),
+                )
+            except Exception as e:
+                logging.error(
+                    f"Could not compute metrics for {handle} because of {e}. "
+                    "Falling back to the raw table..."
+                )
+                tables.append(table)
+                table_chunks.append(chunks)
+                continue
+            finally:
+                region_store.release(handle)
+            if table_metrics.has_metrics:
+                metrics.append(f"Table {i + 1}:\n{table_metrics.to_string()}")
+            if include_all_tables or not table_metrics.has_metrics:
+                tables.append(table)
+                table_chunks.append(chunks)
+        logging.info("Finished computing portfolio metrics")
+        event = PortfolioAnalyzedEvent(
+            metrics=metrics, tables=tables, table_chunks=table_chunks
+        )
+        ctx.write_event_to_stream(event)
+        return event
+
+    @step
+    @timed_step
+    async def llm_generate(
+        self,
+        ev: PortfolioAnalyzedEvent,
+        ctx: Context,
         llm: Annotated[OpenAILLM, Resource(get_llm)],
         prompt: Annotated[Template, Resource(get_prompt)],
+        map_reduce: Annotated[MapReduceAnalyzer, Resource(get_map_reduce_analyzer)],
     ) -> OutputEvent:
-        tables = "\n\n".join(ev.markdown_tables)
-        user_prompt = prompt.render(tables=tables)
+        user_prompt = prompt.render(
+            metrics="\n\n".join(ev.metrics), tables="\n\n".join(ev.tables)
+        )
         logging.info("Generating LLM response...")
-        llm.add_user_message(user_prompt)
-        response = await llm.generate_content(schema=InvestmentSheetAnalysis)
+
+        def on_partial(analysis: dict[str, Any]) -> None:
+            ctx.write_event_to_stream(AnalysisUpdateEvent(analysis=analysis))
+
+        if ev.tables and map_reduce.should_use(user_prompt):
+            chunks_by_table = ev.table_chunks or [[] for _ in ev.tables]
+            response = await map_reduce.analyze(
+                llm=llm,
+                metrics=ev.metrics,
+                tables=[
+                    chunk
+                    for table, chunks in zip(ev.tables, chunks_by_table)
+                    for chunk in (chunks or [table])
+                ],
+                on_part_done=lambda part, parts, analysis: ctx.write_event_to_stream(
+                    PartialAnalysisEvent(part=part, parts=parts, analysis=analysis)
+                ),
+                on_partial=on_partial,
+            )
+        else:
+            chat_history = llm.new_chat_history()
+            chat_history.append(ChatMessage(role="user", content=user_prompt))
+            response = await llm.generate_content(
+                schema=InvestmentSheetAnalysis,
+                chat_history=chat_history,
+                on_partial=on_partial,
+            )
         logging.info("Finished generating LLM response")
         if response is None:
             return OutputEvent(error="Could not generate investment analysis")
+        ctx.write_event_to_stream(
+            AnalysisUpdateEvent(analysis=response.model_dump(), done=True)
+        )
         return OutputEvent(final_result=response.to_string())
 
 
@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Annotated
+
+from pydantic import BaseModel
+from workflows.resource import ResourceConfig
+
+DEFAULT_UPLOAD_CACHE_PATH = ".cache/uploads.sqlite"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadCacheConfig(BaseModel):
+    enabled: bool = True
+    path: str = DEFAULT_UPLOAD_CACHE_PATH
+    ttl_seconds: float = 7 * 24 * 60 * 60
+    max_entries: int = 10_000
+
+
+class UploadCache:
+    """Persistent map from the SHA-256 of a file's bytes to its LlamaCloud file ID.
+
+    Entries expire after `ttl_seconds`; once more than `max_entries` are stored,
+    the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            "digest TEXT PRIMARY KEY, "
+            "file_id TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_used_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, digest: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_id, created_at FROM uploads WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                return None
+            file_id, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM uploads WHERE digest = ?", (digest,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE uploads SET last_used_at = ? WHERE digest = ?", (now, digest)
+            )
+            self._conn.commit()
+            return file_id
+
+    def put(self, digest: str, file_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?)",
+                (digest, file_id, now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM uploads WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self._conn.execute(
+                "DELETE FROM uploads WHERE digest IN ("
+                "SELECT digest FROM uploads ORDER BY last_used_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def invalidate(self, digest: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM uploads WHERE digest = ?", (digest,))
+            self._conn.commit()
+
+
+def hash_bytes(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_upload_cache(
+    config: Annotated[
+        UploadCacheConfig, ResourceConfig("config.json", path_selector="upload_cache")
+    ],
+) -> UploadCache | None:
+    if not config.enabled:
+        logging.info("Upload cache is disabled")
+        return None
+    return UploadCache(
+        path=config.path,
+        ttl_seconds=config.ttl_seconds,
+        max_entries=config.max_entries,
+    )
@@ -0,0 +1,204 @@
+import json
+import os
+from mimetypes import guess_extension
+from typing import TYPE_CHECKING
+
+import aiofiles
+from pydantic import BaseModel
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+from starlette.types import Message, Receive
+
+from .exceptions import InvalidUploadError, UploadTooLargeError
+
+if TYPE_CHECKING:
+    from python_multipart.multipart import MultipartCallbacks
+
+# Largest text field accepted alongside the uploaded file.
+MAX_FIELD_BYTES = 1024 * 1024
+
+
+class UploadsConfig(BaseModel):
+    max_upload_bytes: int = 256 * 1024 * 1024
+    chunk_size: int = 1024 * 1024
+
+
+def load_uploads_config(config_file: str = "config.json") -> UploadsConfig:
+    with open(config_file) as f:
+        return UploadsConfig.model_validate(json.load(f).get("uploads", {}))
+
+
+_uploads_config: UploadsConfig | None = None
+
+
+def uploads_config() -> UploadsConfig:
+    """Return the uploads configuration, read from config.json on first use."""
+    global _uploads_config
+    if _uploads_config is None:
+        _uploads_config = load_uploads_config()
+    return _uploads_config
+
+
+def limit_request_size(request: Request, max_bytes: int) -> Request:
+    """Return a request whose body stream fails once more than `max_bytes` arrive.
+
+    The limit is enforced while the body is received, so oversized uploads are
+    rejected without being read in full, including chunked requests that do not
+    announce their size.
+    """
+    content_length = request.headers.get("Content-Length")
+    if content_length is not None and content_length.isdigit():
+        if int(content_length) > max_bytes:
+            raise UploadTooLargeError(
+                f"Upload of {content_length} bytes exceeds the maximum of {max_bytes} bytes"
+            )
+    received = 0
+    receive = request.receive
+
+    async def limited_receive() -> Message:
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise UploadTooLargeError(
+                    f"Upload exceeds the maximum of {max_bytes} bytes"
+                )
+        return message
+
+    limited: Receive = limited_receive
+    return Request(request.scope, receive=limited)
+
+
+class _MultipartForm:
+    """Callbacks of the multipart parser for a form holding a single file.
+
+    Text fields are kept in memory, while the data of the file is queued for
+    `receive_upload` to write it out.
+    """
+
+    def __init__(self, field_name: str) -> None:
+        self.field_name = field_name
+        self.fields: dict[str, str] = {}
+        self.file_content_type: str | None = None
+        self.has_file = False
+        self.pending: list[bytes] = []
+        self.pending_bytes = 0
+        self._headers: dict[bytes, bytes] = {}
+        self._header_name = b""
+        self._header_value = b""
+        self._name = ""
+        self._is_file = False
+        self._data = bytearray()
+
+    def callbacks(self) -> "MultipartCallbacks":
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def take(self) -> bytes:
+        """Return the queued data of the file and empty the queue."""
+        data = b"".join(self.pending)
+        self.pending.clear()
+        self.pending_bytes = 0
+        return data
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._data = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition"))
+        if b"name" not in options:
+            raise InvalidUploadError("a form field has no name")
+        self._name = options[b"name"].decode("utf-8", "replace")
+        self._is_file = b"filename" in options
+        if not self._is_file:
+            return
+        if self.has_file or self._name != self.field_name:
+            raise InvalidUploadError(
+                f"only one file is accepted, in the {self.field_name} field"
+            )
+        self.has_file = True
+        content_type = self._headers.get(b"content-type")
+        if content_type:
+            self.file_content_type = content_type.decode("latin-1")
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._is_file:
+            self.pending.append(data[start:end])
+            self.pending_bytes += end - start
+            return
+        if len(self._data) + end - start > MAX_FIELD_BYTES:
+            raise InvalidUploadError(
+                f"the {self._name} field is larger than {MAX_FIELD_BYTES} bytes"
+            )
+        self._data += data[start:end]
+
+    def on_part_end(self) -> None:
+        if not self._is_file:
+            self.fields[self._name] = self._data.decode("utf-8", "replace")
+
+
+async def receive_upload(
+    request: Request,
+    field_name: str,
+    default_content_type: str,
+    default_extension: str,
+    chunk_size: int = 1024 * 1024,
+) -> tuple[str, dict[str, str]]:
+    """Stream the file of a multipart form straight to a temporary file.
+
+    The file is written as the request body arrives, in blocks of about
+    `chunk_size` bytes, instead of being spooled by the form parser and copied.
+    Returns the path of the temporary file and the text fields of the form.
+    """
+    content_type, options = parse_options_header(request.headers.get("Content-Type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise InvalidUploadError("the request is not a multipart form")
+    form = _MultipartForm(field_name)
+    parser = MultipartParser(options[b"boundary"], form.callbacks())
+    tempfile = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if form.has_file and tempfile is None:
+                extension = (
+                    guess_extension(form.file_content_type or default_content_type)
+                    or default_extension
+                )
+                tempfile = await aiofiles.tempfile.NamedTemporaryFile(
+                    suffix=extension, delete=False
+                )
+            if tempfile is not None and form.pending_bytes >= chunk_size:
+                await tempfile.write(form.take())
+        parser.finalize()
+        if tempfile is None:
+            raise InvalidUploadError(f"the form has no file in its {field_name} field")
+        await tempfile.write(form.take())
+        await tempfile.close()
+    except BaseException as e:
+        if tempfile is not None:
+            await tempfile.close()
+            os.remove(str(tempfile.name))
+        if isinstance(e, FormParserError):
+            raise InvalidUploadError("the multipart form is malformed") from e
+        raise
+    return str(tempfile.name), form.fields
@@ -0,0 +1,125 @@
+from types import SimpleNamespace
+from typing import Any, cast
+
+from llama_cloud import AsyncLlamaCloud
+
+from investments_review.presentations.extraction import (
+    TieredExtractor,
+    _subset_schema,
+    quality_issues,
+)
+from investments_review.presentations.models import BoardUpdateDeck
+
+BOARD_UPDATE = {
+    "company_name": "Acme",
+    "reporting_period_start": "2025-01",
+    "reporting_period_end": "March 2025",
+    "risks_and_issues": ["Churn"],
+    "financial_summary": {"revenue": 100.0, "expenses": 80.0, "net_profit": 20.0},
+}
+
+
+class FakeExtraction:
+    def __init__(self, results: dict[str, dict[str, Any] | None]) -> None:
+        self.results = results
+        self.calls: list[tuple[str, dict[str, Any]]] = []
+
+    async def extract(
+        self, data_schema: dict[str, Any], config: dict[str, Any], file_id: str
+    ) -> SimpleNamespace:
+        mode = config["extraction_mode"]
+        self.calls.append((mode, data_schema))
+        return SimpleNamespace(data=self.results[mode])
+
+
+def test_quality_issues_passes_complete_data() -> None:
+    assert quality_issues(BoardUpdateDeck, BOARD_UPDATE) == []
+
+
+def test_quality_issues_reports_empty_zero_and_invalid_fields() -> None:
+    data = {
+        **BOARD_UPDATE,
+        "company_name": " N/A ",
+        "reporting_period_start": "last quarter",
+        "risks_and_issues": ["", " "],
+        "financial_summary": {"revenue": 0, "expenses": 80.0},
+    }
+    assert quality_issues(BoardUpdateDeck, data) == [
+        "company_name",
+        "reporting_period_start",
+        "risks_and_issues",
+        "financial_summary.revenue",
+        "financial_summary.net_profit",
+    ]
+
+
+def test_quality_issues_reports_validation_errors() -> None:
+    data = {**BOARD_UPDATE, "financial_summary": "100"}
+    assert quality_issues(BoardUpdateDeck, data) == ["financial_summary"]
+    data = {**BOARD_UPDATE, "reporting_period_end": 2025}
+    assert quality_issues(BoardUpdateDeck, data) == ["reporting_period_end"]
+
+
+def test_subset_schema_keeps_the_requested_fields() -> None:
+    schema = _subset_schema(BoardUpdateDeck, ["company_name", "financial_summary"])
+    assert list(schema["properties"]) == ["company_name", "financial_summary"]
+    assert schema["required"] == ["company_name", "financial_summary"]
+    assert "FinancialSummary" in schema["$defs"]
+
+
+async def test_tiered_extractor_stops_at_the_first_mode_passing() -> None:
+    extraction = FakeExtraction({"FAST": BOARD_UPDATE})
+    client = cast(AsyncLlamaCloud, SimpleNamespace(extraction=extraction))
+    result = await TieredExtractor(["FAST", "BALANCED"]).extract(
+        client, BoardUpdateDeck, "file"
+    )
+    assert result == BoardUpdateDeck.model_validate(BOARD_UPDATE)
+    assert [mode for mode, _ in extraction.calls] == ["FAST"]
+
+
+async def test_tiered_extractor_escalates_and_merges_the_failing_fields() -> None:
+    extraction = FakeExtraction(
+        {
+            "FAST": {
+                **BOARD_UPDATE,
+                "company_name": "unknown",
+                "financial_summary": {"revenue": 0, "expenses": 80.0},
+            },
+            "BALANCED": {
+                "company_name": "Acme",
+                "financial_summary": BOARD_UPDATE["financial_summary"],
+                "risks_and_issues": None,
+            },
+        }
+    )
+    client = cast(AsyncLlamaCloud, SimpleNamespace(extraction=extraction))
+    result = await TieredExtractor(["FAST", "BALANCED"]).extract(
+        client, BoardUpdateDeck, "file"
+    )
+    assert result == BoardUpdateDeck.model_validate(BOARD_UPDATE)
+    (_, fast_schema), (_, balanced_schema) = extraction.calls
+    assert list(fast_schema["properties"]) == list(BoardUpdateDeck.model_fields)
+    assert list(balanced_schema["properties"]) == ["company_name", "financial_summary"]
+
+
+async def test_tiered_extractor_keeps_the_last_result_when_every_mode_fails() -> None:
+    data = {**BOARD_UPDATE, "risks_and_issues": []}
+    extraction = FakeExtraction({"FAST": data, "BALANCED": None})
+    client = cast(AsyncLlamaCloud, SimpleNamespace(extraction=extraction))
+    result = await TieredExtractor(["FAST", "BALANCED"]).extract(
+        client, BoardUpdateDeck, "file"
+    )
+    assert result is not None
+    assert result.risks_and_issues == []
+    assert [mode for mode, _ in extraction.calls] == ["FAST", "BALANCED"]
+
+
+async def test_tiered_extractor_returns_none_without_data() -> None:
+    extraction = FakeExtraction({"FAST": None, "BALANCED": None})
+    client = cast(AsyncLlamaCloud, SimpleNamespace(extraction=extraction))
+    result = await TieredExtractor(["FAST", "BALANCED"]).extract(
+        client, BoardUpdateDeck, "file"
+    )
+    assert result is None
+    # Nothing was extracted: the second mode gets the whole schema.
+    assert "financial_summary" in extraction.calls[1][1]["properties"]
@@ -0,0 +1,127 @@
+from types import SimpleNamespace
+from typing import Any, cast
+
+import pytest
+from openai import AsyncOpenAI
+from openai.lib.streaming.responses import ResponseTextDeltaEvent
+from pydantic import BaseModel
+
+from investments_review.exceptions import StreamInterruptedError
+from investments_review.retry import retry_policy
+from investments_review.sheets.llm import OpenAILLM, parse_partial_json
+from investments_review.sheets.models import ChatMessage
+
+
+class Analysis(BaseModel):
+    summary: str
+    suggestions: list[str]
+
+
+ANALYSIS = Analysis(summary="Growing", suggestions=["Hold", "Sell"])
+
+
+class FakeStream:
+    def __init__(self, text: str, fail_after: int | None) -> None:
+        self.text = text
+        self.fail_after = fail_after
+
+    async def __aenter__(self) -> "FakeStream":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        return None
+
+    async def __aiter__(self):
+        for i in range(len(self.text)):
+            if i == self.fail_after:
+                raise TimeoutError("stream stalled")
+            yield ResponseTextDeltaEvent(
+                type="response.output_text.delta",
+                content_index=0,
+                item_id="test",
+                logprobs=[],
+                output_index=0,
+                sequence_number=i,
+                delta=self.text[i],
+                snapshot=self.text[: i + 1],
+            )
+
+    async def get_final_response(self) -> SimpleNamespace:
+        return SimpleNamespace(
+            output_parsed=ANALYSIS, output_text=self.text, usage=None
+        )
+
+
+class FakeResponses:
+    def __init__(self, fail_after: list[int | None]) -> None:
+        self.fail_after = fail_after
+        self.streams = 0
+
+    def stream(self, **kwargs: Any) -> FakeStream:
+        fail_after = self.fail_after[self.streams]
+        self.streams += 1
+        return FakeStream(ANALYSIS.model_dump_json(), fail_after)
+
+
+def fake_llm(fail_after: list[int | None]) -> tuple[OpenAILLM, FakeResponses]:
+    responses = FakeResponses(fail_after)
+    client = cast(AsyncOpenAI, SimpleNamespace(responses=responses))
+    return OpenAILLM(api_key="test", client=client), responses
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch: pytest.MonkeyPatch) -> None:
+    policy = retry_policy("openai")
+    monkeypatch.setattr(policy, "limiter", None)
+    monkeypatch.setattr(policy, "base_delay_seconds", 0)
+
+
+def test_parse_partial_json_leaves_out_unfinished_strings() -> None:
+    assert parse_partial_json('{"summary": "Grow') == {}
+    assert parse_partial_json('{"summary": "Growing", "suggestions": ["Hold", "Se') == {
+        "summary": "Growing",
+        "suggestions": ["Hold"],
+    }
+    assert parse_partial_json("not json") == {}
+
+
+async def test_stream_sends_the_fields_as_they_complete() -> None:
+    llm, _ = fake_llm([None])
+    updates: list[dict[str, Any]] = []
+    chat_history = llm.new_chat_history()
+    chat_history.append(ChatMessage(role="user", content="Analyze"))
+    result = await llm.generate_content(
+        Analysis, chat_history, on_partial=updates.append
+    )
+    assert result == ANALYSIS
+    assert updates == [
+        {"summary": "Growing"},
+        {"summary": "Growing", "suggestions": []},
+        {"summary": "Growing", "suggestions": ["Hold"]},
+        {"summary": "Growing", "suggestions": ["Hold", "Sell"]},
+    ]
+
+
+async def test_stream_is_retried_before_the_first_update() -> None:
+    llm, responses = fake_llm([5, None])
+    updates: list[dict[str, Any]] = []
+    chat_history = llm.new_chat_history()
+    chat_history.append(ChatMessage(role="user", content="Analyze"))
+    result = await llm.generate_content(
+        Analysis, chat_history, on_partial=updates.append
+    )
+    assert result == ANALYSIS
+    assert responses.streams == 2
+    assert updates[0] == {"summary": "Growing"}
+    assert len(updates) == 4
+
+
+async def test_stream_is_not_retried_after_an_update() -> None:
+    llm, responses = fake_llm([30, None])
+    updates: list[dict[str, Any]] = []
+    chat_history = llm.new_chat_history()
+    chat_history.append(ChatMessage(role="user", content="Analyze"))
+    with pytest.raises(StreamInterruptedError):
+        await llm.generate_content(Analysis, chat_history, on_partial=updates.append)
+    assert responses.streams == 1
+    assert updates == [{"summary": "Growing"}]
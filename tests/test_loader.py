@@ -0,0 +1,117 @@
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from investments_review.sheets.loader import TableLoader
+
+
+def write_parquet(path: Path, table: pa.Table, row_group_size: int = 1000) -> Path:
+    pq.write_table(table, path, row_group_size=row_group_size)
+    return path
+
+
+def numbers(path: Path, rows: int, row_group_size: int = 1000) -> pq.ParquetFile:
+    table = pa.table(
+        {
+            "i": pa.array(range(rows), pa.int64()),
+            "amount": pa.array([i * 1.5 for i in range(rows)], pa.float64()),
+        }
+    )
+    return pq.ParquetFile(write_parquet(path, table, row_group_size))
+
+
+def test_allocate_without_limit(tmp_path: Path) -> None:
+    parquet_file = numbers(tmp_path / "t.parquet", 10)
+    loader = TableLoader(memory_limit_bytes=None)
+    assert loader.allocate([parquet_file, parquet_file]) == [None, None]
+
+
+def test_allocate_gives_small_regions_their_size(tmp_path: Path) -> None:
+    small = numbers(tmp_path / "small.parquet", 10)
+    large = numbers(tmp_path / "large.parquet", 10_000)
+    larger = numbers(tmp_path / "larger.parquet", 20_000)
+    loader = TableLoader()
+    sizes = [loader.estimate_bytes(f) for f in (small, large, larger)]
+    limit = sizes[0] + sizes[1]
+    loader.memory_limit_bytes = limit
+    allowed = loader.allocate([larger, small, large])
+    share = (limit - sizes[0]) // 2
+    assert allowed == [share, sizes[0], share]
+
+
+def test_allocate_estimates_the_loaded_columns(tmp_path: Path) -> None:
+    first = numbers(tmp_path / "first.parquet", 1000)
+    second = numbers(tmp_path / "second.parquet", 1000)
+    loader = TableLoader()
+    one_column = loader.estimate_bytes(first, ["i"])
+    both_columns = loader.estimate_bytes(first)
+    assert one_column < both_columns
+    loader.memory_limit_bytes = 2 * both_columns
+    assert loader.allocate([first, second]) == [both_columns, both_columns]
+    assert loader.allocate([first, second], [["i"], ["i", "amount"]]) == [
+        one_column,
+        both_columns,
+    ]
+
+
+def test_load_prunes_index_and_empty_columns(tmp_path: Path) -> None:
+    df = pd.DataFrame(
+        {
+            "name": ["a", "b", "a", "a"],
+            "shares": [1, 2, 3, 400],
+            "empty": [None, None, None, None],
+            "missing": pd.array([None] * 4, dtype="Float64"),
+        },
+        index=pd.Index([10, 11, 12, 13]),
+    )
+    path = write_parquet(tmp_path / "t.parquet", pa.Table.from_pandas(df))
+    loaded = TableLoader().load(pq.ParquetFile(path))
+    assert list(loaded.df.columns) == ["name", "shares"]
+    assert isinstance(loaded.df["name"].dtype, pd.CategoricalDtype)
+    assert loaded.df["shares"].dtype == "int16"
+    assert loaded.df["shares"].tolist() == [1, 2, 3, 400]
+    assert not loaded.sampled
+    assert loaded.notes() == []
+
+
+def test_load_keeps_empty_columns_when_asked(tmp_path: Path) -> None:
+    table = pa.table({"a": [1, 2], "b": pa.array([None, None], pa.float64())})
+    path = write_parquet(tmp_path / "t.parquet", table)
+    loaded = TableLoader(prune_empty_columns=False).load(pq.ParquetFile(path))
+    assert list(loaded.df.columns) == ["a", "b"]
+
+
+@pytest.mark.parametrize("batch_rows", [7, 10, 64, 1000])
+def test_load_samples_every_nth_row_across_batches(
+    tmp_path: Path, batch_rows: int
+) -> None:
+    parquet_file = numbers(tmp_path / "t.parquet", 100, row_group_size=30)
+    loader = TableLoader(batch_rows=batch_rows)
+    size = loader.estimate_bytes(parquet_file)
+    loaded = loader.load(parquet_file, max_bytes=size // 3)
+    step = -(-size // (size // 3))
+    assert step > 1
+    assert loaded.df["i"].tolist() == list(range(0, 100, step))
+    assert loaded.sampled
+    assert loaded.total_rows == 100
+    summaries = loaded.column_summaries
+    assert summaries["i"].count == 100
+    assert summaries["i"].total == sum(range(100))
+    assert (summaries["i"].minimum, summaries["i"].maximum) == (0, 99)
+    assert summaries["amount"].total == pytest.approx(1.5 * sum(range(100)))
+    assert loaded.column_totals() == {
+        "i": sum(range(100)),
+        "amount": pytest.approx(1.5 * sum(range(100))),
+    }
+    assert len(loaded.notes()) == 2
+
+
+def test_load_within_the_limit_is_not_sampled(tmp_path: Path) -> None:
+    parquet_file = numbers(tmp_path / "t.parquet", 100)
+    loader = TableLoader(memory_limit_bytes=1)
+    loaded = loader.load(parquet_file, max_bytes=loader.estimate_bytes(parquet_file))
+    assert len(loaded.df) == 100
+    assert loaded.column_summaries == {}
@@ -0,0 +1,159 @@
+import io
+import zipfile
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from openpyxl import Workbook
+
+from investments_review.exceptions import UnsupportedSheetError
+from investments_review.sheets import local_parser
+from investments_review.sheets.local_parser import LocalSheetParser, _to_array
+
+
+def worksheet_archive(xml: bytes) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("xl/worksheets/sheet1.xml", xml)
+    buffer.seek(0)
+    return buffer
+
+
+def test_read_table_skips_leading_blanks_and_offsets() -> None:
+    rows = [
+        (None, None, None),
+        (None, "Company", " Shares "),
+        (None, "Acme", 10),
+        (None, "Globex", " "),
+        (None, "  ", None),
+        (None, None, None),
+    ]
+    table = LocalSheetParser()._read_table("Sheet1", rows)
+    assert table is not None
+    assert table.column_names == ["Company", "Shares"]
+    assert table.to_pydict() == {
+        "Company": ["Acme", "Globex"],
+        "Shares": [10, None],
+    }
+
+
+def test_read_table_pads_short_rows() -> None:
+    table = LocalSheetParser()._read_table("Sheet1", [("a", "b"), (1,)])
+    assert table is not None
+    assert table.to_pydict() == {"a": [1], "b": [None]}
+
+
+def test_read_table_without_rows() -> None:
+    parser = LocalSheetParser()
+    assert parser._read_table("Sheet1", []) is None
+    assert parser._read_table("Sheet1", [(None,), ("a", "b")]) is None
+
+
+@pytest.mark.parametrize(
+    ("rows", "error"),
+    [
+        ([("a", None, "c")], "header row of Sheet1 has blank cells"),
+        ([("a", " a")], "duplicate column names"),
+        ([("a",), (1,), (None,), (2,)], "several blocks of rows"),
+        ([(None, "a"), ("x", 1)], "values outside its table"),
+        ([("a", None), (1, 2)], "values outside its table"),
+        ([("a",), (1,), ("x",)], "Column a mixes integer, text values"),
+    ],
+)
+def test_read_table_rejects_tables_that_are_not_simple(
+    rows: list[tuple], error: str
+) -> None:
+    with pytest.raises(UnsupportedSheetError, match=error):
+        LocalSheetParser()._read_table("Sheet1", rows)
+
+
+@pytest.mark.parametrize(
+    ("values", "expected_type", "expected"),
+    [
+        ([None, None], pa.null(), [None, None]),
+        ([1, None, 3], pa.int64(), [1, None, 3]),
+        ([1, 2.5], pa.float64(), [1.0, 2.5]),
+        ([True, False], pa.bool_(), [True, False]),
+        ([" a ", None], pa.string(), ["a", None]),
+        (
+            [date(2025, 1, 31), datetime(2025, 2, 1, 12)],
+            pa.timestamp("us"),
+            [datetime(2025, 1, 31), datetime(2025, 2, 1, 12)],
+        ),
+    ],
+)
+def test_to_array(values: list, expected_type: pa.DataType, expected: list) -> None:
+    array = _to_array("column", values)
+    assert array.type == expected_type
+    assert array.to_pylist() == expected
+
+
+@pytest.mark.parametrize(
+    "values", [[1, "a"], [True, 1], [date(2025, 1, 1), 1.5], [b"bytes"]]
+)
+def test_to_array_rejects_mixed_values(values: list) -> None:
+    with pytest.raises(UnsupportedSheetError, match="Column column mixes"):
+        _to_array("column", values)
+
+
+@pytest.mark.parametrize(
+    "xml",
+    [
+        b'<mergeCells count="1"><mergeCell ref="A1:B1"/></mergeCells>',
+        b'<x:mergeCells><x:mergeCell ref="A1:B1"/></x:mergeCells>',
+        b'<c r="A1"><f>1+1</f></c>',
+        b'<c r="A1"><f>1+1</f><v/></c>',
+        b'<c r="A2"><f t="shared" si="0"/><v></v></c>',
+    ],
+)
+def test_check_xml_rejects_unsupported_cells(xml: bytes) -> None:
+    with pytest.raises(UnsupportedSheetError, match="merged cells or formulas"):
+        LocalSheetParser()._check_xml(worksheet_archive(b"<sheetData>" + xml))
+
+
+def test_check_xml_accepts_formulas_with_a_cached_value() -> None:
+    xml = b'<sheetData><c r="A1"><f>1+1</f><v>2</v></c></sheetData>'
+    LocalSheetParser()._check_xml(worksheet_archive(xml))
+
+
+@pytest.mark.parametrize("pattern", [b"<x:mergeCell ", b"</f><v/></c>"])
+@pytest.mark.parametrize("split", [1, 6, 11])
+def test_check_xml_finds_patterns_across_chunks(
+    monkeypatch: pytest.MonkeyPatch, pattern: bytes, split: int
+) -> None:
+    monkeypatch.setattr(local_parser, "XML_CHUNK_BYTES", 64)
+    # The first `split` bytes of the pattern end the first chunk.
+    xml = b" " * (64 - split) + pattern + b" " * 200
+    with pytest.raises(UnsupportedSheetError):
+        LocalSheetParser()._check_xml(worksheet_archive(xml))
+
+
+def test_parse_writes_one_region_per_worksheet() -> None:
+    workbook = Workbook()
+    first = workbook.active
+    assert first is not None
+    first.append(["Company", "Invested", "Date"])
+    first.append(["Acme", 1.5, datetime(2025, 1, 1)])
+    first.append(["Globex", 2, datetime(2025, 2, 1)])
+    workbook.create_sheet("Empty")
+    second = workbook.create_sheet("Other")
+    second.append(["Region"])
+    second.append(["EMEA"])
+    source = io.BytesIO()
+    workbook.save(source)
+    regions = LocalSheetParser().parse(source)
+    tables = [pq.read_table(io.BytesIO(region)) for region in regions]
+    assert [table.to_pydict() for table in tables] == [
+        {
+            "Company": ["Acme", "Globex"],
+            "Invested": [1.5, 2.0],
+            "Date": [datetime(2025, 1, 1), datetime(2025, 2, 1)],
+        },
+        {"Region": ["EMEA"]},
+    ]
+
+
+def test_parse_rejects_files_that_are_not_workbooks() -> None:
+    with pytest.raises(UnsupportedSheetError, match="Could not read the workbook"):
+        LocalSheetParser().parse(io.BytesIO(b"not a workbook"))